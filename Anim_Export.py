@@ -0,0 +1,179 @@
+"""
+This script houses a compact binary animation format for the bind joints of rigs built with Build_Components.py,
+along with an exporter that samples the joints in bulk, and a reader that memory maps the file for random frame access
+"""
+
+# Standard library imports
+import struct
+
+# Third party imports
+import numpy as np
+try:
+    from maya import cmds
+except ImportError:
+    # The reader only needs numpy, so it can be used by pipeline tools running outside of Maya
+    cmds = None
+
+# Local application imports
+import Rig_Math as rm
+if cmds is not None:
+    import Bulk_Ops
+
+
+
+"""
+-- NOTES --
+File layout, all little endian:
+    Header          HEADER struct below
+    Joint names     uint32 byte count, followed by the utf-8 joint names joined with newlines
+    Joint parents   int32 per joint, the index of each joint's parent in the file, or -1 for the roots
+    Padding         zeros up to the next DATA_ALIGNMENT bytes
+    Chunks          chunkframes frames each, the last chunk padded out with it's final frame
+Each chunk holds
+    Rotations       int16 (chunkframes, joints, 4), local quaternions (x, y, z, w) scaled by QUANTIZE_SCALE
+    Translations    float16 or float32 (chunkframes, joints, 3), local translations
+Joints are stored parents first, so world matrices can be built in a single pass down the list
+"""
+
+MAGIC = b"RGAN"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIIIff")
+FLAG_HALF_TRANSLATIONS = 1
+DATA_ALIGNMENT = 64
+QUANTIZE_SCALE = 32767.0
+
+# Frames per second for Maya's named time units
+TIME_UNITS = {"game": 15.0, "film": 24.0, "pal": 25.0, "ntsc": 30.0, "show": 48.0, "palf": 50.0, "ntscf": 60.0}
+
+
+def scene_fps():
+    # Frames per second of the open scene's time unit
+    unit = cmds.currentUnit(query=True, time=True)
+    if unit in TIME_UNITS:
+        return TIME_UNITS[unit]
+    return float(unit.replace("fps", ""))
+
+
+def bind_joints(bindgrp="Char_BindJoints"):
+    # Every joint under the bind joints group, parents first, with the index of each joint's parent in the list
+    joints = cmds.listRelatives(bindgrp, allDescendents=True, type="joint", fullPath=True) or []
+    joints.sort(key=lambda path: path.count("|"))
+    indices = {path: index for index, path in enumerate(joints)}
+    parents = [indices.get(path.rsplit("|", 1)[0], -1) for path in joints]
+    return joints, parents
+
+
+def _chunk_dtype(chunkframes, jointcount,
+                 halftranslations):
+    return np.dtype([("rotations", "<i2", (chunkframes, jointcount, 4)),
+                     ("translations", "<f2" if halftranslations else "<f4", (chunkframes, jointcount, 3))])
+
+
+def _data_offset(headerbytes):
+    return -(-headerbytes // DATA_ALIGNMENT) * DATA_ALIGNMENT
+
+
+def export_bind_joints(path, bindgrp="Char_BindJoints",
+                       frames=None, chunkframes=64,
+                       halftranslations=False):
+    # Sample the local transforms of every bind joint over the frame range, one chunk at a time so memory use stays
+    # the same however long the shot is, and write them to path. Returns the number of frames written
+    if frames is None:
+        frames = list(range(int(cmds.playbackOptions(query=True, minTime=True)),
+                            int(cmds.playbackOptions(query=True, maxTime=True)) + 1))
+    joints, parents = bind_joints(bindgrp)
+    jointcount = len(joints)
+    chunkdtype = _chunk_dtype(chunkframes, jointcount, halftranslations)
+
+    names = "\n".join(joint.rsplit("|", 1)[-1] for joint in joints).encode("utf-8")
+    flags = FLAG_HALF_TRANSLATIONS if halftranslations else 0
+    header = HEADER.pack(MAGIC, VERSION, flags, jointcount, len(frames), chunkframes, scene_fps(), frames[0])
+    header += struct.pack("<I", len(names)) + names + np.asarray(parents, dtype="<i4").tobytes()
+
+    with open(path, "wb") as output:
+        output.write(header)
+        output.write(b"\0" * (_data_offset(len(header)) - len(header)))
+
+        for start in range(0, len(frames), chunkframes):
+            chunkframelist = frames[start:start + chunkframes]
+            local = Bulk_Ops.sample_matrices(joints, chunkframelist, attribute="matrix")
+            # Pad the last chunk with it's final frame, so every chunk is the same size and can be found by offset
+            if len(chunkframelist) < chunkframes:
+                local = np.concatenate([local, np.repeat(local[-1:], chunkframes - len(chunkframelist), axis=0)])
+
+            chunk = np.zeros(1, dtype=chunkdtype)
+            quaternions = rm.quaternions_from_matrices(local[..., :3, :3].reshape(-1, 3, 3))
+            chunk["rotations"][0] = np.round(quaternions * QUANTIZE_SCALE).reshape(chunkframes, jointcount, 4)
+            chunk["translations"][0] = local[..., 3, :3]
+            output.write(chunk.tobytes())
+
+    return len(frames)
+
+
+class AnimReader(object):
+    """
+    Memory mapped access to a file written by export_bind_joints, only reading the chunks that are asked for
+    """
+    def __init__(self, path):
+        with open(path, "rb") as infile:
+            magic, version, flags, jointcount, framecount, chunkframes, fps, startframe = \
+                HEADER.unpack(infile.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError("{} is not a version {} animation file".format(path, VERSION))
+            namebytes = struct.unpack("<I", infile.read(4))[0]
+            self.joints = infile.read(namebytes).decode("utf-8").split("\n") if jointcount else []
+            self.parents = np.frombuffer(infile.read(jointcount * 4), dtype="<i4")
+            headerbytes = infile.tell()
+
+        self.path = path
+        self.framecount = framecount
+        self.chunkframes = chunkframes
+        self.fps = fps
+        self.startframe = startframe
+        self.halftranslations = bool(flags & FLAG_HALF_TRANSLATIONS)
+
+        chunkcount = -(-framecount // chunkframes)
+        self.chunks = np.memmap(path, mode="r", offset=_data_offset(headerbytes), shape=(chunkcount,),
+                                dtype=_chunk_dtype(chunkframes, jointcount, self.halftranslations))
+
+    def __len__(self):
+        return self.framecount
+
+    def _indices(self, frames):
+        indices = np.asarray(frames, dtype=np.int64) - int(self.startframe)
+        if np.any((indices < 0) | (indices >= self.framecount)):
+            raise IndexError("Frames outside of {} to {}".format(self.startframe,
+                                                                 self.startframe + self.framecount - 1))
+        return indices // self.chunkframes, indices % self.chunkframes
+
+    def local_transforms(self, frames):
+        # Return (F, N, 3) local translations and (F, N, 4) local quaternions for the given scene frames
+        chunks, rows = self._indices(frames)
+        quaternions = self.chunks["rotations"][chunks, rows].astype(np.float64) / QUANTIZE_SCALE
+        translations = self.chunks["translations"][chunks, rows].astype(np.float64)
+        return translations, quaternions
+
+    def local_matrices(self, frames):
+        # Return (F, N, 4, 4) local matrices for the given scene frames
+        translations, quaternions = self.local_transforms(frames)
+        matrices = np.zeros(translations.shape[:2] + (4, 4))
+        matrices[..., :3, :3] = rm.matrices_from_quaternions(quaternions.reshape(-1, 4)).reshape(
+            translations.shape[:2] + (3, 3))
+        matrices[..., 3, :3] = translations
+        matrices[..., 3, 3] = 1.0
+        return matrices
+
+    def world_matrices(self, frames):
+        # Return (F, N, 4, 4) world matrices relative to the bind joints group, working down the joints parents first
+        matrices = self.local_matrices(frames)
+        for index, parent in enumerate(self.parents):
+            if parent >= 0:
+                matrices[:, index] = np.matmul(matrices[:, index], matrices[:, parent])
+        return matrices
+
+    def iter_chunks(self):
+        # Yield (frames, translations, quaternions) for each chunk in order, for streaming through a whole file
+        for start in range(0, self.framecount, self.chunkframes):
+            frames = np.arange(start, min(start + self.chunkframes, self.framecount)) + int(self.startframe)
+            translations, quaternions = self.local_transforms(frames)
+            yield frames, translations, quaternions
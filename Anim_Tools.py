@@ -0,0 +1,246 @@
+"""
+This script houses animation tools for rigs built with Build_Components.py, which work on whole frame ranges at once,
+sampling the rig in a single sweep through the frames, solving every frame together, and keying the results in bulk
+"""
+
+# Standard library imports
+
+# Third party imports
+import numpy as np
+from maya import cmds
+
+# Local application imports
+import Bulk_Ops
+import Rig_Math as rm
+
+
+
+class Limb(object):
+    """
+    The names of the controls and joint chains for one FKIK limb, as built by BuildComponents.arm_setup or digileg
+    """
+    def __init__(self, attrsctrl, fkctrls,
+                 fkjnts, ikjnts,
+                 ikctrl, pvctrl=None):
+        self.attrsctrl = attrsctrl
+        self.fkctrls = fkctrls
+        self.fkjnts = fkjnts
+        self.ikjnts = ikjnts
+        self.ikctrl = ikctrl
+        self.pvctrl = pvctrl
+
+    @classmethod
+    def arm(cls, side="Lf"):
+        # Names for the arm built by arm_setup for this side
+        return cls(attrsctrl="{}_Arm_Attrs_CTRL".format(side),
+                   fkctrls=["{}_Arm_{}_FK_CTRL".format(side, num) for num in range(3)],
+                   fkjnts=["{}_Arm_{}_FK_JNT".format(side, num) for num in range(3)],
+                   ikjnts=["{}_Arm_{}_IK_JNT".format(side, num) for num in range(3)],
+                   ikctrl="{}_Arm_IK_CTRL".format(side),
+                   pvctrl="{}_Arm_IK_PV_CTRL".format(side))
+
+    @classmethod
+    def leg(cls, part_name="Lf_Leg"):
+        # Names for the leg built by digileg with this part_name
+        side = part_name.split("_")[0]
+        return cls(attrsctrl="{}_Leg_Attrs_CTRL".format(side),
+                   fkctrls=["{}_FK_{}_CTRL".format(part_name, num) for num in range(4)],
+                   fkjnts=["{}_{}_FK_JNT".format(part_name, num) for num in range(4)],
+                   ikjnts=["{}_{}_IK_JNT".format(part_name, num) for num in range(4)],
+                   ikctrl="{}_IK_Foot_CTRL".format(part_name))
+
+
+def frame_range(start=None, end=None):
+    # Return every whole frame from start to end, defaulting to the playback range
+    if start is None:
+        start = cmds.playbackOptions(query=True, minTime=True)
+    if end is None:
+        end = cmds.playbackOptions(query=True, maxTime=True)
+    return list(range(int(start), int(end) + 1))
+
+
+def unwrap_rotations(rotations):
+    # Remove 360 degree jumps between frames from an (F, 3) array of euler rotations, so the keys don't spin
+    return np.degrees(np.unwrap(np.radians(rotations), axis=0))
+
+
+def _parent(node):
+    return cmds.listRelatives(node, parent=True)[0]
+
+
+def _sample_controls(nodes, ctrls,
+                     frames):
+    # Sample the world matrices of nodes and ctrls in one sweep, along with the space each control's translate and
+    # rotate are in, which is it's parent's world matrix, or also includes it's offsetParentMatrix in lean rigs
+    # Returns (F, N) node world matrices, and (F, C) control world and parent space matrices
+    paths = ["{}.worldMatrix[0]".format(node) for node in nodes + ctrls] + ["{}.matrix".format(ctrl) for ctrl in ctrls]
+    samples = Bulk_Ops.sample_matrix_plugs(paths, frames)
+    nodeworld = samples[:, :len(nodes)]
+    ctrlworld = samples[:, len(nodes):len(nodes) + len(ctrls)]
+    ctrllocal = samples[:, len(nodes) + len(ctrls):]
+    return nodeworld, ctrlworld, np.matmul(np.linalg.inv(ctrllocal), ctrlworld)
+
+
+def _local_keys(nodes, localmatrices,
+                translate=False, rotate=True):
+    # Turn (F, N, 4, 4) local matrices into (plug, values) pairs for Bulk_Ops.key_attrs
+    keys = []
+    for index, node in enumerate(nodes):
+        translations, rotations = rm.decompose_matrices(localmatrices[:, index])
+        if translate:
+            for axis, values in zip("XYZ", translations.T):
+                keys.append(("{}.translate{}".format(node, axis), values))
+        if rotate:
+            for axis, values in zip("XYZ", unwrap_rotations(rotations).T):
+                keys.append(("{}.rotate{}".format(node, axis), values))
+    return keys
+
+
+def bake_fk_from_ik(limb, frames=None,
+                    switch=True):
+    # Key the FK controls over the frame range so the FK chain matches the IK chain on every frame, and optionally
+    # key the FKIK attribute over to FK
+    frames = frame_range() if frames is None else frames
+
+    # One sweep through the frames for everything the solve needs
+    samples, fkctrls, fkgrps = _sample_controls(limb.ikjnts + limb.fkjnts, limb.fkctrls, frames)
+    count = len(limb.fkctrls)
+    ikjnts = samples[:, :count]
+    fkjnts = samples[:, count:]
+
+    # Each FK control drives it's joint rigidly, so ctrl world = offset * joint world, with the offset measured on
+    # the first frame. Each group below the first is a rigid child of the previous control
+    offsets = np.matmul(fkctrls[0], np.linalg.inv(fkjnts[0]))
+    grplocals = np.matmul(fkgrps[0, 1:], np.linalg.inv(fkctrls[0, :-1]))
+
+    # Solve down the chain for every frame at once
+    targetworld = np.matmul(offsets[np.newaxis], ikjnts)
+    localmatrices = np.empty_like(targetworld)
+    grpworld = fkgrps[:, 0]
+    for index in range(count):
+        if index:
+            grpworld = np.matmul(grplocals[index - 1][np.newaxis], targetworld[:, index - 1])
+        localmatrices[:, index] = np.matmul(targetworld[:, index], np.linalg.inv(grpworld))
+
+    keys = _local_keys(limb.fkctrls, localmatrices)
+    if switch:
+        keys.append(("{}.FKIK".format(limb.attrsctrl), np.zeros(len(frames))))
+    Bulk_Ops.key_attrs(keys, frames)
+
+    return keys
+
+
+def bake_ik_from_fk(limb, frames=None,
+                    switch=True):
+    # Key the IK control, and the PV control if the limb has one, over the frame range so the IK chain matches the FK
+    # chain on every frame, and optionally key the FKIK attribute over to IK
+    frames = frame_range() if frames is None else frames
+
+    ctrls = [limb.ikctrl, limb.pvctrl] if limb.pvctrl else [limb.ikctrl]
+    samples, ctrlworld, ctrlspace = _sample_controls(limb.fkjnts + [limb.ikjnts[-1]], ctrls, frames)
+    count = len(limb.fkjnts)
+    fkjnts = samples[:, :count]
+    ikend, ikctrl, ikgrpworld = samples[:, count], ctrlworld[:, 0], ctrlspace[:, 0]
+
+    # The IK control holds the end IK joint rigidly, so ctrl world = offset * end joint world, measured on the first
+    # frame, and the control's new world matrix follows the FK end joint instead
+    offset = np.matmul(ikctrl[0], np.linalg.inv(ikend[0]))
+    ikworld = np.matmul(offset[np.newaxis], fkjnts[:, -1])
+    iklocal = np.matmul(ikworld, np.linalg.inv(ikgrpworld))
+    keys = _local_keys([limb.ikctrl], iklocal[:, np.newaxis], translate=True)
+
+    if limb.pvctrl:
+        pvworld, pvgrpworld = ctrlworld[:, 1], ctrlspace[:, 1]
+        # Keep the PV control the same distance out from the limb as it is on the first frame
+        halfway = (fkjnts[0, 0, 3, :3] + fkjnts[0, -1, 3, :3]) * 0.5
+        distance = np.linalg.norm(pvworld[0, 3, :3] - halfway)
+        pvpositions = rm.pole_vector_placements(fkjnts[:, 0, 3, :3], fkjnts[:, 1, 3, :3],
+                                                fkjnts[:, 2, 3, :3], distance=distance)[0]
+        # Move the world positions into the PV group's space
+        homogeneous = np.concatenate([pvpositions, np.ones((len(frames), 1))], axis=1)
+        pvlocal = np.einsum("fi,fij->fj", homogeneous, np.linalg.inv(pvgrpworld))[:, :3]
+        for axis, values in zip("XYZ", pvlocal.T):
+            keys.append(("{}.translate{}".format(limb.pvctrl, axis), values))
+
+    if switch:
+        keys.append(("{}.FKIK".format(limb.attrsctrl), np.ones(len(frames))))
+    Bulk_Ops.key_attrs(keys, frames)
+
+    return keys
+
+
+class SpaceSwitch(object):
+    """
+    The names of the nodes making up one space switched control, as built by BuildComponents.arm_setup, with the
+        space locators listed in the same order as the space switching enum attributes
+    """
+    def __init__(self, attrsctrl, ctrl,
+                 locators, pointconstraint,
+                 orientconstraint):
+        self.attrsctrl = attrsctrl
+        self.ctrl = ctrl
+        self.grp = _parent(ctrl)
+        self.locators = locators
+        self.pointconstraint = pointconstraint
+        self.orientconstraint = orientconstraint
+
+    @classmethod
+    def arm(cls, side="Lf"):
+        # Names for the IK control space switching built by arm_setup for this side
+        spaces = ["Root_CTRL", "Hips_CTRL", "Chest_CTRL", "{}_Scapula_Shoulder_LOC".format(side)]
+        return cls(attrsctrl="{}_Arm_Attrs_CTRL".format(side),
+                   ctrl="{}_Arm_IK_CTRL".format(side),
+                   locators=["{}_{}_SS_LOC".format(side, space) for space in spaces],
+                   pointconstraint="{}_Arm_IK_GRP_pointConstraint1".format(side),
+                   orientconstraint="{}_Arm_IK_GRP_orientConstraint1".format(side))
+
+
+def bake_space_switch(switch, frames=None,
+                      position=None, rotation=None):
+    # Key the position and/or rotation space of a space switched control over the frame range, keying the control's
+    # translate and rotate on every frame so it stays exactly where it was in world space
+    # position and rotation are each either a single space index for the whole range, or a list with a space index
+    # per frame, so a shot with any number of switches is handled in one pass. None leaves that space unchanged
+    frames = frame_range() if frames is None else frames
+    framecount = len(frames)
+
+    # One sweep through the frames for the control and all of the space locators
+    samples = Bulk_Ops.sample_world_matrices([switch.ctrl] + switch.locators, frames)
+    ctrlworld = samples[:, 0]
+    locworld = samples[:, 1:]
+    currentspaces = Bulk_Ops.sample_attrs(["{}.Position_Space_Switching".format(switch.attrsctrl),
+                                           "{}.Rotation_Space_Switching".format(switch.attrsctrl)], frames)
+
+    def spaceindices(spaces, current):
+        if spaces is None:
+            return current.astype(int)
+        return np.broadcast_to(np.asarray(spaces, dtype=int), (framecount,))
+
+    posspaces = spaceindices(position, currentspaces[:, 0])
+    rotspaces = spaceindices(rotation, currentspaces[:, 1])
+
+    # The group's world matrix in the new spaces. The point constraint places it at the active locator plus it's
+    # offset, and the orient constraint rotates it by it's offset and then the active locator's world rotation
+    frameindices = np.arange(framecount)
+    pointoffset = np.asarray(cmds.getAttr("{}.offset".format(switch.pointconstraint))[0])
+    orientoffset = rm.matrices_from_euler(cmds.getAttr("{}.offset".format(switch.orientconstraint))[0])
+    locrotations = rm.normalize(locworld[frameindices, rotspaces, :3, :3].reshape(-1, 3)).reshape(-1, 3, 3)
+
+    grpworld = np.zeros((framecount, 4, 4))
+    grpworld[:, :3, :3] = np.matmul(orientoffset[np.newaxis], locrotations)
+    grpworld[:, 3, :3] = locworld[frameindices, posspaces, 3, :3] + pointoffset
+    grpworld[:, 3, 3] = 1.0
+
+    # Compensate the control so it's world matrix doesn't change
+    ctrllocal = np.matmul(ctrlworld, np.linalg.inv(grpworld))
+    keys = _local_keys([switch.ctrl], ctrllocal[:, np.newaxis], translate=True)
+    Bulk_Ops.key_attrs(keys, frames)
+
+    switchkeys = []
+    if position is not None:
+        switchkeys.append(("{}.Position_Space_Switching".format(switch.attrsctrl), posspaces))
+    if rotation is not None:
+        switchkeys.append(("{}.Rotation_Space_Switching".format(switch.attrsctrl), rotspaces))
+    Bulk_Ops.key_attrs(switchkeys, frames, stepped=True)
+
+    return keys + switchkeys
@@ -0,0 +1,705 @@
+"""
+This script houses benchmarks for the rig components, to be run from inside of Maya, with each benchmark printing a
+table of its results and returning them as a list of dicts
+"""
+
+# Standard library imports
+import importlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Third party imports
+import numpy as np
+from maya import cmds
+
+# Local application imports
+import Anim_Export
+import Anim_Tools
+import Build_Components as bc
+import Bulk_Ops
+import Component_Registry
+import Rig_Math as rm
+import Rig_Publish
+import Shape_Store
+import Skin_Weights
+
+
+
+def test_chain(name="Bench", jointcount=100,
+               length=1.0):
+    # Create a straight chain of jointcount joints along +X, named {name}_{num}_JNT, under a fresh character group
+    cmds.select(deselect=True)
+    joints = []
+    for num in range(jointcount):
+        joints.append(cmds.joint(name="{}_{}_JNT".format(name, num), position=(num * length, 0, 0)))
+    cmds.select(deselect=True)
+    return joints
+
+
+def scene_node_count():
+    # Count every node in the scene
+    return len(cmds.ls())
+
+
+def heap_megabytes():
+    # Maya's current heap memory use, in megabytes
+    return cmds.memory(heapMemory=True, megaByte=True)
+
+
+def benchmark_long_chains(counts=(50, 100, 250, 500),
+                          ctrlevery=10):
+    # Build long_fkchain and long_curve_rig on chains of each joint count, timing the build and counting the nodes
+    # created, to show the cost per joint stays flat as the chains get longer
+    results = []
+    for builder in ["long_fkchain", "long_curve_rig"]:
+        for count in counts:
+            cmds.file(new=True, force=True)
+            components = bc.BuildComponents(char_name="Bench")
+            cmds.group(name="Bench_Rig", empty=True)
+            joints = test_chain(jointcount=count)
+
+            startnodes = scene_node_count()
+            starttime = time.time()
+            getattr(components, builder)(part_name="Tail", startjnt=joints[0],
+                                         endjnt=joints[-1], ctrlevery=ctrlevery)
+            buildtime = time.time() - starttime
+            nodes = scene_node_count() - startnodes
+
+            results.append({
+                "builder": builder,
+                "joints": count,
+                "seconds": buildtime,
+                "nodes": nodes,
+                "ms_per_joint": buildtime * 1000.0 / count,
+                "nodes_per_joint": nodes / float(count),
+            })
+
+    print("{:<16} {:>7} {:>10} {:>8} {:>13} {:>15}".format("builder", "joints", "seconds", "nodes",
+                                                          "ms/joint", "nodes/joint"))
+    for result in results:
+        print("{builder:<16} {joints:>7} {seconds:>10.3f} {nodes:>8} {ms_per_joint:>13.3f} "
+              "{nodes_per_joint:>15.2f}".format(**result))
+
+    return results
+
+
+def benchmark_fkik_bake(side="Lf", frames=1000):
+    # Time baking FK from IK and back again over a range of frames on an arm already built in the open scene,
+    # after keying some random motion onto the IK and PV controls
+    limb = Anim_Tools.Limb.arm(side)
+    framelist = list(range(1, frames + 1))
+    random = np.random.RandomState(0)
+    motion = []
+    for ctrl in [limb.ikctrl, limb.pvctrl]:
+        for axis in "XYZ":
+            # Smooth random motion, a few units either side of the rest pose
+            values = np.cumsum(random.uniform(-0.2, 0.2, frames)) + cmds.getAttr("{}.translate{}".format(ctrl, axis))
+            motion.append(("{}.translate{}".format(ctrl, axis), values))
+    Bulk_Ops.key_attrs(motion, framelist)
+
+    results = []
+    for name, bake in [("bake_fk_from_ik", Anim_Tools.bake_fk_from_ik), ("bake_ik_from_fk", Anim_Tools.bake_ik_from_fk)]:
+        starttime = time.time()
+        bake(limb, frames=framelist)
+        seconds = time.time() - starttime
+        results.append({"tool": name, "frames": frames, "seconds": seconds, "fps": frames / seconds})
+
+    for result in results:
+        print("{tool:<16} {frames:>6} frames {seconds:>8.3f} seconds {fps:>10.1f} frames/second".format(**result))
+
+    return results
+
+
+def benchmark_space_switch(side="Lf", frames=1000,
+                           switches=200):
+    # Time baking a shot with a space switch every few frames on an arm already built in the open scene, cycling
+    # through every space, to show the cost stays per frame rather than per switch
+    switch = Anim_Tools.SpaceSwitch.arm(side)
+    framelist = list(range(1, frames + 1))
+    spacecount = len(switch.locators)
+    spaces = (np.arange(frames) * switches // frames) % spacecount
+
+    starttime = time.time()
+    Anim_Tools.bake_space_switch(switch, frames=framelist, position=spaces, rotation=spaces)
+    seconds = time.time() - starttime
+
+    result = {"frames": frames, "switches": switches, "seconds": seconds, "fps": frames / seconds}
+    print("{frames:>6} frames {switches:>5} switches {seconds:>8.3f} seconds {fps:>10.1f} frames/second".format(**result))
+
+    return [result]
+
+
+def benchmark_anim_export(bindgrp="Char_BindJoints", frames=None,
+                          chunkframes=64):
+    # Time exporting the bind joints of the open scene over the playback range, with full and half precision
+    # translations, then time reading every frame back in order and in a random order, all in frames per second
+    results = []
+    for halftranslations in [False, True]:
+        path = os.path.join(tempfile.gettempdir(), "benchmark_anim_export.anim")
+        starttime = time.time()
+        framecount = Anim_Export.export_bind_joints(path, bindgrp=bindgrp, frames=frames, chunkframes=chunkframes,
+                                                    halftranslations=halftranslations)
+        exportseconds = time.time() - starttime
+
+        reader = Anim_Export.AnimReader(path)
+        starttime = time.time()
+        for chunk in reader.iter_chunks():
+            pass
+        streamseconds = time.time() - starttime
+
+        order = np.random.RandomState(0).permutation(framecount) + int(reader.startframe)
+        starttime = time.time()
+        for frame in order:
+            reader.world_matrices([frame])
+        randomseconds = time.time() - starttime
+
+        results.append({
+            "translations": "float16" if halftranslations else "float32",
+            "frames": framecount,
+            "kilobytes": os.path.getsize(path) / 1024.0,
+            "export_fps": framecount / exportseconds,
+            "stream_fps": framecount / max(streamseconds, 1e-9),
+            "random_fps": framecount / max(randomseconds, 1e-9),
+        })
+        del reader
+        os.remove(path)
+
+    print("{:<13} {:>7} {:>10} {:>12} {:>12} {:>12}".format("translations", "frames", "KB", "export fps",
+                                                            "stream fps", "random fps"))
+    for result in results:
+        print("{translations:<13} {frames:>7} {kilobytes:>10.1f} {export_fps:>12.1f} {stream_fps:>12.1f} "
+              "{random_fps:>12.1f}".format(**result))
+
+    return results
+
+
+def benchmark_digileg_solvers(skeleton_file, side="Lf",
+                              frames=200, solvers=("eval", "analytic", "simple")):
+    # Build one digitigrade leg with each IK solver on a fresh copy of the skeleton file, play the same random IK
+    # foot motion through each, and compare the bind joint poses against the first solver, along with the nodes
+    # each one needs and it's evaluation cost
+    part_name = "{}_Leg".format(side)
+    legjnts = ["{}_Leg_{}_JNT".format(side, num) for num in range(4)]
+    framelist = list(range(1, frames + 1))
+    random = np.random.RandomState(0)
+    offsets = np.cumsum(random.uniform(-0.3, 0.3, (frames, 3)), axis=0)
+
+    results = []
+    reference = None
+    for solver in solvers:
+        cmds.file(skeleton_file, open=True, force=True)
+        components = bc.BuildComponents(char_name="Char")
+        components.character_setup()
+
+        startnodes = scene_node_count()
+        components.digileg(part_name=part_name, startjnt=legjnts[0], kneejnt=legjnts[1],
+                           anklejnt=legjnts[2], heeljnt=legjnts[3],
+                           footjnt="{}_Paw_0_JNT".format(side), flipped=side == "Rt", solver=solver)
+        nodes = scene_node_count() - startnodes
+
+        ikctrl = "{}_IK_Foot_CTRL".format(part_name)
+        Bulk_Ops.key_attrs([("{}.translate{}".format(ikctrl, axis), offsets[:, index])
+                            for index, axis in enumerate("XYZ")], framelist)
+
+        starttime = time.time()
+        poses = Bulk_Ops.sample_world_matrices(legjnts, framelist)
+        seconds = time.time() - starttime
+
+        if reference is None:
+            reference = poses
+        error = np.linalg.norm(poses[..., 3, :3] - reference[..., 3, :3], axis=-1)
+        results.append({
+            "solver": solver,
+            "nodes": nodes,
+            "ikhandles": len(cmds.ls(type="ikHandle")),
+            "constraints": len(cmds.ls(type="constraint")),
+            "ms_per_frame": seconds * 1000.0 / frames,
+            "mean_error": float(error.mean()),
+            "max_error": float(error.max()),
+        })
+
+    print("{:<10} {:>6} {:>10} {:>12} {:>13} {:>11} {:>10}".format("solver", "nodes", "ikHandles", "constraints",
+                                                                    "ms/frame", "mean error", "max error"))
+    for result in results:
+        print("{solver:<10} {nodes:>6} {ikhandles:>10} {constraints:>12} {ms_per_frame:>13.3f} "
+              "{mean_error:>11.4f} {max_error:>10.4f}".format(**result))
+
+    return results
+
+
+def test_creature(limbcount=8, jointcount=3,
+                  length=2.0):
+    # Create a body joint with limbcount bent limbs of jointcount joints spread around it, named Bench_Limb{num}_..
+    cmds.select(deselect=True)
+    body = cmds.joint(name="Bench_Body_JNT", position=(0, 10, 0))
+    roots = []
+    for limb in range(limbcount):
+        angle = np.radians(360.0 * limb / limbcount)
+        direction = np.array([np.cos(angle), 0.0, np.sin(angle)])
+        cmds.select(body)
+        for num in range(jointcount):
+            # Each joint steps outward and down, with a bend at the middle so the IK has a preferred direction
+            position = np.array([0, 10, 0]) + direction * length * (num + 1) - np.array([0, num * num * 0.5, 0])
+            jnt = cmds.joint(name="Bench_Limb{}_{}_JNT".format(limb, num), position=tuple(position))
+            if num == 0:
+                roots.append(jnt)
+    cmds.select(deselect=True)
+    return roots
+
+
+def benchmark_multi_limb(counts=(8, 32, 100)):
+    # Build multi_limb_setup on creatures with each number of limbs, timing the build and counting the nodes it
+    # creates, to show the shared attrs, FKIK and space switching networks keep the cost per limb flat
+    results = []
+    for count in counts:
+        cmds.file(new=True, force=True)
+        components = bc.BuildComponents(char_name="Bench")
+        components.character_setup()
+        roots = test_creature(limbcount=count)
+
+        startnodes = scene_node_count()
+        starttime = time.time()
+        components.multi_limb_setup(part_name="Bench_Legs", limbroots=roots)
+        buildtime = time.time() - starttime
+        nodes = scene_node_count() - startnodes
+
+        results.append({
+            "limbs": count,
+            "seconds": buildtime,
+            "nodes": nodes,
+            "ms_per_limb": buildtime * 1000.0 / count,
+            "nodes_per_limb": nodes / float(count),
+            "constraints": len(cmds.ls(type="constraint")),
+        })
+
+    print("{:>6} {:>10} {:>8} {:>12} {:>15} {:>12}".format("limbs", "seconds", "nodes", "ms/limb",
+                                                            "nodes/limb", "constraints"))
+    for result in results:
+        print("{limbs:>6} {seconds:>10.3f} {nodes:>8} {ms_per_limb:>12.2f} {nodes_per_limb:>15.2f} "
+              "{constraints:>12}".format(**result))
+
+    return results
+
+
+def benchmark_skin_weights(vertexcounts=(100000, 250000), jointcount=50,
+                           maxinfluences=4, sample=1000):
+    # Bind a plane with each vertex count to a chain of joints, then time saving and loading all of it's weights
+    # with Skin_Weights, against per vertex skinPercent queries and edits timed on sample vertices and scaled up
+    # to the whole mesh
+    path = os.path.join(tempfile.gettempdir(), "benchmark_skin_weights")
+    results = []
+    for count in vertexcounts:
+        cmds.file(new=True, force=True)
+        joints = test_chain(jointcount=jointcount)
+        divisions = int(np.sqrt(count)) - 1
+        plane = cmds.polyPlane(name="Bench_Skin_GEO", width=jointcount, height=jointcount * 0.25,
+                               subdivisionsX=divisions, subdivisionsY=divisions, constructionHistory=False)[0]
+        cmds.xform(plane, translation=((jointcount - 1) * 0.5, 0, 0), worldSpace=True)
+        skincluster = cmds.skinCluster(joints, plane, toSelectedBones=True, maximumInfluences=maxinfluences)[0]
+        vertices = cmds.polyEvaluate(plane, vertex=True)
+        original = Skin_Weights.get_weights(skincluster)[0]
+
+        starttime = time.time()
+        Skin_Weights.export_weights(plane, path)
+        exportseconds = time.time() - starttime
+        kilobytes = sum(os.path.getsize(filepath) for filepath in Skin_Weights._paths(path, plane).values()) / 1024.0
+
+        # Flatten the weights first, so loading has to put every weight back
+        cmds.skinPercent(skincluster, "{}.vtx[*]".format(plane), transformValue=[(joints[0], 1.0)])
+        starttime = time.time()
+        Skin_Weights.import_weights(plane, path)
+        importseconds = time.time() - starttime
+        error = np.abs(Skin_Weights.get_weights(skincluster)[0] - original).max()
+
+        indices = np.random.RandomState(0).choice(vertices, min(sample, vertices), replace=False)
+        starttime = time.time()
+        for index in indices:
+            cmds.skinPercent(skincluster, "{}.vtx[{}]".format(plane, index), query=True, value=True)
+        queryseconds = (time.time() - starttime) * vertices / len(indices)
+        starttime = time.time()
+        for index in indices:
+            cmds.skinPercent(skincluster, "{}.vtx[{}]".format(plane, index), transformValue=[(joints[0], 1.0)])
+        editseconds = (time.time() - starttime) * vertices / len(indices)
+
+        results.append({
+            "vertices": vertices,
+            "kilobytes": kilobytes,
+            "export_seconds": exportseconds,
+            "import_seconds": importseconds,
+            "skinpercent_export_seconds": queryseconds,
+            "skinpercent_import_seconds": editseconds,
+            "max_error": float(error),
+        })
+
+    print("{:>9} {:>10} {:>10} {:>10} {:>16} {:>16} {:>10}".format("vertices", "KB", "export s", "import s",
+                                                                   "skinPercent get", "skinPercent set",
+                                                                   "max error"))
+    for result in results:
+        print("{vertices:>9} {kilobytes:>10.1f} {export_seconds:>10.3f} {import_seconds:>10.3f} "
+              "{skinpercent_export_seconds:>16.2f} {skinpercent_import_seconds:>16.2f} "
+              "{max_error:>10.6f}".format(**result))
+
+    return results
+
+
+def benchmark_control_shapes(counts=(100, 500, 1000), instance=False):
+    # Build each number of controls, tweak every CV, and time saving and restoring their shapes with Shape_Store,
+    # against reading and writing each control's CVs with maya.cmds, to show the restore cost stays flat per control
+    path = os.path.join(tempfile.gettempdir(), "benchmark_control_shapes.npz")
+    results = []
+    for count in counts:
+        cmds.file(new=True, force=True)
+        components = bc.BuildComponents(char_name="Bench", instance_shapes=instance)
+        ctrls = [components.controllers_setup(part_name="Bench_{}".format(num), shape="circle")[1]
+                 for num in range(count)]
+
+        # Move every CV of every control, as if they had been hand tweaked
+        tweaked = Shape_Store.ShapeStore.capture(ctrls)
+        tweaked.cvs *= np.random.RandomState(0).uniform(0.5, 1.5, tweaked.cvs.shape).astype(np.float32)
+        tweaked.apply()
+
+        starttime = time.time()
+        Shape_Store.ShapeStore.capture(ctrls).save(path)
+        saveseconds = time.time() - starttime
+
+        # Put the controls back to their built shapes, then restore the tweaks
+        for ctrl in ctrls:
+            cmds.scale(1, 1, 1, "{}.cv[*]".format(ctrl), pivot=(0, 0, 0), objectSpace=True)
+        starttime = time.time()
+        skipped = Shape_Store.ShapeStore.load(path).apply(ctrls)
+        restoreseconds = time.time() - starttime
+        error = np.abs(Shape_Store.ShapeStore.capture(ctrls).cvs - tweaked.cvs).max()
+
+        starttime = time.time()
+        cmdscvs = [cmds.getAttr("{}.cv[*]".format(ctrl)) for ctrl in ctrls]
+        cmdssaveseconds = time.time() - starttime
+        starttime = time.time()
+        for ctrl, cvs in zip(ctrls, cmdscvs):
+            for index, cv in enumerate(cvs):
+                cmds.xform("{}.cv[{}]".format(ctrl, index), translation=cv, objectSpace=True)
+        cmdsrestoreseconds = time.time() - starttime
+
+        results.append({
+            "controls": count,
+            "kilobytes": os.path.getsize(path) / 1024.0,
+            "save_ms_per_ctrl": saveseconds * 1000.0 / count,
+            "restore_ms_per_ctrl": restoreseconds * 1000.0 / count,
+            "cmds_save_ms_per_ctrl": cmdssaveseconds * 1000.0 / count,
+            "cmds_restore_ms_per_ctrl": cmdsrestoreseconds * 1000.0 / count,
+            "skipped": len(skipped),
+            "max_error": float(error),
+        })
+        os.remove(path)
+
+    print("{:>9} {:>8} {:>10} {:>12} {:>11} {:>13} {:>8} {:>10}".format("controls", "KB", "save ms", "restore ms",
+                                                                     "cmds save", "cmds restore", "skipped",
+                                                                     "max error"))
+    for result in results:
+        print("{controls:>9} {kilobytes:>8.1f} {save_ms_per_ctrl:>10.3f} {restore_ms_per_ctrl:>12.3f} "
+              "{cmds_save_ms_per_ctrl:>11.3f} {cmds_restore_ms_per_ctrl:>13.3f} {skipped:>8} "
+              "{max_error:>10.6f}".format(**result))
+
+    return results
+
+
+def twist_angles(matrices, parentmatrices):
+    # The twist in degrees around X of each (F, N, 4, 4) world matrix relative to the matching parent matrix
+    relative = np.matmul(matrices[..., :3, :3], np.linalg.inv(parentmatrices[..., :3, :3]))
+    quaternions = rm.quaternions_from_matrices(relative.reshape(-1, 3, 3)).reshape(relative.shape[:-2] + (4,))
+    return np.degrees(2.0 * np.arctan2(quaternions[..., 0], quaternions[..., 3]))
+
+
+def benchmark_twist(counts=(1, 3, 6, 12), frames=200):
+    # Build a forearm twist with twist_setup for each number of twist joints, against one orientConstraint per twist
+    # joint blending between the elbow and wrist, and time evaluating both over frames of keyed wrist twist and swing,
+    # to show the twist network's nodes and cost per twist joint fall as the count rises while the constraints' don't
+    framelist = list(range(1, frames + 1))
+    random = np.random.RandomState(0)
+    motion = [np.linspace(-150, 150, frames)] + [np.cumsum(random.uniform(-1, 1, frames)) for _ in range(2)]
+
+    results = []
+    for method in ["twist_setup", "orientConstraint"]:
+        for count in counts:
+            cmds.file(new=True, force=True)
+            components = bc.BuildComponents(char_name="Bench")
+            joints = test_chain(jointcount=3, length=10.0)
+            Bulk_Ops.key_attrs([("{}.rotate{}".format(joints[2], axis), values)
+                                for axis, values in zip("XYZ", motion)], framelist)
+
+            startnodes = scene_node_count()
+            if method == "twist_setup":
+                twistjnts = components.twist_setup(part_name="Bench", startjnt=joints[1],
+                                                   endjnt=joints[2], count=count)
+            else:
+                twistjnts = []
+                for num in range(count):
+                    jnt = components.create_joint("Bench_Twist_{}_JNT".format(num), parent=joints[1])
+                    cmds.setAttr(jnt + ".translateX", 10.0 * (num + 1) / (count + 1))
+                    weight = (num + 1.0) / (count + 1)
+                    constraint = cmds.orientConstraint(joints[1], joints[2], jnt, maintainOffset=True)[0]
+                    cmds.setAttr("{}.{}W0".format(constraint, joints[1]), 1.0 - weight)
+                    cmds.setAttr("{}.{}W1".format(constraint, joints[2]), weight)
+            nodes = scene_node_count() - startnodes
+
+            starttime = time.time()
+            matrices = Bulk_Ops.sample_world_matrices(twistjnts + joints[1:], framelist)
+            seconds = time.time() - starttime
+
+            # Each twist joint should have it's share of the wrist's twist relative to the elbow
+            elbow = matrices[:, -2:-1]
+            expected = twist_angles(matrices[:, -1:], elbow) * (np.arange(1, count + 1) / (count + 1.0))
+            error = (twist_angles(matrices[:, :-2], elbow) - expected + 180.0) % 360.0 - 180.0
+
+            results.append({
+                "method": method,
+                "twistjnts": count,
+                "nodes": nodes,
+                "nodes_per_jnt": nodes / float(count),
+                "ms_per_frame": seconds * 1000.0 / frames,
+                "us_per_jnt_frame": seconds * 1000000.0 / (frames * count),
+                "max_error": float(np.abs(error).max()),
+            })
+
+    print("{:<17} {:>9} {:>6} {:>10} {:>9} {:>15} {:>10}".format("method", "twistjnts", "nodes", "nodes/jnt",
+                                                               "ms/frame", "us/jnt/frame", "max error"))
+    for result in results:
+        print("{method:<17} {twistjnts:>9} {nodes:>6} {nodes_per_jnt:>10.2f} {ms_per_frame:>9.3f} "
+              "{us_per_jnt_frame:>15.2f} {max_error:>10.4f}".format(**result))
+
+    return results
+
+
+def benchmark_neck(counts=(3, 10, 30), frames=200):
+    # Build ribbon necks of each joint count, timing the build and counting the nodes created, then time evaluating
+    # the neck joints over frames of keyed neck and head controller motion, to show both costs stay flat per joint
+    framelist = list(range(1, frames + 1))
+    random = np.random.RandomState(0)
+    results = []
+    for count in counts:
+        cmds.file(new=True, force=True)
+        components = bc.BuildComponents(char_name="Bench")
+        cmds.group(name="Bench_Rig", empty=True)
+        joints = test_chain(name="Bench_Neck", jointcount=count, length=60.0 / (count - 1))
+
+        startnodes = scene_node_count()
+        starttime = time.time()
+        neck = components.neck_setup(neckjnt=joints[0], endjnt=joints[-1])
+        buildtime = time.time() - starttime
+        nodes = scene_node_count() - startnodes
+
+        # Smooth random motion on the neck's rotation and the head's translation and rotation
+        motion = []
+        for attr in ["{}.rotate{}".format(neck.neckgrp[1], axis) for axis in "XYZ"] + \
+                    ["{}.{}{}".format(neck.headctrl, attr, axis) for attr in ["translate", "rotate"] for axis in "XYZ"]:
+            motion.append((attr, np.cumsum(random.uniform(-0.5, 0.5, frames))))
+        Bulk_Ops.key_attrs(motion, framelist)
+
+        starttime = time.time()
+        Bulk_Ops.sample_world_matrices(joints, framelist)
+        evaltime = time.time() - starttime
+
+        results.append({
+            "joints": count,
+            "nodes": nodes,
+            "nodes_per_jnt": nodes / float(count),
+            "build_ms_per_jnt": buildtime * 1000.0 / count,
+            "ms_per_frame": evaltime * 1000.0 / frames,
+            "us_per_jnt_frame": evaltime * 1000000.0 / (frames * count),
+        })
+
+    print("{:>7} {:>6} {:>10} {:>13} {:>9} {:>15}".format("joints", "nodes", "nodes/jnt", "build ms/jnt",
+                                                        "ms/frame", "us/jnt/frame"))
+    for result in results:
+        print("{joints:>7} {nodes:>6} {nodes_per_jnt:>10.2f} {build_ms_per_jnt:>13.3f} {ms_per_frame:>9.3f} "
+              "{us_per_jnt_frame:>15.2f}".format(**result))
+
+    return results
+
+
+def benchmark_component_import(counts=(10, 50, 200), used=3,
+                               functions=200):
+    # Write each number of stand in studio component modules, with functions functions each, and time importing
+    # every one of them up front, against starting a ComponentRegistry from a manifest of them and resolving only the
+    # used components a character spec would ask for, to show startup stays flat as components are added
+    results = []
+    for count in counts:
+        folder = tempfile.mkdtemp(prefix="benchmark_components_")
+        names = ["Bench_Component_{}".format(num) for num in range(count)]
+        for name in names:
+            with open(os.path.join(folder, name + ".py"), "w") as outfile:
+                for num in range(functions):
+                    outfile.write("def helper_{0}(value):\n    return value * {0}\n\n".format(num))
+                outfile.write("def build(components, **kwargs):\n    return kwargs\n")
+        manifest = os.path.join(folder, "components.json")
+        with open(manifest, "w") as outfile:
+            json.dump({"components": {name: "{}:build".format(name) for name in names}}, outfile)
+        sys.path.insert(0, folder)
+
+        # Import once first so every timing below reads the same compiled files
+        for name in names:
+            importlib.import_module(name)
+
+        def unload():
+            for name in names:
+                sys.modules.pop(name, None)
+
+        unload()
+        starttime = time.time()
+        for name in names:
+            importlib.import_module(name)
+        eagerseconds = time.time() - starttime
+
+        unload()
+        starttime = time.time()
+        registry = Component_Registry.ComponentRegistry(manifests=[manifest], entrypoints=False)
+        registryseconds = time.time() - starttime
+        for name in names[:used]:
+            registry.resolve(name)
+        lazyseconds = time.time() - starttime
+
+        unload()
+        sys.path.remove(folder)
+        shutil.rmtree(folder)
+
+        results.append({
+            "components": count,
+            "used": min(used, count),
+            "eager_ms": eagerseconds * 1000.0,
+            "registry_ms": registryseconds * 1000.0,
+            "lazy_ms": lazyseconds * 1000.0,
+            "speedup": eagerseconds / max(lazyseconds, 1e-9),
+        })
+
+    # Scanning installed packages for entry points is a one off cost per registry
+    starttime = time.time()
+    Component_Registry.ComponentRegistry()
+    entrypointms = (time.time() - starttime) * 1000.0
+
+    print("{:>11} {:>5} {:>10} {:>12} {:>9} {:>8}".format("components", "used", "eager ms", "registry ms",
+                                                        "lazy ms", "speedup"))
+    for result in results:
+        print("{components:>11} {used:>5} {eager_ms:>10.2f} {registry_ms:>12.2f} {lazy_ms:>9.2f} "
+              "{speedup:>7.1f}x".format(**result))
+    print("Entry point scan: {:.2f} ms".format(entrypointms))
+
+    return results
+
+
+def benchmark_rig_instancing(counts=(10, 100, 500), asset_file=None,
+                             jointcount=100):
+    # Save shots of each number of instances of a rig asset, as full imported copies and as Rig_Publish references
+    # with one overridden control each, then time opening each shot and measure the memory it takes, to show
+    # referenced instances load faster and lighter as crowds grow
+    # asset_file can be a character published with publish_asset from it's build script, otherwise a stand in rig
+    # of a long_curve_rig on a chain of jointcount joints is published for the benchmark
+    folder = tempfile.mkdtemp(prefix="benchmark_instancing_")
+    if asset_file is None:
+        skeleton_file = os.path.join(folder, "Bench_Skeleton.ma")
+        cmds.file(new=True, force=True)
+        test_chain(jointcount=jointcount)
+        cmds.file(rename=skeleton_file)
+        cmds.file(save=True, type="mayaAscii")
+
+        def build():
+            components = bc.BuildComponents(char_name="Bench")
+            cmds.group(name="Bench_Rig", empty=True)
+            components.long_curve_rig(part_name="Tail", startjnt="Bench_0_JNT",
+                                      endjnt="Bench_{}_JNT".format(jointcount - 1), ctrlevery=10)
+            return components.controls.names()
+
+        asset_file = os.path.join(folder, "Bench_Rig.mb")
+        Rig_Publish.publish_rig(skeleton_file, asset_file, build,
+                                params={"char_name": "Bench", "jointcount": jointcount})
+    info = Rig_Publish.load_asset_info(asset_file)
+    ctrl = sorted(ctrl for ctrl, attrs in info["controls"].items() if "rotateY" in attrs)[0]
+
+    results = []
+    for count in counts:
+        for mode in ["copy", "reference"]:
+            cmds.file(new=True, force=True)
+            random = np.random.RandomState(0)
+            for num in range(count):
+                namespace = "Crowd_{}".format(num)
+                overrides = {ctrl: {"rotateY": float(random.uniform(-30, 30))}}
+                if mode == "reference":
+                    Rig_Publish.reference_instance(asset_file, namespace, overrides=overrides, info=info)
+                else:
+                    cmds.file(asset_file, i=True, namespace=namespace)
+                    cmds.setAttr("{}:{}.rotateY".format(namespace, ctrl), overrides[ctrl]["rotateY"])
+            shot_file = os.path.join(folder, "Bench_Shot_{}_{}.mb".format(mode, count))
+            cmds.file(rename=shot_file)
+            cmds.file(save=True, type="mayaBinary")
+
+            cmds.file(new=True, force=True)
+            startmemory = heap_megabytes()
+            starttime = time.time()
+            cmds.file(shot_file, open=True, force=True)
+            loadseconds = time.time() - starttime
+
+            results.append({
+                "instances": count,
+                "mode": mode,
+                "nodes": scene_node_count(),
+                "shot_kb": os.path.getsize(shot_file) / 1024.0,
+                "load_seconds": loadseconds,
+                "load_ms_per_instance": loadseconds * 1000.0 / count,
+                "memory_mb": heap_megabytes() - startmemory,
+            })
+
+    cmds.file(new=True, force=True)
+    shutil.rmtree(folder)
+
+    print("{:>10} {:<10} {:>8} {:>10} {:>10} {:>15} {:>10}".format("instances", "mode", "nodes", "shot KB",
+                                                                  "load s", "ms/instance", "memory MB"))
+    for result in results:
+        print("{instances:>10} {mode:<10} {nodes:>8} {shot_kb:>10.1f} {load_seconds:>10.3f} "
+              "{load_ms_per_instance:>15.3f} {memory_mb:>10.1f}".format(**result))
+
+    return results
+
+
+def benchmark_rig_math(counts=(10, 100, 1000, 10000), repeats=20):
+    # Time placing chains of each number of points with Rig_Math's batched functions, against lerping one scalar at
+    # a time the way vector_lerp used to, to show the per point cost drops as chains get longer instead of staying flat
+    random = np.random.RandomState(0)
+    results = []
+    for count in counts:
+        starts, ends = random.uniform(-50, 50, (2, count, 3))
+        percents = np.linspace(0, 1, count)
+        rotations = random.uniform(-90, 90, (count, 3))
+        scales = random.uniform(0.5, 2, (count, 3))
+
+        def timed(function):
+            starttime = time.time()
+            for repeat in range(repeats):
+                function()
+            return (time.time() - starttime) * 1000000.0 / (repeats * count)
+
+        def scalar_lerp():
+            for start, end, percent in zip(starts.tolist(), ends.tolist(), percents.tolist()):
+                tuple(((high - low) * percent) + low for low, high in zip(start, end))
+
+        matrices = rm.compose_matrices(starts, rotations, scales)
+        results.append({
+            "points": count,
+            "scalar_lerp_us": timed(scalar_lerp),
+            "lerp_us": timed(lambda: rm.lerp(starts, ends, percents[:, np.newaxis])),
+            "chain_lerp_us": timed(lambda: rm.lerp_points(starts[0], ends[0], percents)),
+            "compose_us": timed(lambda: rm.compose_matrices(starts, rotations, scales)),
+            "decompose_us": timed(lambda: rm.decompose_matrices(matrices, scales=True)),
+            "aim_us": timed(lambda: rm.aim_matrices(starts, ends)),
+            "mirror_us": timed(lambda: rm.mirror_matrices(matrices)),
+        })
+
+    print("{:>7} {:>12} {:>9} {:>10} {:>11} {:>13} {:>8} {:>10}".format("points", "scalar lerp", "lerp", "chain lerp",
+                                                                    "compose", "decompose", "aim", "mirror"))
+    for result in results:
+        print("{points:>7} {scalar_lerp_us:>12.3f} {lerp_us:>9.3f} {chain_lerp_us:>10.3f} {compose_us:>11.3f} "
+              "{decompose_us:>13.3f} {aim_us:>8.3f} {mirror_us:>10.3f}".format(**result))
+    print("All times are microseconds per point")
+
+    return results
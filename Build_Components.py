@@ -3,11 +3,23 @@ This script houses each of the rig components' build scripts, to get called by e
 """
 
 # Standard library imports
+import contextlib
+import time
 
 # Third party imports
+import numpy as np
 from maya import cmds
+try:
+    from maya.api import OpenMaya as om
+except ImportError:
+    # Building through Offline_Build, where there's no selection to watch
+    om = None
 
 # Local application imports
+import Bulk_Ops
+import Rig_Math as rm
+import Shape_Store
+import Skin_Weights
 
 
 
@@ -19,14 +31,141 @@ TODO Swap out `var + "" + var` for "{}{}".format(var, var)
 """
 
 
+# Default finger layout for hand_setup, with each finger's name and joint count, and the rotation (x,y,z) each of the
+# hand's poses adds to each of it's joints, at the pose attribute's full value. Joints missing from a pose aren't moved
+HAND_LAYOUT = [
+    {"name": "Thumb", "joints": 3,
+     "poses": {"Fist": [(0,10,0), (0,45,0), (0,45,0)], "Spread": [(0,0,-20)]}},
+    {"name": "Index", "joints": 4,
+     "poses": {"Fist": [(0,0,0), (0,70,0), (0,90,0), (0,90,0)], "Spread": [(0,0,0), (0,0,-10)]}},
+    {"name": "Middle", "joints": 4,
+     "poses": {"Fist": [(0,0,0), (0,70,0), (0,90,0), (0,90,0)], "Spread": [(0,0,0), (0,0,-3)]}},
+    {"name": "Ring", "joints": 4,
+     "poses": {"Fist": [(0,0,0), (0,70,0), (0,90,0), (0,90,0)], "Spread": [(0,0,0), (0,0,10)]}},
+    {"name": "Pinky", "joints": 4,
+     "poses": {"Fist": [(0,0,0), (0,70,0), (0,90,0), (0,90,0)], "Spread": [(0,0,0), (0,0,20)]}},
+]
+
+
+class ControlRecord(object):
+    """
+    A single controller created by BuildComponents.controllers_setup, with the information needed to find it again
+    """
+    def __init__(self, name, group,
+                 side, component,
+                 role):
+        self.name = name
+        self.group = group
+        self.side = side
+        self.component = component
+        self.role = role
+        # The groups lean_hierarchy folded into the control's offsetParentMatrix, after which group is the control
+        self.folded = []
+
+    def __repr__(self):
+        return "ControlRecord({}, side={}, component={}, role={})".format(self.name, self.side,
+                                                                          self.component, self.role)
+
+
+class ControlRegistry(object):
+    """
+    Keeps track of every controller created during a build, so rig clean up can work with all the controls at once
+        instead of searching the scene for them
+    """
+    def __init__(self):
+        self.records = []
+        # {group: control} for every group lean_hierarchy folded into a control's offsetParentMatrix
+        self.folded = {}
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+    def add(self, name, group,
+            component="", role=""):
+        # Work out the side from the Lf_/Rt_/Ct_ naming prefix, with anything else counting as centre
+        side = name.split("_")[0]
+        if side not in ["Lf", "Rt", "Ct"]:
+            side = "Ct"
+
+        record = ControlRecord(name, group, side, component, role)
+        self.records.append(record)
+        return record
+
+    def find(self, side=None,
+             component=None, role=None):
+        # Return every record matching all of the given filters, with None matching anything
+        return [record for record in self.records
+                if (side is None or record.side == side)
+                and (component is None or record.component == component)
+                and (role is None or record.role == role)]
+
+    def names(self, side=None,
+              component=None, role=None):
+        # Return the controller names for every record matching the given filters
+        return [record.name for record in self.find(side=side, component=component, role=role)]
+
+    def resolve(self, node):
+        # The node standing in for node, which is the control it was folded into if it's a group lean_hierarchy
+        # removed, or else node itself
+        return self.folded.get(node, node)
+
+    def groups(self):
+        # Return an ordered list of (side, component) pairs that have at least one control
+        groups = []
+        for record in self.records:
+            if (record.side, record.component) not in groups:
+                groups.append((record.side, record.component))
+        return groups
+
+
+def _resolve_names(value, folded):
+    # value with any node names in folded swapped for what they map to, through lists, tuples and dicts
+    if isinstance(value, str):
+        return folded.get(value, value)
+    if isinstance(value, (list, tuple)):
+        return type(value)(_resolve_names(item, folded) for item in value)
+    if isinstance(value, dict):
+        return {key: _resolve_names(item, folded) for key, item in value.items()}
+    return value
+
+
 class BuildComponents(object):
     """
     This class has functions for each of the body parts required for most rigs, to be called by
         each character's specific build script
     """
-    def __init__(self, char_name):
+    # LOD_FULL   - The full rig
+    # LOD_MEDIUM - Fewer ribbon joints, one fused control per finger, and a simplified digitigrade leg
+    # LOD_LOW    - As LOD_MEDIUM, with FK only arms and legs, without any FKIK blending
+    LOD_FULL = 0
+    LOD_MEDIUM = 1
+    LOD_LOW = 2
+
+    def __init__(self, char_name,
+                 instance_shapes=False, lod=0,
+                 lean=False):
         # Set up char_name as a class-wide variable to be used in the class' functions
         self.char_name = char_name
+        # Level of detail for the whole rig, from LOD_FULL down to LOD_LOW, where every level drives the same
+        # bind joints, but lower levels build lighter networks for layout and crowds
+        if lod not in [self.LOD_FULL, self.LOD_MEDIUM, self.LOD_LOW]:
+            raise ValueError("LOD {} not recognised".format(lod))
+        self.lod = lod
+        # Default for controllers_setup's instance flag, and the shared master shapes created for it so far
+        self.instance_shapes = instance_shapes
+        self.shape_masters = {}
+        # Every controller made by controllers_setup gets registered here
+        self.controls = ControlRegistry()
+        # Every component's result object, so lean_hierarchy can point them at the controls it folds groups into
+        self.results = []
+        # With lean, lean_hierarchy folds the controls' groups into their offsetParentMatrix once the rig is built
+        self.lean = lean
+        # Set by quiet_build, to skip any selection changes the build doesn't need
+        self.quiet = False
+        self.selectionsavoided = 0
         self.enum_kwargs = {
             "exists":True,
             "hidden":False,
@@ -38,17 +177,67 @@ class BuildComponents(object):
     def lerp(self, min,
              max, percent): #linear_interpolate
         # Return float between min and max based on the percent (0-1)
-        return ((max - min) * percent) + min
+        return float(rm.lerp(min, max, percent))
 
 
     def vector_lerp(self, min,
                     max, percent): #vector_linear_interpolate
         # Get a 3 axis point between min (x,y,z) and max (x,y,z) based on the percent (0-1), and return (x,y,z)
-        x = self.lerp(min[0], max[0], percent)
-        y = self.lerp(min[1], max[1], percent)
-        z = self.lerp(min[2], max[2], percent)
+        # Use rm.lerp_points directly for more than one point, which places them all at once
+        return tuple(rm.lerp_points(min, max, percent))
 
-        return x, y, z
+
+    def deselect(self):
+        # Clear the selection, unless this is a quiet build, where nothing relies on the selection
+        if self.quiet:
+            self.selectionsavoided = self.selectionsavoided + 1
+            return
+        cmds.select(deselect=True)
+
+
+    def create_joint(self, name,
+                     parent=None, position=None):
+        # Create a joint without going through the selection, optionally under parent and at a world position
+        kwargs = {"name": name, "skipSelect": True}
+        if parent:
+            kwargs["parent"] = parent
+        jnt = cmds.createNode("joint", **kwargs)
+        if position is not None:
+            cmds.xform(jnt, translation=position, worldSpace=True)
+        return jnt
+
+
+    @contextlib.contextmanager
+    def quiet_build(self, report=True):
+        # Build without changing the selection where the build doesn't need to, with viewport refresh suspended and
+        # undo recording turned off, then put the selection back and print how many selection changes were avoided
+        selection = cmds.ls(selection=True)
+        undostate = cmds.undoInfo(query=True, state=True)
+        selectionevents = [0]
+
+        def selectionchanged(*args):
+            selectionevents[0] = selectionevents[0] + 1
+
+        callback = om.MEventMessage.addEventCallback("SelectionChanged", selectionchanged) if om else None
+        self.quiet = True
+        self.selectionsavoided = 0
+        cmds.refresh(suspend=True)
+        cmds.undoInfo(stateWithoutFlush=False)
+        try:
+            yield self
+        finally:
+            cmds.undoInfo(stateWithoutFlush=undostate)
+            cmds.refresh(suspend=False)
+            self.quiet = False
+            if callback is not None:
+                om.MMessage.removeCallback(callback)
+            if selection:
+                cmds.select(selection, replace=True, noExpand=True)
+            else:
+                cmds.select(clear=True)
+            if report:
+                print("Quiet build: {} selection changes avoided, {} made by node creation commands".format(
+                    self.selectionsavoided, selectionevents[0]))
 
 
     def create_follicle(self, nurbssurf,
@@ -101,25 +290,68 @@ class BuildComponents(object):
             cmds.setAttr("{}.visibility".format(obj), **kwargs)
 
 
-    def controllers_setup(self, part_name,
-                          shape="circle", scale=(1,1,1),
-                          rotation=(0,0,0), position=(0,0,0),
-                          colour=""):
-        # To be used by other parts of this script for creating a variety of controllers
-        # Create empty group
-        newgroup = cmds.group(name="{}_GRP".format(part_name), empty=True)
-        shapename = "{}_CTRL".format(part_name)
+    def rig_report(self, basenodes=None,
+                   frames=48):
+        # Count the nodes created by the build, by type, and time playback over a number of frames with every
+        # registered controller animated, so different LODs of the same character can be compared
+        # basenodes is the list of nodes that were in the scene before the build, e.g. from cmds.ls() on the skeleton
+        newnodes = set(cmds.ls()) - set(basenodes or [])
+        nodetypes = {}
+        for node in newnodes:
+            nodetype = cmds.nodeType(node)
+            nodetypes[nodetype] = nodetypes.get(nodetype, 0) + 1
+
+        # Key a rotation on every controller that has an unlocked rotateX, so each frame has to evaluate the rig
+        animctrls = [ctrl for ctrl in self.controls.names()
+                     if cmds.getAttr("{}.rotateX".format(ctrl), keyable=True)
+                     and not cmds.getAttr("{}.rotateX".format(ctrl), lock=True)]
+        starttime = cmds.currentTime(query=True)
+        if animctrls:
+            cmds.setKeyframe(animctrls, attribute="rotateX", time=starttime, value=0)
+            cmds.setKeyframe(animctrls, attribute="rotateX", time=starttime + frames, value=10)
+
+        playbackstart = time.time()
+        for frame in range(frames):
+            cmds.currentTime(starttime + frame, update=True)
+        playbacktime = time.time() - playbackstart
+
+        # Remove the test animation again
+        if animctrls:
+            cmds.cutKey(animctrls, attribute="rotateX", clear=True)
+            for ctrl in animctrls:
+                cmds.setAttr("{}.rotateX".format(ctrl), 0)
+        cmds.currentTime(starttime, update=True)
+
+        report = {
+            "lod": self.lod,
+            "nodes": len(newnodes),
+            "nodetypes": nodetypes,
+            "controls": len(self.controls),
+            "ms_per_frame": playbacktime * 1000.0 / max(frames, 1),
+        }
+
+        print("LOD {}: {} nodes, {} controls, {:.3f} ms per frame".format(report["lod"], report["nodes"],
+                                                                       report["controls"], report["ms_per_frame"]))
+        for nodetype, count in sorted(nodetypes.items(), key=lambda item: -item[1]):
+            print("    {:<24} {}".format(nodetype, count))
 
+        return report
+
+
+    def control_curve(self, name,
+                      shape="circle", scale=(1,1,1),
+                      rotation=(0,0,0), position=(0,0,0)):
+        # Create a single NURBS curve transform in the given shape, with scale, rotation and position baked in
         if shape in "circle":
             # Create circle NURBS curve
-            newshape = cmds.circle(name=shapename, constructionHistory=False)
+            newshape = cmds.circle(name=name, constructionHistory=False)
             newshape = newshape[0] # Make sure that newshape is only a single string instead of [objectname,  shapename]
 
         elif shape in "square":
             # Create square NURBS curve
             newshape = cmds.curve(degree=1, 
                                     point=[(-.5, .5, 0), (.5, .5, 0), (.5, -.5, 0), (-.5, -.5, 0), (-.5, .5, 0)],
-                                    name=shapename)
+                                    name=name)
 
         elif shape in "cube":
             # Create cube NURBS curve
@@ -127,30 +359,26 @@ class BuildComponents(object):
                                     point=[(-0.5, -0.5, .5), (-0.5, .5, .5), (.5, .5, .5), (.5, -0.5, .5), (.5, -0.5, -0.5), (.5, .5, -0.5),
                                      (-0.5, .5, -0.5), (-0.5, -0.5, -0.5), (.5, -0.5, -0.5), (.5, .5, -0.5), (.5, .5, .5),
                                      (-0.5, .5, .5), (-0.5, .5, -0.5), (-0.5, -0.5, -0.5), (-0.5, -0.5, .5), (.5, -0.5, .5)],
-                                    name=shapename)
+                                    name=name)
 
         elif shape in "pointedsquare":
             newshape = cmds.curve(degree=1,
                                     point=[(0,0,0), (1,1,0), (2,1,0), (2,2,0), (1,2,0), (1,1,0)],
-                                    name=shapename)
+                                    name=name)
 
         elif shape in "starcircle":
-            newshape = cmds.circle(name=shapename, constructionHistory=False)
+            newshape = cmds.circle(name=name, constructionHistory=False)
             newshape = newshape[0]
-            cmds.select(deselect=True)
-            for x in range(0, 7)[::2]:
-                cmds.select('{}.cv[{}]'.format(newshape, x), toggle=False, add=True)
-            cmds.selectMode(component=True)
-            cmds.xform(scale=(.4, .4, .4))
-            cmds.selectMode(object=True)
-            cmds.bakePartialHistory(newshape)
+            # Scale every other CV in towards the centre, without going through the selection
+            cvs = ['{}.cv[{}]'.format(newshape, x) for x in range(0, 7)[::2]]
+            cmds.scale(.4, .4, .4, cvs, pivot=(0, 0, 0), objectSpace=True)
 
 
         elif shape in "scapctrl":
             newshape = cmds.curve(degree=1,
                                     point=[(0,0,-2), (1,1,-2), (1,2,0), (1,1,2), (0,0,2),
                                      (-1,1,2), (-1,2,0), (-1,1,-2), (0,0,-2)],
-                                    name=shapename)
+                                    name=name)
         else:
             raise ValueError("Shape {} not recognised".format(shape))
 
@@ -162,27 +390,278 @@ class BuildComponents(object):
         cmds.makeIdentity(newshape, apply=True)
         cmds.bakePartialHistory(newshape)
 
+        return newshape
+
+
+    def shape_master(self, shape="circle",
+                     scale=(1,1,1), rotation=(0,0,0),
+                     position=(0,0,0)):
+        # Return the shared master curve shape for this shape and placement, creating it the first time it's needed
+        key = (shape, tuple(scale), tuple(rotation), tuple(position))
+        if key in self.shape_masters:
+            return self.shape_masters[key]["shape"]
+
+        # Keep all master shapes under one hidden group, so they're never drawn or selected themselves
+        mastersgrp = "{}_ControlShapes".format(self.char_name)
+        if not cmds.ls(mastersgrp):
+            cmds.group(name=mastersgrp, empty=True)
+            if cmds.ls("{}_Rig".format(self.char_name)):
+                cmds.parent(mastersgrp, "{}_Rig".format(self.char_name))
+            cmds.hide(mastersgrp)
+            self.lockhideattr(mastersgrp, hide=False)
+
+        master = self.control_curve("{}_{}_MasterShape".format(shape, len(self.shape_masters)), shape=shape,
+                                    scale=scale, rotation=rotation, position=position)
+        cmds.parent(master, mastersgrp)
+        mastershape = cmds.listRelatives(master, shapes=True, children=True)[0]
+
+        # Every instance saves a copy of the CV positions and knots, stored as doubles
+        cvcount = len(cmds.getAttr("{}.cv[*]".format(mastershape)))
+        spans = cmds.getAttr("{}.spans".format(mastershape))
+        degree = cmds.getAttr("{}.degree".format(mastershape))
+        databytes = (cvcount * 3 + spans + 2 * degree - 1) * 8
+
+        self.shape_masters[key] = {"shape": mastershape, "bytes": databytes, "instances": 0}
+
+        return mastershape
+
+
+    def controllers_setup(self, part_name,
+                          shape="circle", scale=(1,1,1),
+                          rotation=(0,0,0), position=(0,0,0),
+                          colour="", instance=None,
+                          component="", role=""):
+        # To be used by other parts of this script for creating a variety of controllers
+        # If instance is True, the control shares a single curve shape with every other control with the same
+        # shape, scale, rotation and position, rather than having it's own copy of the curve data
+        if instance is None:
+            instance = self.instance_shapes
+
+        # Create empty group
+        newgroup = cmds.group(name="{}_GRP".format(part_name), empty=True)
+        shapename = "{}_CTRL".format(part_name)
+
+        if instance:
+            # Create an empty transform, and add the master shape underneath it as an instance
+            mastershape = self.shape_master(shape=shape, scale=scale, rotation=rotation, position=position)
+            self.shape_masters[(shape, tuple(scale), tuple(rotation), tuple(position))]["instances"] += 1
+            newshape = cmds.createNode("transform", name=shapename)
+            cmds.parent(mastershape, newshape, addObject=True, shape=True)
+
+            # Instanced shapes are shared, so colour the controller using the transform's override instead
+            colourtarget = newshape
+        else:
+            newshape = self.control_curve(shapename, shape=shape, scale=scale, rotation=rotation, position=position)
+            colourtarget = cmds.listRelatives(newshape, shapes=True, children=True)[0]
+
 
         # Set controller colour
-        shapeshape = cmds.listRelatives(newshape, shapes=True, children=True)[0]
-        cmds.setAttr("{}.overrideEnabled".format(shapeshape), True)
+        cmds.setAttr("{}.overrideEnabled".format(colourtarget), True)
         if not colour:
             pass
         elif colour in "blue":
-            cmds.setAttr("{}.overrideColor".format(shapeshape), 18)
+            cmds.setAttr("{}.overrideColor".format(colourtarget), 18)
         elif colour in "yellow":
-            cmds.setAttr("{}.overrideColor".format(shapeshape), 22)
+            cmds.setAttr("{}.overrideColor".format(colourtarget), 22)
 
         # Parent the new NURBS object to the created group
         cmds.parent(newshape, newgroup)
 
+        # Register the controller with the side, component and role it belongs to
+        self.controls.add(newshape, newgroup, component=component, role=role)
+
         # Deselect everything to make sure it doesn't mess with other parts of the code
-        cmds.select(deselect=True)
+        self.deselect()
 
         # Pass back out the name of the controller's group and controller itself
         return newgroup, newshape
 
 
+    def assign_controls(self, displaylayer="Controls_Disp",
+                        tag=True, selectionsets=True):
+        # Add every registered controller to the display layer, tag them as controllers, and create selection sets,
+        # with a single command for each rather than one per controller
+        ctrls = self.controls.names()
+        if not ctrls:
+            return []
+
+        cmds.editDisplayLayerMembers(displaylayer, ctrls, noRecurse=True)
+
+        # Controller tags let Maya's evaluation prefetch the controllers' networks
+        if tag:
+            cmds.controller(ctrls)
+
+        controlsets = []
+        if selectionsets:
+            # One selection set per side and component, all gathered in one set for the whole character
+            for side, component in self.controls.groups():
+                setname = "{}_{}_Controls_SET".format(side, component) if component else "{}_Controls_SET".format(side)
+                controlsets.append(cmds.sets(self.controls.names(side=side, component=component),
+                                             name=setname))
+            controlsets.append(cmds.sets(controlsets, name="{}_Controls_SET".format(self.char_name)))
+
+        return controlsets
+
+
+    def save_control_shapes(self, path):
+        # Save the curve shapes of every registered control to path, so hand tweaks can be put back after a rebuild
+        return Shape_Store.ShapeStore.capture(self.controls.names()).save(path)
+
+
+    def restore_control_shapes(self, path):
+        # Put control shapes saved with save_control_shapes back onto the registered controls, in a single API pass
+        # Returns the controls that couldn't take their saved shapes
+        return Shape_Store.ShapeStore.load(path).apply(self.controls.names())
+
+
+    def keep_result(self, result):
+        # Keep a component's result object, for lean_hierarchy to update, and pass it back
+        self.results.append(result)
+        return result
+
+
+    def _foldable_group(self, grp):
+        # Whether a group can be folded into the offsetParentMatrix of the node below it, which it can if it's a
+        # plain _GRP transform with a single child, nothing reading from it, and nothing driving it other than
+        # non constraint connections into it's translate, rotate and scale
+        if not grp.endswith("_GRP") or cmds.nodeType(grp) != "transform":
+            return False
+        if len(cmds.listRelatives(grp, children=True) or []) != 1:
+            return False
+        if cmds.listConnections(grp, source=False, destination=True):
+            return False
+        for destination, source in zip(*[iter(cmds.listConnections(grp, source=True, destination=False,
+                                                                   connections=True, plugs=True) or [])] * 2):
+            attr = destination.split(".", 1)[1]
+            if not attr.startswith(("translate", "rotate", "scale")) or attr.startswith("rotatePivot") or \
+                    attr.startswith("scalePivot") or "constraint" in cmds.nodeType(source.split(".")[0]).lower():
+                return False
+        return True
+
+
+    def lean_hierarchy(self):
+        # Fold every registered control's _GRP and _Offset_GRP transforms into the control's offsetParentMatrix,
+        # so each control sits straight under the node that was above it's groups. Groups with driven translate,
+        # rotate or scale, like the hand pose _Offset_GRPs, become a composeMatrix feeding a multMatrix instead
+        # Groups that are constrained, read from, or hold more than one child are kept. The removed groups are
+        # swapped for their controls in every component's result object and control record, and kept in
+        # self.controls.folded. Run this after the rig is cleaned up, so the groups get locked rather than the controls
+        folded = []
+        for record in self.controls:
+            ctrl = record.name
+            groups = []
+            node = ctrl
+            while True:
+                parent = cmds.listRelatives(node, parent=True)
+                if not parent or not self._foldable_group(parent[0]):
+                    break
+                groups.append(parent[0])
+                node = parent[0]
+            if not groups:
+                continue
+
+            # The control's world matrix is its local matrix, times it's own offset parent matrix, times each
+            # group's local and offset parent matrix going up, so gather those in order, multiplying the static
+            # ones together, and using a composeMatrix for any group with driven transforms
+            terms = []
+            constant = np.reshape(cmds.getAttr("{}.offsetParentMatrix".format(ctrl)), (4, 4))
+            for grp in groups:
+                grpopm = np.reshape(cmds.getAttr("{}.offsetParentMatrix".format(grp)), (4, 4))
+                if not cmds.listConnections(grp, source=True, destination=False):
+                    constant = np.matmul(constant, np.matmul(np.reshape(cmds.xform(grp, query=True, matrix=True), (4, 4)), grpopm))
+                    continue
+                terms.append(constant)
+                compose = cmds.createNode("composeMatrix", name=grp.replace("_GRP", "_CM"), skipSelect=True)
+                for attr in ["translate", "rotate", "scale"]:
+                    # Move across a connection into the whole compound, or else into each channel, setting the rest
+                    source = cmds.connectionInfo("{}.{}".format(grp, attr), sourceFromDestination=True)
+                    if source:
+                        cmds.connectAttr(source, "{}.input{}".format(compose, attr.capitalize()))
+                        continue
+                    for axis in "XYZ":
+                        plug = "{}.{}{}".format(grp, attr, axis)
+                        source = cmds.connectionInfo(plug, sourceFromDestination=True)
+                        if source:
+                            cmds.connectAttr(source, "{}.input{}{}".format(compose, attr.capitalize(), axis))
+                        else:
+                            cmds.setAttr("{}.input{}{}".format(compose, attr.capitalize(), axis), cmds.getAttr(plug))
+                cmds.setAttr("{}.inputRotateOrder".format(compose), cmds.getAttr("{}.rotateOrder".format(grp)))
+                terms.append("{}.outputMatrix".format(compose))
+                constant = grpopm
+            terms.append(constant)
+            terms = [term for term in terms if not (isinstance(term, np.ndarray) and np.allclose(term, np.identity(4)))]
+
+            # Move the control above all of it's groups, keeping it's own translate and rotate values
+            above = cmds.listRelatives(groups[-1], parent=True)
+            if above:
+                cmds.parent(ctrl, above[0], relative=True)
+            else:
+                cmds.parent(ctrl, world=True, relative=True)
+            if not terms:
+                cmds.setAttr("{}.offsetParentMatrix".format(ctrl), list(np.identity(4).ravel()), type="matrix")
+            elif len(terms) == 1 and isinstance(terms[0], np.ndarray):
+                cmds.setAttr("{}.offsetParentMatrix".format(ctrl), list(terms[0].ravel()), type="matrix")
+            else:
+                multmatrix = cmds.createNode("multMatrix", name="{}_OPM_MM".format(ctrl), skipSelect=True)
+                for index, term in enumerate(terms):
+                    if isinstance(term, np.ndarray):
+                        cmds.setAttr("{}.matrixIn[{}]".format(multmatrix, index), list(term.ravel()), type="matrix")
+                    else:
+                        cmds.connectAttr(term, "{}.matrixIn[{}]".format(multmatrix, index))
+                cmds.connectAttr("{}.matrixSum".format(multmatrix), "{}.offsetParentMatrix".format(ctrl))
+
+            cmds.delete(groups[-1])
+            record.group = ctrl
+            record.folded = groups
+            self.controls.folded.update((grp, ctrl) for grp in groups)
+            folded += groups
+
+        # Point the result objects at the controls standing in for the removed groups
+        for result in self.results:
+            for attr, value in vars(result).items():
+                setattr(result, attr, _resolve_names(value, self.controls.folded))
+
+        self.deselect()
+
+        return folded
+
+
+    def hierarchy_report(self, root=None):
+        # Count the transforms under root, the character's _Rig group by default, along with their deepest and
+        # average DAG depth below it
+        root = root or "{}_Rig".format(self.char_name)
+        transforms = cmds.listRelatives(root, allDescendents=True, type="transform", fullPath=True) or []
+        rootdepth = cmds.ls(root, long=True)[0].count("|")
+        depths = [transform.count("|") - rootdepth for transform in transforms]
+        report = {
+            "lean": self.lean,
+            "transforms": len(transforms),
+            "max_depth": max(depths) if depths else 0,
+            "mean_depth": sum(depths) / float(len(depths)) if depths else 0.0,
+        }
+
+        print("Lean {lean}: {transforms} transforms, max depth {max_depth}, mean depth {mean_depth:.2f}".format(**report))
+
+        return report
+
+
+    def shape_instancing_report(self):
+        # Report how many controls share each master shape, and roughly how much curve data that saved
+        report = {"masters": len(self.shape_masters), "instances": 0, "bytes_saved": 0}
+        for (shape, scale, rotation, position), master in sorted(self.shape_masters.items()):
+            # The first instance still needs the data once, so only the extra instances are savings
+            saved = master["bytes"] * max(master["instances"] - 1, 0)
+            report["instances"] += master["instances"]
+            report["bytes_saved"] += saved
+            print("{:<14} scale={:<16} {:>4} instances, {:>8} bytes saved".format(shape, str(scale),
+                                                                               master["instances"], saved))
+
+        print("{} controls share {} master shapes, saving {} bytes of curve data".format(report["instances"],
+                                                                                   report["masters"],
+                                                                                   report["bytes_saved"]))
+        return report
+
+
     def twopointnurbpatch(self, part_name="",
                           startjnt="", endjnt=""):
         # Get start and end jnt's position and rotation
@@ -190,12 +669,14 @@ class BuildComponents(object):
         start_rot = cmds.xform(startjnt, query=True, rotation=True,  worldSpace=True)
         end_pos =   cmds.xform(endjnt,   query=True, translation=True, worldSpace=True)
 
-        mid_pos = self.vector_lerp(start_pos, end_pos, .5)
+        # The points a quarter of the way apart from start to end, for the locators and the surface's curves
+        crvpoints = rm.lerp_points(start_pos, end_pos, [0, .25, .5, .75, 1])
+        mid_pos = tuple(crvpoints[2])
 
         for locator in ["Start", "Mid", "End"]:
             # For each item in list, create a locator and joint, and parent the joint to the locator
             newloc = cmds.spaceLocator(name="{}_{}_LOC".format(part_name, locator))
-            cmds.joint(name="{}_{}_JNT".format(part_name, locator))
+            self.create_joint("{}_{}_JNT".format(part_name, locator), parent=newloc[0])
             cmds.parent(newloc, "{}_RIGJOINTS".format(part_name))
 
         startloc = "{}_Start_LOC".format(part_name)
@@ -206,30 +687,16 @@ class BuildComponents(object):
         cmds.xform(midloc,   translation=mid_pos,   rotation=start_rot, worldSpace=True)
         cmds.xform(endloc,   translation=end_pos,   rotation=start_rot, worldSpace=True)
 
-        # Set joint orient for the start joint using a temporary joint placed at the end object location
-        tempjnt = cmds.joint(name="temp_JNT")
-        cmds.xform(tempjnt, translation=end_pos, worldSpace=True)
-        cmds.parent(tempjnt, "{}_Start_JNT".format(part_name))
-        cmds.joint("{}_Start_JNT".format(part_name), edit=True, orientJoint="xyz")
-        cmds.delete(tempjnt)
-
-        # Copy joint orient from start joint and apply to all subsequent joints
-        for joint in ["Mid", "End"]:
-            cmds.joint("{}_{}_JNT".format(part_name, joint), edit=True, orientation=(cmds.joint("{}_Start_JNT".format(part_name), query=True, orientation=True)))
-
-        # Create curve based on joint positions, then duplicate first joint and parent curve to joint
-        for i, trans in zip(["A", "B"], [(0, 1, 0), (0, -1, 0)]):
-            newcrv = cmds.curve(name="{}_{}_CrvTemp".format(part_name, i), degree=1,
-                                point=[start_pos,
-                                   self.vector_lerp(start_pos, end_pos, .25),
-                                   self.vector_lerp(start_pos, end_pos, .50),
-                                   self.vector_lerp(start_pos, end_pos, .75),
-                                   end_pos])
-            newjnt = cmds.duplicate("{}_Start_JNT".format(part_name), name="{}_{}_JNT".format(part_name, i))
-            cmds.parent(newcrv, newjnt)
-            cmds.parent(newjnt, world=True)
-            # Move both joints 1 unit away from each other in +y and -y
-            cmds.xform(newjnt[0], translation=trans, relative=True, objectSpace=True)
+        # Compute the start joint's orient aiming at the end position, relative to it's locator's rotation,
+        # and copy it to all the subsequent joints, as their locators all share the same rotation
+        jntorient, jntmatrix = rm.joint_orients(start_pos, end_pos, parent_rotations=start_rot)
+        for joint in ["Start", "Mid", "End"]:
+            cmds.joint("{}_{}_JNT".format(part_name, joint), edit=True, orientation=tuple(jntorient))
+
+        # Create two curves along the joint positions, offset 1 unit either side along the start joint's Y axis
+        for i, offset in zip(["A", "B"], [jntmatrix[1], -jntmatrix[1]]):
+            cmds.curve(name="{}_{}_CrvTemp".format(part_name, i), degree=1,
+                       point=[tuple(point) for point in crvpoints + offset])
 
         # Loft the two curves to create a NURBS surface
         nrbpatch = cmds.loft("{}_A_CrvTemp".format(part_name), "{}_B_CrvTemp".format(part_name), name="{}_NRB".format(part_name))
@@ -240,7 +707,7 @@ class BuildComponents(object):
 
         # Delete two temporary curves, as they aren't needed any more
         for i in ["A", "B"]:
-            cmds.delete("{}_{}_JNT".format(part_name, i))
+            cmds.delete("{}_{}_CrvTemp".format(part_name, i))
 
         return nrbpatch, (startloc, midloc, endloc)
 
@@ -270,19 +737,15 @@ class BuildComponents(object):
 
         rbnjntscount = len(rbnjnts)
 
-        # Append each joints' positions to rbnjntspos
-        rbnjntspos = []
-        for joint in rbnjnts:
-            rbnjntspos.append(cmds.xform(joint, query=True, translation=True, worldSpace=True))
+        # Every joint's world matrix, read in one pass
+        jntmatrices = Bulk_Ops.world_matrices(rbnjnts)
 
-        for i, trans in zip(["A", "B"], [(0, 1, 0), (0, -1, 0)]):
-            newcrv = cmds.curve(name="{}_{}_CrvTemp".format(part_name, i), degree=1, p=rbnjntspos)
-            cmds.select(deselect=True)
-            newjnt = cmds.duplicate("{}_1_JNT".format(part_name), name="{}_{}_JNT".format(part_name, i), parentOnly=True)
-            cmds.parent(newcrv, newjnt)
-            cmds.parent(newjnt, world=True)
-            # Move both joints 1 unit away from each other in +y and -y
-            cmds.xform(newjnt, translation=trans, relative=True, objectSpace=True)
+        # Create two curves along the joint positions, offset 1 unit either side along each joint's Y axis
+        positions = jntmatrices[:, 3, :3]
+        yaxes = rm.normalize(jntmatrices[:, 1, :3])
+        for i, offset in zip(["A", "B"], [yaxes, -yaxes]):
+            cmds.curve(name="{}_{}_CrvTemp".format(part_name, i), degree=1,
+                       point=[tuple(point) for point in positions + offset])
 
         # Loft the two curves to create a NURBS surface
         nrbpatch = cmds.loft("{}_A_CrvTemp".format(part_name), "{}_B_CrvTemp".format(part_name), name="{}_NRB".format(part_name))
@@ -290,7 +753,7 @@ class BuildComponents(object):
 
         # Delete two temporary curves, as they aren't needed any more
         for crv in ["A", "B"]:
-            cmds.delete("{}_{}_JNT".format(part_name, crv))
+            cmds.delete("{}_{}_CrvTemp".format(part_name, crv))
 
         return nrbpatch, rbnjntscount
 
@@ -298,8 +761,11 @@ class BuildComponents(object):
     def ribbon_setup(self, part_name="",
                      startjnt="", endjnt="",
                      bindjointcount=5, method="twoloc",
-                     skin=True, reverse=False):
+                     skin=True, reverse=False,
+                     weightsdir=""):
         # To be used by other parts of this script or externally for creating ribbon rigs
+        # If weightsdir holds weights saved with Skin_Weights for this ribbon's {part_name}_NRB surface, they're put
+        # back onto the surface after it's bound
         # Create a group for the current ribbon setup, and make some child groups for it
         rbngrp = cmds.group(n="{}_RBN_Rig".format(part_name), empty=True)
         for group in ["FOLLICLES", "RIGJOINTS"]:
@@ -315,23 +781,23 @@ class BuildComponents(object):
 
         cmds.parent(nrbpatch[0], "{}_RBN_Rig".format(part_name))
 
-        rbnjoints = []
+        # Lower LODs use fewer follicles along twoloc ribbons, keeping at least the start, middle and end
+        if method == "twoloc" and self.lod == self.LOD_MEDIUM:
+            bindjointcount = max(3, (bindjointcount + 1) // 2)
+        elif method == "twoloc" and self.lod == self.LOD_LOW:
+            bindjointcount = min(bindjointcount, 3)
 
-        # Create a specific number of follicles on the new NURBS surface based on bindjointcount
-        foll_cur_name = 0
+        # Create a specific number of follicles on the new NURBS surface based on bindjointcount, each with a joint
+        # parented under it, in bulk so long ribbons cost the same per follicle as short ones
+        # create_follicles returns the follicle transforms, the same as the create_follicle loop this replaced, so the
+        # joints go under the transforms the follicle shapes drive, not under the shapes themselves
         flcgrp = part_name + "_FOLLICLES"
-        for i in range(0, bindjointcount):
-            # Create follicle on the nurbs surface using the create_follicle function
-            # Then rename it and parent it to the FOLLICLES group
-            follicle = self.create_follicle(nrbpatch[0][0], 0.5, i / (bindjointcount - 1.00))
-            follicle = cmds.listRelatives(follicle, parent=True)
-            newfol = cmds.rename(follicle, "{}_{}_FLC".format(part_name, str(foll_cur_name)))
-            cmds.parent(newfol, flcgrp)
-
-            # Create joint for follicle and parent to follicle
-            jnt = cmds.joint(name=newfol.replace("_FLC", "_Connect_JNT"))
-            rbnjoints.append(jnt)
-            foll_cur_name = foll_cur_name + 1
+        follicles = Bulk_Ops.create_follicles(nrbpatch[0][0], [(0.5, i / (bindjointcount - 1.00))
+                                                               for i in range(bindjointcount)],
+                                              ["{}_{}_FLC".format(part_name, i) for i in range(bindjointcount)],
+                                              parent=flcgrp)
+        rbnjoints = Bulk_Ops.create_nodes("joint", [follicle.replace("_FLC", "_Connect_JNT") for follicle in follicles],
+                                          parents=follicles)
 
 
         if skin:
@@ -344,6 +810,8 @@ class BuildComponents(object):
 
             # Apply a skinCluster to the nrb surface using the joints in rbnskinjoints
             cmds.skinCluster(rbnskinjoints, nrbpatch[0], name="{}_RBN_SkinCluster".format(part_name))
+            if weightsdir and Skin_Weights.WeightsFile.exists(weightsdir, "{}_NRB".format(part_name)):
+                Skin_Weights.import_weights("{}_NRB".format(part_name), weightsdir)
 
         cmds.hide(rbngrp)
         for part in [rbngrp, flcgrp]:
@@ -351,7 +819,7 @@ class BuildComponents(object):
         self.lockhideattr("{}_RIGJOINTS".format(part_name), translation=False, rotate=False, hide=False)
 
         # Deselect everything to make sure it doesn't mess with other parts of the code
-        cmds.select(deselect=True)
+        self.deselect()
 
         return nrbpatch[1], rbnjoints, rbngrp
 
@@ -375,7 +843,8 @@ class BuildComponents(object):
         main_rig_group = "{}_Rig".format(self.char_name)
 
         # Create root control at 0,0,0 and parent it to the _Rig group
-        rootgroup = self.controllers_setup(part_name="Root", scale=(40,40,40), rotation=(90,0,0))
+        rootgroup = self.controllers_setup(part_name="Root", scale=(40,40,40), rotation=(90,0,0),
+                                           component="Character", role="Root")
         cmds.parent(rootgroup[0], main_rig_group)
 
         # Lock and hide scale and vis on root ctrl
@@ -393,7 +862,7 @@ class BuildComponents(object):
         cmds.editDisplayLayerMembers(displayers[2], rootgroup[1])
 
         # Deselect everything to make sure it doesn't mess with other parts of the code
-        cmds.select(deselect=True)
+        self.deselect()
 
         class CharSetup:
             def __init__(self, rootgroup, main_rig_group, displayers):
@@ -401,7 +870,7 @@ class BuildComponents(object):
                 self.main_rig_group = main_rig_group
                 self.displayers = displayers
             
-        return CharSetup(rootgroup, main_rig_group, displayers)
+        return self.keep_result(CharSetup(rootgroup, main_rig_group, displayers))
 
 
 
@@ -436,12 +905,14 @@ class BuildComponents(object):
 
         # Create a control for the Hips at the Ct_Hips_JNT location
         hipsgrp =  self.controllers_setup(part_name="Hips", shape="cube",
-                                          scale=(50,5,40) * scale, rotation=rotation)
+                                          scale=(50,5,40) * scale, rotation=rotation,
+                                          component="Spine", role="Hips")
         cmds.xform(hipsgrp[0], worldSpace=True, translation=cmds.xform(startjnt, worldSpace=True, translation=True, query=True)) # TODO reformat these to be oredered correctly
         cmds.xform(hipsgrp[0], worldSpace=True, rotation= cmds.xform(startjnt, worldSpace=True, rotation=True,  query=True))
         # Create a control for the Chest bend at the position of the middle locator from the ribbon
         chestgrp = self.controllers_setup(part_name="Chest", shape="cube",
-                                          scale=(50,5,40), rotation=rotation)
+                                          scale=(50,5,40), rotation=rotation,
+                                          component="Spine", role="Chest")
         cmds.xform(chestgrp[0], worldSpace=True, translation=cmds.xform(spinerbnlocs[0][1], worldSpace=True, translation=True, query=True))
         cmds.xform(chestgrp[0], worldSpace=True, rotation= cmds.xform(spinerbnlocs[0][1], worldSpace=True, rotation=True,  query=True))
 
@@ -463,11 +934,17 @@ class BuildComponents(object):
         cmds.parentConstraint(chestgrp[1], spinerbnlocs[0][2], maintainOffset=True)
 
         # Parent constrain ribbon joints to bind joints
-        for bindjnt, connectjnt in zip(spinejnts, spinerbnlocs[1]):
+        # At lower LODs there are fewer ribbon joints than bind joints, so use the closest one along the ribbon,
+        # otherwise each bind joint takes the ribbon joint in the same place in the chain
+        rbnconnectjnts = spinerbnlocs[1]
+        if len(rbnconnectjnts) < len(spinejnts):
+            rbnconnectjnts = [rbnconnectjnts[int(round(index * (len(rbnconnectjnts) - 1.0) / (len(spinejnts) - 1)))]
+                              for index in range(len(spinejnts))]
+        for bindjnt, connectjnt in zip(spinejnts, rbnconnectjnts):
             cmds.parentConstraint(connectjnt, bindjnt, maintainOffset=True)
 
         # Deselect everything to make sure it doesn't mess with other parts of the code
-        cmds.select(deselect=True)
+        self.deselect()
 
         class Spine:
             def __init__(self, hipsgrp, chestgrp):
@@ -475,17 +952,26 @@ class BuildComponents(object):
                 self.chestgrp = chestgrp
                 self.spinerbnrig = "Ct_Spine_RBN_Rig"
             
-        return Spine(hipsgrp, chestgrp)
+        return self.keep_result(Spine(hipsgrp, chestgrp))
 
 
     def neck_setup(self, neckjnt="",
                    scale=1, rotation=(0,-90,0),
-                   position=(5,0,-3)):
+                   position=(5,0,-3), endjnt="",
+                   jointcount=None):
+        # With only neckjnt, a single FK controller on the neck joint
+        # With endjnt as well, a ribbon neck for long necks from neckjnt down to endjnt, see ribbon_neck_setup
+        if endjnt:
+            return self.ribbon_neck_setup(neckjnt=neckjnt, endjnt=endjnt,
+                                          jointcount=jointcount, scale=scale,
+                                          rotation=rotation, position=position)
+
         # Create neck controller and position it at the location of the neck joint
         neckgrp = self.controllers_setup(part_name="Neck", shape="circle",
                                          scale=(10,10,10) * scale,
                                          rotation=rotation,
-                                         position=position)
+                                         position=position,
+                                         component="Neck", role="FK")
         neckpos = cmds.xform(neckjnt, query=True, translation=True, worldSpace=True)
         neckrot = cmds.xform(neckjnt, query=True, rotation=True,  worldSpace=True)
         cmds.xform(neckgrp, translation=neckpos, rotation=neckrot, worldSpace=True)
@@ -500,19 +986,284 @@ class BuildComponents(object):
         self.lockhideattr(neckgrp[1], rotate=False)
 
         # Deselect everything to make sure it doesn't mess with other parts of the code
-        cmds.select(deselect=True)
+        self.deselect()
 
 
         class Neck:
             def __init__(self, neckgrp):
                 self.neckgrp = neckgrp
+                # The controller the head follows
+                self.headctrl = neckgrp[1]
             
-        return Neck(neckgrp)
+        return self.keep_result(Neck(neckgrp))
+
+
+    def ribbon_neck_setup(self, neckjnt="",
+                          endjnt="", jointcount=None,
+                          scale=1, rotation=(0,-90,0),
+                          position=(5,0,-3)):
+        # Ribbon neck for long necked creatures, built with ribbon_setup between neckjnt and endjnt, with jointcount
+        # follicles defaulting to one per neck joint. The ribbon and the bind joint constraints are made in bulk, so
+        # the neck costs the same per joint from 3 joints to 30
+        # An FK controller on neckjnt carries a mid controller, which stays between it and the head, and a head
+        # controller at endjnt, and these drive the ribbon's start, mid and end. The head controller's Orient_Space
+        # attr switches it's orientation between following the neck, the chest and the root
+        neckjnts = self.chain_joints(startjnt=neckjnt, endjnt=endjnt)
+        if jointcount is None:
+            jointcount = len(neckjnts)
+
+        rbnlocs, rbnjoints, rbngrp = self.ribbon_setup(part_name="Ct_Neck", startjnt=neckjnt,
+                                                       endjnt=endjnt, method="twoloc",
+                                                       bindjointcount=max(jointcount, 3))
+        cmds.parent(rbngrp, "{}_Rig".format(self.char_name))
+
+        # Controllers at the neck's start, the ribbon's middle, and the neck's end
+        neckgrp = self.controllers_setup(part_name="Neck", shape="circle",
+                                         scale=(10*scale, 10*scale, 10*scale), rotation=rotation,
+                                         position=position, component="Neck", role="FK")
+        midgrp = self.controllers_setup(part_name="Neck_Mid", shape="circle",
+                                        scale=(8*scale, 8*scale, 8*scale), rotation=rotation,
+                                        component="Neck", role="Mid")
+        headgrp = self.controllers_setup(part_name="Neck_Head", shape="cube",
+                                         scale=(6*scale, 6*scale, 6*scale), component="Neck",
+                                         role="Head")
+        for grp, target in zip([neckgrp, midgrp, headgrp], [neckjnt, rbnlocs[1], endjnt]):
+            cmds.xform(grp[0], translation=cmds.xform(target, query=True, translation=True, worldSpace=True),
+                       rotation=cmds.xform(target, query=True, rotation=True, worldSpace=True), worldSpace=True)
+        cmds.parent(midgrp[0], headgrp[0], neckgrp[1])
+
+        # The ribbon's start, mid and end follow the controllers, with the mid controller kept between the others
+        for ctrl, loc in zip([neckgrp[1], midgrp[1], headgrp[1]], rbnlocs):
+            cmds.parentConstraint(ctrl, loc, maintainOffset=True)
+        cmds.parentConstraint(neckgrp[1], headgrp[1], midgrp[0], maintainOffset=True)
+
+        # Head orientation space switching, between whichever of the neck, chest and root exist
+        spaces = [(name, target) for name, target in [("Neck", neckgrp[1]), ("Chest", "Chest_CTRL"),
+                                                      ("Root", "Root_CTRL")] if cmds.objExists(target)]
+        cmds.addAttr(headgrp[1], shortName="Orient_SS", longName="Orient_Space_Switching",
+                     enumName=":".join(name for name, target in spaces), **self.enum_kwargs)
+        orientconstraint = cmds.orientConstraint([target for name, target in spaces], headgrp[0],
+                                                 maintainOffset=True)[0]
+        for index, (name, target) in enumerate(spaces):
+            condnode = cmds.createNode("condition", name="Neck_Head_{}_OriSS_COND".format(name))
+            cmds.connectAttr("{}.Orient_Space_Switching".format(headgrp[1]), "{}.secondTerm".format(condnode))
+            cmds.setAttr("{}.firstTerm".format(condnode), index)
+            for true_false, set_value in zip(["True", "False"], [1, 0]):
+                cmds.setAttr("{}.colorIf{}R".format(condnode, true_false), set_value)
+            cmds.connectAttr("{}.outColor.outColorR".format(condnode),
+                             "{}.{}W{}".format(orientconstraint, target, index))
+
+        # Parent constrain the bind joints to the closest ribbon joint, as lower LODs have fewer ribbon joints
+        Bulk_Ops.parent_constraints([rbnjoints[int(round(index * (len(rbnjoints) - 1.0) / max(len(neckjnts) - 1, 1)))]
+                                     for index in range(len(neckjnts))], neckjnts)
+
+        self.lockhideattr(neckgrp[1], rotate=False)
+        self.lockhideattr(midgrp[1], translation=False, rotate=False)
+        self.lockhideattr(headgrp[1], translation=False, rotate=False)
+        for grp in [midgrp, headgrp]:
+            self.lockhideattr(grp[0], translation=False, rotate=False)
+
+        self.deselect()
+
+        class Neck:
+            def __init__(self, neckgrp, midgrp, headgrp, neckrbnrig):
+                self.neckgrp = neckgrp
+                self.midgrp = midgrp
+                self.headgrp = headgrp
+                self.neckrbnrig = neckrbnrig
+                # The controller the head follows
+                self.headctrl = headgrp[1]
+
+        return self.keep_result(Neck(neckgrp, midgrp, headgrp, rbngrp))
+
+
+    def scapula_setup(self, side="",
+                      scapjnt="", shouljnt="",
+                      armgrp="", colour="",
+                      flipped=False):
+        # Create controller for scapula, then position and set pivot point for group and controller
+        scapulagrp = self.controllers_setup(part_name=side + "_Scapula", shape="scapctrl",
+                                            position=(14,0,0), scale=(4,4,4),
+                                            colour=colour, component="Arm", role="Scapula")
+        cmds.xform(scapulagrp[0], translation=cmds.xform(scapjnt, query=True, translation=True, worldSpace=True), worldSpace=True)
+        if flipped:
+            cmds.xform(scapulagrp[0], scale=(-1,1,1))
+        cmds.xform(scapulagrp[1], pivots=(cmds.xform(scapjnt, query=True, translation=True, worldSpace=True)), worldSpace=True)
+
+        self.lockhideattr(scapulagrp[1], rotate=False)
+        self.lockhideattr(scapulagrp[0], translation=False, rotate=False)
+
+
+        # Create a locator parented to the scapula in the position of the shouljnt
+        shoulloc = cmds.spaceLocator(n=side + "_Scapula_Shoulder_LOC")
+        cmds.xform(shoulloc, t=(cmds.xform(shouljnt, query=True, translation=True, worldSpace=True)), worldSpace=True)
+        cmds.parent(shoulloc[0], scapulagrp[1])
+        cmds.setAttr(shoulloc[0] + ".visibility", 0)
+        self.lockhideattr(shoulloc[0])
+
+        # Scapula ctrl to scapula jnt constraint
+        cmds.parentConstraint(scapulagrp[1], scapjnt, maintainOffset=True)
+
+        # Parent scapula group to the arm group
+        cmds.parent(scapulagrp[0], armgrp)
+
+        return scapulagrp, shoulloc
+
+
+    def fk_controls_setup(self, part_names,
+                          joints, parent="",
+                          colour="", scale=(6,6,6),
+                          rotation=(0,90,0), component="",
+                          constraintargets=None):
+        # Create a chain of FK controllers, one per joint, each parented under the previous controller, with the first
+        # group parented to parent. Each controller parent constrains it's joint, or it's matching constraintargets
+        # The groups are left unlocked, so the first one can still be constrained, and should be locked afterwards
+        if constraintargets is None:
+            constraintargets = joints
+
+        fkgrps = []
+        for part_name, joint, target in zip(part_names, joints, constraintargets):
+            fkgrp = self.controllers_setup(part_name=part_name, shape="circle",
+                                           colour=colour, scale=scale,
+                                           rotation=rotation, component=component, role="FK")
+            cmds.xform(fkgrp[0], translation=(cmds.xform(joint, query=True, translation=True, worldSpace=True)),
+                       rotation=(cmds.xform(joint, query=True, rotation=True, worldSpace=True)), worldSpace=True)
+            cmds.parentConstraint(fkgrp[1], target, maintainOffset=True)
+
+            if not fkgrps:
+                cmds.parent(fkgrp[0], parent)
+            else:
+                cmds.parent(fkgrp[0], fkgrps[-1][1])
+
+            self.lockhideattr(fkgrp[1], rotate=False)
+            fkgrps.append(fkgrp)
+
+        return fkgrps
+
+
+    def fk_arm_setup(self, scapjnt="",
+                     shouljnt="", elbowjnt="",
+                     wristjnt="", armgrp="",
+                     side="", colour="",
+                     flipped=False):
+        # Lightweight arm used at the lowest LOD, with the scapula, and FK controllers that drive the bind joints
+        # directly, so there's no FK, IK, or Connect joint chains and no FKIK blending
+        scapulagrp, shoulloc = self.scapula_setup(side=side, scapjnt=scapjnt,
+                                                  shouljnt=shouljnt, armgrp=armgrp,
+                                                  colour=colour, flipped=flipped)
+
+        armjnts = [shouljnt, elbowjnt, wristjnt]
+        fkgrps = self.fk_controls_setup(part_names=[jnt.replace("_JNT", "_FK") for jnt in armjnts],
+                                        joints=armjnts, parent=armgrp,
+                                        colour=colour, component="Arm")
+
+        # Parent constrain FK shoulder to Scapula
+        cmds.parentConstraint(scapulagrp[1], fkgrps[0][0], maintainOffset=True)
+
+        for fkgrp in fkgrps:
+            self.lockhideattr(fkgrp[0])
+
+        self.deselect()
+
+        class Arm:
+            def __init__(self, shoulloc, scapulagrp, connectjnts, fkctrls):
+                self.shoulloc = shoulloc
+                self.scapulagrp = scapulagrp
+                self.armattrsgrp = None
+                # The bind joints stand in for the Connect joints, so hands can be attached the same way
+                self.connectjnts = connectjnts
+                self.ikgrp = None
+                self.pvgrp = None
+                self.fkctrls = fkctrls
+                self.twistjnts = []
+
+        return self.keep_result(Arm(shoulloc, scapulagrp, armjnts, [fkgrp[1] for fkgrp in fkgrps]))
+
+
+    def twist_setup(self, part_name="",
+                    startjnt="", endjnt="",
+                    count=3, counter=False):
+        # Add a chain of count twist joints under startjnt, spaced evenly along the bone to endjnt, which share out
+        # the twist of one joint around it's X axis. By default they follow endjnt's twist relative to startjnt, like
+        # a forearm following the wrist, and with counter they undo startjnt's own twist relative to it's parent,
+        # like an upper arm, so the twist fades in from the start of the bone to the end
+        # The twist is read once through a multMatrix, decomposeMatrix and a quaternion swing twist split, and as the
+        # twist joints are chained each one only turns by an equal share of it, so the network is the same 6 nodes
+        # however many twist joints there are. Returns the twist joints
+        if not cmds.pluginInfo("quatNodes", query=True, loaded=True):
+            cmds.loadPlugin("quatNodes", quiet=True)
+
+        if counter:
+            driver, reference = startjnt, cmds.listRelatives(startjnt, parent=True)[0]
+        else:
+            driver, reference = endjnt, startjnt
+        drivermatrix, referencematrix, startmatrix, endmatrix = Bulk_Ops.world_matrices([driver, reference,
+                                                                                          startjnt, endjnt])
+
+        # The driver's rotation away from it's rest pose relative to the reference, in the driver's own space
+        multmatrix = cmds.createNode("multMatrix", name="{}_Twist_MM".format(part_name), skipSelect=True)
+        cmds.connectAttr(driver + ".worldMatrix[0]", multmatrix + ".matrixIn[0]")
+        cmds.connectAttr(reference + ".worldInverseMatrix[0]", multmatrix + ".matrixIn[1]")
+        cmds.setAttr(multmatrix + ".matrixIn[2]",
+                     *rm.inverse_matrices(rm.local_matrices(drivermatrix, referencematrix)).ravel(), type="matrix")
+        decompose = cmds.createNode("decomposeMatrix", name="{}_Twist_DM".format(part_name), skipSelect=True)
+        cmds.connectAttr(multmatrix + ".matrixSum", decompose + ".inputMatrix")
+
+        # Keeping only the X and W parts of that rotation's quaternion leaves it's twist around X, without the swing
+        normalize = cmds.createNode("quatNormalize", name="{}_Twist_QN".format(part_name), skipSelect=True)
+        for axis in ["X", "W"]:
+            cmds.connectAttr(decompose + ".outputQuat" + axis, normalize + ".inputQuat" + axis)
+        toeuler = cmds.createNode("quatToEuler", name="{}_Twist_QTE".format(part_name), skipSelect=True)
+        cmds.connectAttr(normalize + ".outputQuat", toeuler + ".inputQuat")
+
+        # Twist joints along the bone, in startjnt's orientation
+        step = rm.local_matrices(endmatrix, startmatrix)[3, :3] / (count + 1)
+        twistjnts = []
+        for num in range(count):
+            jnt = self.create_joint("{}_Twist_{}_JNT".format(part_name, num),
+                                    parent=twistjnts[-1] if twistjnts else startjnt)
+            cmds.setAttr(jnt + ".translate", *step)
+            twistjnts.append(jnt)
+
+        # Each joint turns by an equal share of the twist, with a counter twist's first joint first undoing all but
+        # one share of startjnt's twist
+        share = 1.0 / (count + 1)
+        if counter:
+            weights = [(twistjnts[:1], -count * share), (twistjnts[1:], share)]
+        else:
+            weights = [(twistjnts, share)]
+        for num, (jnts, weight) in enumerate(weights):
+            if not jnts:
+                continue
+            blend = cmds.createNode("animBlendNodeAdditiveDA", name="{}_Twist_{}_ABN".format(part_name, num),
+                                    skipSelect=True)
+            cmds.connectAttr(toeuler + ".outputRotateX", blend + ".inputA")
+            cmds.setAttr(blend + ".weightA", weight)
+            for jnt in jnts:
+                cmds.connectAttr(blend + ".output", jnt + ".rotateX")
+
+        return twistjnts
+
+
+    def limb_twist(self, part_name="",
+                   startjnt="", midjnt="",
+                   endjnt="", twist=3):
+        # Twist joints for a two bone limb, counter twisting the upper bone against startjnt, and following endjnt
+        # along the lower bone, with twist joints on each bone, or 3 each if twist is True. Returns all the twist joints
+        count = 3 if twist is True else int(twist)
+        if count < 1:
+            return []
+        return (self.twist_setup(part_name=part_name + "_Upper", startjnt=startjnt,
+                                 endjnt=midjnt, count=count, counter=True) +
+                self.twist_setup(part_name=part_name + "_Lower", startjnt=midjnt,
+                                 endjnt=endjnt, count=count))
 
 
     def arm_setup(self, scapjnt="",
                   shouljnt="", wristjnt="",
                   twist=False, flipped=False):
+        # twist adds that many twist joints along each of the upper arm and forearm, or 3 each if it's True, see
+        # twist_setup
         # Set up the side variable for naming
         if flipped:
             side="Rt"
@@ -528,6 +1279,18 @@ class BuildComponents(object):
         armgrp = cmds.group(name="{}_Arm".format(side), parent="{}_Rig".format(self.char_name), empty=True)
         self.lockhideattr(armgrp, hide=False)
 
+        # The lowest LOD has FK controls driving the bind joints directly, with no IK or FKIK blending
+        if self.lod == self.LOD_LOW:
+            arm = self.fk_arm_setup(scapjnt=scapjnt, shouljnt=shouljnt,
+                                    elbowjnt=elbow_jnt, wristjnt=wristjnt,
+                                    armgrp=armgrp, side=side,
+                                    colour=colour, flipped=flipped)
+            if twist:
+                arm.twistjnts = self.limb_twist(part_name="{}_Arm".format(side), startjnt=shouljnt,
+                                                midjnt=elbow_jnt, endjnt=wristjnt,
+                                                twist=twist)
+            return arm
+
         # FKIK SETUP
 
         # Duplicate shoulder setup and rename all joints under it and including itself
@@ -568,32 +1331,9 @@ class BuildComponents(object):
 
 
         # SCAPULA
-
-        # Create controller for scapula, then position and set pivot point for group and controller
-        scapulagrp = self.controllers_setup(part_name=side + "_Scapula", shape="scapctrl",
-                                            position=(14,0,0), scale=(4,4,4),
-                                            colour=colour)
-        cmds.xform(scapulagrp[0], translation=cmds.xform(scapjnt, query=True, translation=True, worldSpace=True), worldSpace=True)
-        if flipped:
-            cmds.xform(scapulagrp[0], scale=(-1,1,1))
-        cmds.xform(scapulagrp[1], pivots=(cmds.xform(scapjnt, query=True, translation=True, worldSpace=True)), worldSpace=True)
-
-        self.lockhideattr(scapulagrp[1], rotate=False)
-        self.lockhideattr(scapulagrp[0], translation=False, rotate=False)
-
-
-        # Create a locator parented to the scapula in the position of the shouljnt
-        shoulloc = cmds.spaceLocator(n=side + "_Scapula_Shoulder_LOC")
-        cmds.xform(shoulloc, t=(cmds.xform(shouljnt, query=True, translation=True, worldSpace=True)), worldSpace=True)
-        cmds.parent(shoulloc[0], scapulagrp[1])
-        cmds.setAttr(shoulloc[0] + ".visibility", 0)
-        self.lockhideattr(shoulloc[0])
-
-        # Scapula ctrl to scapula jnt constraint
-        cmds.parentConstraint(scapulagrp[1], scapjnt, maintainOffset=True)
-
-        # Parent scapula group to the arm group
-        cmds.parent(scapulagrp[0], armgrp)
+        scapulagrp, shoulloc = self.scapula_setup(side=side, scapjnt=scapjnt,
+                                                  shouljnt=shouljnt, armgrp=armgrp,
+                                                  colour=colour, flipped=flipped)
 
 
         # ARM ATTRS SETUP
@@ -601,10 +1341,12 @@ class BuildComponents(object):
         # Create pointedsquare control and position at shoulder location
         if flipped:
             armattrsgrp = self.controllers_setup(part_name="{}_Arm_Attrs".format(side), shape="pointedsquare",
-                                                 scale=(-6,6,6), colour=colour)
+                                                 scale=(-6,6,6), colour=colour,
+                                                 component="Arm", role="Attrs")
         else:
             armattrsgrp = self.controllers_setup(part_name="{}_Arm_Attrs".format(side), shape="pointedsquare",
-                                                 scale=(6,6,6), colour=colour)
+                                                 scale=(6,6,6), colour=colour,
+                                                 component="Arm", role="Attrs")
         cmds.xform(armattrsgrp, translation=(cmds.xform(shoulloc, query=True, translation=True, worldSpace=True)), worldSpace=True)
 
         # Parent arm attrs group to arm group
@@ -618,14 +1360,13 @@ class BuildComponents(object):
 
 
         # Create FKIK, and space switching attributes for each arm
-        cmds.select(armattrsgrp[1])
-        cmds.addAttr(shortName="FKIK", longName="FKIK", min=0, max=1, dv=0, exists=True, hidden=False, keyable=True)
+        cmds.addAttr(armattrsgrp[1], shortName="FKIK", longName="FKIK", min=0, max=1, dv=0, exists=True, hidden=False, keyable=True)
 
         # TODO Edit this to make it global
 
-        cmds.addAttr(shortName="Pos_SS", longName="Position_Space_Switching", enumName="Root:Hips:Chest:Scapula", **self.enum_kwargs)
-        cmds.addAttr(shortName="Rot_SS", longName="Rotation_Space_Switching", enumName="Root:Hips:Chest:Scapula", **self.enum_kwargs)
-        cmds.select(deselect=True)
+        cmds.addAttr(armattrsgrp[1], shortName="Pos_SS", longName="Position_Space_Switching", enumName="Root:Hips:Chest:Scapula", **self.enum_kwargs)
+        cmds.addAttr(armattrsgrp[1], shortName="Rot_SS", longName="Rotation_Space_Switching", enumName="Root:Hips:Chest:Scapula", **self.enum_kwargs)
+        self.deselect()
 
         # FKIK switching setup
         # Create math node to reverse (1 - fkikattr)
@@ -667,7 +1408,7 @@ class BuildComponents(object):
         for fkjoint in [shouljnt, elbow_jnt, wristjnt]:
             fkgrp = self.controllers_setup(part_name=fkjoint.replace("_JNT", "_FK"), shape="circle",
                                            colour=colour, scale=(6,6,6),
-                                           rotation=(0,90,0))
+                                           rotation=(0,90,0), component="Arm", role="FK")
             cmds.xform(fkgrp[0], translation=(cmds.xform(fkjoint, query=True, translation=True, worldSpace=True)), rotation=(cmds.xform(fkjoint, query=True, rotation=True, worldSpace=True)), worldSpace=True)
             cmds.parentConstraint(fkgrp[1], fkjoint.replace("_JNT", "_FK_JNT"))
 
@@ -699,7 +1440,7 @@ class BuildComponents(object):
         # IKHandle control
         ikgrp = self.controllers_setup(part_name=side + "_Arm_IK", shape="starcircle",
                                        colour=colour, scale=(6,6,6),
-                                       rotation=(0,90,0))
+                                       rotation=(0,90,0), component="Arm", role="IK")
         cmds.xform(ikgrp[0], t=(cmds.xform(wristjnt.replace("_JNT", "_IK_JNT"), translation=True, query=True, worldSpace=True)),
                    ro=(cmds.xform(wristjnt.replace("_JNT", "_IK_JNT"), rotation=True, query=True, worldSpace=True)), worldSpace=True)
         cmds.parentConstraint(ikgrp[1], arm_ikh[0])
@@ -713,14 +1454,13 @@ class BuildComponents(object):
         # PV Control
         pvgrp = self.controllers_setup(part_name=side + "_Arm_IK_PV", shape="starcircle",
                                        colour=colour, scale=(6,6,6),
-                                       rotation=(0,0,0))
-        cmds.xform(pvgrp[0],
-                   t=(self.vector_lerp(cmds.xform(shouljnt.replace("_JNT", "_IK_JNT"), query=True, translation=True, worldSpace=True),
-                                       cmds.xform(wristjnt.replace("_JNT", "_IK_JNT"), query=True, translation=True, worldSpace=True),
-                                       .5)), worldSpace=True)
-        tempaimconst = cmds.aimConstraint((elbow_jnt).replace("_JNT", "_IK_JNT"), pvgrp[0])
-        cmds.delete(tempaimconst)
-        cmds.xform(pvgrp[0], translation=(50,0,0), relative=True, objectSpace=True)
+                                       rotation=(0,0,0), component="Arm", role="PV")
+        # Place the PV group half way between the shoulder and wrist, aimed at the elbow, and pushed out past it
+        pvpos, pvrot = rm.pole_vector_placements(cmds.xform(shouljnt.replace("_JNT", "_IK_JNT"), query=True, translation=True, worldSpace=True),
+                                                 cmds.xform(elbow_jnt.replace("_JNT", "_IK_JNT"), query=True, translation=True, worldSpace=True),
+                                                 cmds.xform(wristjnt.replace("_JNT", "_IK_JNT"), query=True, translation=True, worldSpace=True),
+                                                 distance=50)
+        cmds.xform(pvgrp[0], translation=tuple(pvpos), rotation=tuple(pvrot), worldSpace=True)
 
         cmds.parent(pvgrp[0], armgrp)
 
@@ -776,11 +1516,16 @@ class BuildComponents(object):
                 index = index + 1
 
 
-        # TODO Create a function for adding twist to limbs
+        # Twist joints along the upper arm and forearm, added last so they aren't in the duplicated joint chains
+        twistjnts = []
+        if twist:
+            twistjnts = self.limb_twist(part_name="{}_Arm".format(side), startjnt=shouljnt,
+                                        midjnt=elbow_jnt, endjnt=wristjnt,
+                                        twist=twist)
 
 
         class Arm:
-            def __init__(self, shoulloc, scapulagrp, armattrsgrp, connectjnts, ikgrp, pvgrp, fkctrls):
+            def __init__(self, shoulloc, scapulagrp, armattrsgrp, connectjnts, ikgrp, pvgrp, fkctrls, twistjnts):
                 self.shoulloc = shoulloc
                 self.scapulagrp = scapulagrp
                 self.armattrsgrp = armattrsgrp 
@@ -788,11 +1533,17 @@ class BuildComponents(object):
                 self.ikgrp = ikgrp
                 self.pvgrp = pvgrp
                 self.fkctrls = fkctrls
+                self.twistjnts = twistjnts
             
-        return Arm(shoulloc, scapulagrp, armattrsgrp, connectjnts, ikgrp, pvgrp, fkctrls)
+        return self.keep_result(Arm(shoulloc, scapulagrp, armattrsgrp, connectjnts,
+                                    ikgrp, pvgrp, fkctrls, twistjnts))
 
 
-    def hand_setup(self, flipped=False):
+    def hand_setup(self, flipped=False,
+                   layout=None, handjnt="Lf_Hand_1_JNT"):
+        # Build a hand from a finger layout, HAND_LAYOUT by default, with any number of fingers and joints per finger
+        # Every pose in the layout (Fist, Spread, ...) becomes an attribute on the hand attrs control, and all of them
+        # drive the fingers through one shared pose network, see hand_pose_network
         # Set up variables for both left and right side hands, both for naming and controller colouring
         if flipped:
             side = "Rt"
@@ -800,115 +1551,89 @@ class BuildComponents(object):
         else:
             side = "Lf"
             colour = "yellow"
+        layout = HAND_LAYOUT if layout is None else layout
 
         # Create overall hand group
         handgrp = cmds.group(n="{}_Hand_GRP".format(side), empty=1)
 
-        fingers = ["Thumb", "Index", "Middle", "Ring", "Pinky"]
-
-        # Loop over each finger and create it's controls for each
-        for finger in fingers:
-            # Set finger joint count for thumb seperately, as it only has 3 joints
-            if finger == "Thumb":
-                fingercount = 3
-            else:
-                fingercount = 4
-
-            for fjoint in range(0, fingercount):
-                # Set up a variable for the finger naming
-                finger_name_short = "{}_{}_{}".format(side, finger, str(fjoint))
-
-                # Create a controller for the fingers, with seperate controller setups for the first
-                # joint in each finger, with joint 0's controller being parallel to the joint
-                if fjoint == 0:
-                    fingergrp = self.controllers_setup(part_name=finger_name_short, shape="square",
-                                                       colour=colour, rotation=(0,0,0),
-                                                       scale=(4,1,2), position=(2,0,3))
-                    # Fix the pivot point for the controller to make sure it matches the joint's position
-                    cmds.xform(fingergrp[1], pivots=(cmds.xform(fingergrp[0], translation=1, query=1, worldSpace=1)), worldSpace=1)
-                else:
-                    fingergrp = self.controllers_setup(part_name=finger_name_short, shape="square",
-                                                       colour=colour, rotation=(0,90,0),
-                                                       scale=(2,2,3))
-
-                # Create an offset group, in the same position/rotation as the finger joint's group. (0,0,0) relatively
-                # This is used for the hand's Fist and Spread attributes
-                offsetgrp = cmds.group(name=finger_name_short + "_Offset_GRP", empty=1, parent=fingergrp[0])
-                # Then parent the controller to the offset group
-                cmds.parent(fingergrp[1], offsetgrp)
-
-                # Get the position/rotation of the joint, and place the controller's group where the joint is
-                # If this is for the right side hand, get all the transforms and rotations from the left hand
-                # to position the controller's group in the correct position, as it'll be flipped later
-                if flipped:
-                    cmds.xform(fingergrp[0], translation=(cmds.xform(finger_name_short.replace("Rt", "Lf") + "_JNT", query=1, translation=1, worldSpace=1)),
-                               rotation=(cmds.xform(finger_name_short.replace("Rt", "Lf") + "_JNT", query=1, rotation=1, worldSpace=1)), worldSpace=1)
-                else:
-                    cmds.xform(fingergrp[0], translation=(cmds.xform("{}_JNT".format(finger_name_short), query=1, translation=1, worldSpace=1)),
-                               rotation=(cmds.xform("{}_JNT".format(finger_name_short), query=1, rotation=1, worldSpace=1)), worldSpace=1)
-
-                # For the first controller's group, parent it to the handgrp group
-                if fjoint == 0:
-                    cmds.parent(fingergrp[0], handgrp)
-                # and for subsequent controllers, parent the controller's group to the previous controller
-                else:
-                    cmds.parent(fingergrp[0], "{}_{}_{}_CTRL".format(side, finger, str(fjoint-1)))
-
-
-        # Create controller for hand attributes (Fist, Spread)
-        handattrsgrp = self.controllers_setup(part_name="{}_Hand_Attrs".format(side), shape="starcircle", position=(0,0,4), scale=(2,2,2), colour=colour)
+        # Below the full LOD each finger gets a single fused controller on it's first joint, which curls the rest of
+        # the finger's joints through one plusMinusAverage each, instead of them having their own controllers
+        fused = self.lod != self.LOD_FULL
+
+        fingernames = []
+        for finger in layout:
+            fingernames.append(["{}_{}_{}".format(side, finger["name"], fjoint) for fjoint in range(finger["joints"])])
+        knucklenames = [names[0] for names in fingernames]
+        restnames = [] if fused else [name for names in fingernames for name in names[1:]]
+
+        # If this is for the right side hand, place the controls from the left hand's joints, as the whole hand group
+        # gets flipped at the end
+        def placement(names):
+            return Bulk_Ops.world_matrices(["{}_JNT".format(name.replace("Rt_", "Lf_", 1)) for name in names])
+
+        # Controllers in bulk, with the first joint in each finger's controller parallel to the joint, and each
+        # with an offset group in the same place as it's group, used for the hand's poses
+        knucklegrps, knucklectrls = self.bulk_controls(matrices=placement(knucklenames), parent=handgrp,
+                                                       shape="square", scale=(4,1,2), position=(2,0,3),
+                                                       colour=colour, component="Hand", role="Finger",
+                                                       names=knucklenames, offsets=True)
+        fingergrps, fingerctrls = knucklegrps, knucklectrls
+        if restnames:
+            restgrps, restctrls = self.bulk_controls(matrices=placement(restnames), parent=handgrp,
+                                                     shape="square", scale=(2,2,3), rotation=(0,90,0),
+                                                     colour=colour, component="Hand", role="Finger",
+                                                     names=restnames, offsets=True)
+            fingergrps, fingerctrls = knucklegrps + restgrps, knucklectrls + restctrls
+            # Parent each group below the first in each finger to the previous controller
+            for names in fingernames:
+                for previous, name in zip(names[:-1], names[1:]):
+                    cmds.parent("{}_GRP".format(name), "{}_CTRL".format(previous))
+
+        if fused:
+            # Add the finger controller's rotation, plus the poses (connected in below) onto the joint's rest rotation
+            fusednames = [(names[0], name) for names in fingernames for name in names[1:]]
+            fusedpmas = Bulk_Ops.create_nodes("plusMinusAverage", ["{}_Fused_PMA".format(name) for knuckle, name in fusednames])
+            restrotations = Bulk_Ops.get_attrs(["{}_JNT.rotate".format(name) for knuckle, name in fusednames])
+            Bulk_Ops.set_attrs([("{}.input3D[0]".format(pma), rotation) for pma, rotation in zip(fusedpmas, restrotations)])
+            connections = []
+            for pma, (knuckle, name) in zip(fusedpmas, fusednames):
+                connections.append(("{}_CTRL.rotate".format(knuckle), "{}.input3D[1]".format(pma)))
+                connections.append(("{}.output3D".format(pma), "{}_JNT.rotate".format(name)))
+            Bulk_Ops.connect_attrs(connections)
+
+
+        # Create controller for hand attributes, with one attribute per pose
+        handattrsgrp = self.controllers_setup(part_name="{}_Hand_Attrs".format(side), shape="starcircle", position=(0,0,4), scale=(2,2,2), colour=colour,
+                                              component="Hand", role="Attrs")
         # Position and rotate the controller at the hand location
-        cmds.xform(handattrsgrp, translation=(cmds.xform("Lf_Hand_1_JNT", translation=1, query=1, worldSpace=1)),
-                   rotation=(cmds.xform("Lf_Hand_1_JNT", rotation=1, query=1, worldSpace=1)), worldSpace=1)
+        cmds.xform(handattrsgrp, translation=(cmds.xform(handjnt, translation=1, query=1, worldSpace=1)),
+                   rotation=(cmds.xform(handjnt, rotation=1, query=1, worldSpace=1)), worldSpace=1)
         # Parent to main hand group
         cmds.parent(handattrsgrp[0], handgrp)
 
-        # Create Fist and Spread attributes on hand attr control
-        for attr in ["Fist", "Spread"]:
+        poses = []
+        for finger in layout:
+            for pose in finger["poses"]:
+                if pose not in poses:
+                    poses.append(pose)
+        for attr in poses:
             cmds.addAttr(handattrsgrp[1], shortName=attr, longName=attr, min=0, max=1, defaultValue=0, exists=1, hidden=0, keyable=1)
 
 
-        # Hand Fist
-        # Create Remap node for first joint in fingers
-        fingeroneremap =   cmds.createNode("remapValue", name="{}_Finger_1_Fist_REMAP".format(side))
-        cmds.setAttr(fingeroneremap + ".outputMax", 70)
-        fingertwothreeremap = cmds.createNode("remapValue", name="{}_Finger_23_Fist_REMAP".format(side))
-        cmds.setAttr(fingertwothreeremap + ".outputMax", 90)
-
-        thumbzeroremap = cmds.createNode("remapValue", name=side + "{}_Finger_0_Fist_REMAP".format(side))
-        cmds.setAttr(thumbzeroremap + ".outputMax", 10)
-        thumbonetworemap = cmds.createNode("remapValue", name=side + "_Thumb_12_Fist_REMAP")
-        cmds.setAttr(thumbonetworemap + ".outputMax", 45)
-
-        # Connect handattrs Fist attribute to fist remap nodes
-        for remapnode in [fingeroneremap, fingertwothreeremap, thumbzeroremap, thumbonetworemap]:
-            cmds.connectAttr(handattrsgrp[1] + ".Fist", remapnode + ".i")
-
-        # Connect fingerzeroremap and fingertwothreeremap to the finger's Offset_GRP groups (excluding thumb)
-        for finger in fingers[1:]:
-            cmds.connectAttr(fingeroneremap  + ".outValue", side + "_" + finger + "_1_Offset_GRP.rotateY")
-            for joint in range(2,4):
-                cmds.connectAttr(fingertwothreeremap  + ".outValue", side + "_" + finger + "_" + str(joint) + "_Offset_GRP.rotateY")
-
-        # Connect thumbzeroremap and thumbonetworemap to the thumb's Offset_GRP groups
-        cmds.connectAttr("{}.outValue".format(thumbzeroremap), "{}_Thumb_0_Offset_GRP.rotateY".format(side))
-        for joint in range(1, 3):
-            cmds.connectAttr("{}.outValue".format(thumbonetworemap), "{}_Thumb_{}_Offset_GRP.rotateY".format(side, str(joint)))
-
-
-        # Hand Spread
-        for finger, remapvalue in zip(fingers, [-20, -10, -3, 10, 20]):
-            if finger == "Thumb":
-                joint = 0
-            else:
-                joint = 1
-            
-            strjoint = str(joint)
+        def posetarget(name, fjoint, axis):
+            # Poses rotate a finger's Offset_GRP, or the input to the fused finger joint's plusMinusAverage
+            if fused and fjoint > 0:
+                return "{}_Fused_PMA.input3D[2].input3D{}".format(name, axis.lower())
+            return "{}_Offset_GRP.rotate{}".format(name, axis)
 
-            remapnode = cmds.createNode("remapValue", name="{}_{}_{}_Spread_REMAP".format(side, finger, strjoint))
-            cmds.setAttr("{}.outputMax".format(remapnode), remapvalue)
-            cmds.connectAttr("{}.Spread".format(handattrsgrp[1]), "{}.i".format(remapnode))
-            cmds.connectAttr("{}.outValue".format(remapnode), "{}_{}_{}_Offset_GRP.rotateZ".format(side, finger, strjoint))
+        contributions = []
+        for finger, names in zip(layout, fingernames):
+            for pose, rotations in finger["poses"].items():
+                for fjoint, rotation in enumerate(rotations[:len(names)]):
+                    for axis, value in zip("XYZ", rotation):
+                        if value:
+                            contributions.append((posetarget(names[fjoint], fjoint, axis), pose, value))
+        self.hand_pose_network("{}_Hand".format(side), handattrsgrp[1], contributions)
 
 
         # Flip the entire handgrp group if this is for a right side hand
@@ -916,57 +1641,69 @@ class BuildComponents(object):
             cmds.xform(handgrp, scale=(-1,1,1))
 
 
-        # Loop through each finger for parent constraining each control to it's joint, and attribute locking and hiding
-        for finger in fingers:
-            # Set finger joint count for thumb seperately, as it only has 3 joints
-            if finger == "Thumb":
-                fingercount = 3
-            else:
-                fingercount = 4
-
-            for fjoint in range(0, fingercount):
-                # Set up a variable for the finger naming
-                finger_name_short = "{}_{}_{}".format(side, finger, str(fjoint))
-
-                # Create parent constraints from each finger controller to it's respective joint
-                cmds.parentConstraint("{}_CTRL".format(finger_name_short), "{}_JNT".format(finger_name_short), maintainOffset=True)
-
-                # TODO check this works
-
-                lock_unkeyframe = {
-                    "lock":True,
-                    "keyable":False
-                }
-
-                # Lock and hide respective attributes for each control
-                for xyz in ["X", "Y", "Z"]:
-                    # Lock and hide translate, rotation, and scale for each main joint group
-                    for attr in ["translate", "rotate", "scale"]:
-                        for item in [finger_name_short + "_GRP", handattrsgrp[0], handattrsgrp[1]]:
-                            cmds.setAttr("{}.{}{}".format(item, attr, xyz), **lock_unkeyframe)
-                    # Lock and hid translate and scale for offset groups and controls
-                    for attr in ["translate", "scale"]:
-                        cmds.setAttr("{}_Offset_GRP.{}{}".format(finger_name_short, attr, xyz), **lock_unkeyframe)
-                        cmds.setAttr("{}_CTRL.{}{}".format(finger_name_short, attr, xyz), **lock_unkeyframe)
-
+        # Parent constrain each finger controller to it's respective joint
+        Bulk_Ops.parent_constraints(fingerctrls, ["{}_JNT".format(ctrl[:-len("_CTRL")]) for ctrl in fingerctrls])
 
-                # Lock and hide visibility for each grp, offset grp, and control on the fingers
-                for finger_item in ["GRP", "Offset_GRP", "CTRL"]:
-                    cmds.setAttr("{}_{}.visibility".format(finger_name_short, finger_item), **lock_unkeyframe)
-
-                cmds.setAttr("{}.visibility".format(handattrsgrp[1]), **lock_unkeyframe)
+        # Lock and hide everything but rotation on the controllers, and everything on the groups and attrs control
+        offsetgrps = ["{}_Offset_GRP".format(ctrl[:-len("_CTRL")]) for ctrl in fingerctrls]
+        Bulk_Ops.lock_attrs(["{}.{}".format(item, attr) for item in fingergrps + list(handattrsgrp)
+                             for attr in ["translate", "rotate", "scale"]], hide=True)
+        Bulk_Ops.lock_attrs(["{}.{}".format(item, attr) for item in offsetgrps + fingerctrls
+                             for attr in ["translate", "scale"]], hide=True)
+        Bulk_Ops.lock_attrs(["{}.visibility".format(item) for item in fingergrps + offsetgrps + fingerctrls
+                             + [handattrsgrp[1]]], hide=True)
 
 
         cmds.parent(handgrp, self.char_name + "_Rig")
 
         # Deselect everything to make sure it doesn't mess with other parts of the code
-        cmds.select(deselect=True)
+        self.deselect()
 
         class Hand:
-            def __init__(self, handgrp):
+            def __init__(self, handgrp, handattrs,
+                         fingerctrls):
                 self.handgrp = handgrp
-            
-        return Hand(handgrp)
+                self.handattrs = handattrs
+                self.fingerctrls = fingerctrls
+
+        return self.keep_result(Hand(handgrp, handattrsgrp[1], fingerctrls))
+
+
+    def hand_pose_network(self, part_name="",
+                          attrsctrl="", contributions=None):
+        # Shared pose network for a hand, taking (target plug, pose, value) contributions, where each target gets the
+        # sum of value * attrsctrl.pose over every pose contributing to it
+        # Every unique pose and value pair gets one multDoubleLinear, shared by every target that uses it, and only
+        # targets with more than one pose get a plusMinusAverage to add them together
+        scalers = []
+        for target, pose, value in contributions:
+            if (pose, value) not in scalers:
+                scalers.append((pose, value))
+        scalenodes = Bulk_Ops.create_nodes("multDoubleLinear", ["{}_{}_{}_Pose_MDL".format(part_name, pose, num)
+                                                                for num, (pose, value) in enumerate(scalers)])
+        values = [("{}.input2".format(node), float(value)) for node, (pose, value) in zip(scalenodes, scalers)]
+        connections = [("{}.{}".format(attrsctrl, pose), "{}.input1".format(node))
+                       for node, (pose, value) in zip(scalenodes, scalers)]
+
+        targets = {}
+        for target, pose, value in contributions:
+            targets.setdefault(target, []).append(scalenodes[scalers.index((pose, value))])
+        summed = [target for target in targets if len(targets[target]) > 1]
+        sumnodes = Bulk_Ops.create_nodes("plusMinusAverage", ["{}_{}_Pose_PMA".format(part_name, num)
+                                                              for num in range(len(summed))])
+        for target, nodes in targets.items():
+            if target in summed:
+                sumnode = sumnodes[summed.index(target)]
+                for index, node in enumerate(nodes):
+                    connections.append(("{}.output".format(node), "{}.input1D[{}]".format(sumnode, index)))
+                connections.append(("{}.output1D".format(sumnode), target))
+            else:
+                connections.append(("{}.output".format(nodes[0]), target))
+
+        Bulk_Ops.set_attrs(values)
+        Bulk_Ops.connect_attrs(connections)
+
+        return scalenodes + sumnodes
 
 
     def curve_rig(self, part_name="",
@@ -1012,7 +1749,8 @@ class BuildComponents(object):
         # Create a controller for each joint in the FK chain, position it at it's joint, and parent constrain it
         for jnt, num in zip(fkjnts, range(0, len(fkjnts))):
             fkgrp = self.controllers_setup(part_name=part_name + "_" + str(num), shape=shape,
-                                           scale=(3*scale, 3*scale, 3*scale))
+                                           scale=(3*scale, 3*scale, 3*scale),
+                                           component=part_name, role="FK")
             cmds.xform(fkgrp[0], translation=(cmds.xform(jnt, translation=True, query=True, worldSpace=True)), ro=(cmds.xform(jnt, rotation=True, query=True, worldSpace=True)), worldSpace=True)
             if num == 0:
                 fkgrpone = fkgrp
@@ -1027,15 +1765,229 @@ class BuildComponents(object):
         # Parent the first FK controller's group to the _Rig group
         cmds.parent(fkgrpone[0], self.char_name + "_Rig")
 
-        cmds.select(deselect=True)
+        self.deselect()
 
         return fkgrpone
 
 
+    def chain_joints(self, startjnt="",
+                     endjnt=""):
+        # Get every joint from startjnt down to endjnt in order, read from endjnt's full DAG path in a single command
+        # rather than walking up the hierarchy one listRelatives call at a time, so there's no limit on it's length
+        path = cmds.ls(endjnt, long=True)[0].split("|")
+        if startjnt not in path:
+            raise Exception("Could not find {} above {}, check that it is correctly named".format(startjnt, endjnt))
+
+        return path[path.index(startjnt):]
+
+
+    def bulk_controls(self, part_name="",
+                      matrices=None, parent="",
+                      shape="circle", scale=(1,1,1),
+                      colour="", component="",
+                      role="", hierarchy=False,
+                      names=None, rotation=(0,0,0),
+                      position=(0,0,0), offsets=False):
+        # Create a _GRP and _CTRL pair for each world matrix in matrices, in a handful of bulk operations rather than
+        # through controllers_setup, with each control using an instance of the shared master shape if instance_shapes
+        # is on, or it's own copy of the curve otherwise, the same as controllers_setup
+        # With hierarchy, each group is parented under the previous control, FK style
+        # names overrides the default {part_name}_{num} base name for each pair, and offsets adds an _Offset_GRP
+        # between each group and control
+        count = len(matrices)
+        if names is None:
+            names = ["{}_{}".format(part_name, num) for num in range(count)]
+        grps = Bulk_Ops.create_nodes("transform", ["{}_GRP".format(name) for name in names],
+                                     parents=[parent] * count)
+        ctrlparents = grps
+        if offsets:
+            ctrlparents = Bulk_Ops.create_nodes("transform", ["{}_Offset_GRP".format(name) for name in names],
+                                                parents=grps)
+        ctrls = Bulk_Ops.create_nodes("transform", ["{}_CTRL".format(name) for name in names],
+                                      parents=ctrlparents)
+
+        if self.instance_shapes:
+            mastershape = self.shape_master(shape=shape, scale=scale, rotation=rotation, position=position)
+            self.shape_masters[(shape, tuple(scale), tuple(rotation), tuple(position))]["instances"] += count
+            Bulk_Ops.instance_shape(mastershape, ctrls)
+        else:
+            # Copy one curve built for this call onto every control, then remove it
+            template = self.control_curve("{}_Template_CTRL".format(names[0]), shape=shape, scale=scale,
+                                          rotation=rotation, position=position)
+            Bulk_Ops.copy_shape(cmds.listRelatives(template, shapes=True)[0], ctrls)
+            cmds.delete(template)
+
+        if hierarchy:
+            # Each group's local matrix is relative to the previous control, which sits at the previous matrix
+            for grp, ctrl in zip(grps[1:], ctrls[:-1]):
+                cmds.parent(grp, ctrl, relative=True)
+            parentmatrices = np.concatenate([Bulk_Ops.world_matrices([parent]), matrices[:-1]])
+            translations, rotations = rm.decompose_matrices(rm.local_matrices(matrices, parentmatrices))
+            values = []
+            for grp, translation, rotation in zip(grps, translations, rotations):
+                values.append(("{}.translate".format(grp), translation))
+                values.append(("{}.rotate".format(grp), rotation))
+            Bulk_Ops.set_attrs(values)
+        else:
+            Bulk_Ops.set_world_matrices(grps, matrices)
+
+        # Set controller colour on the transforms, which works for shared and copied shapes alike
+        colourvalues = []
+        for ctrl in ctrls:
+            colourvalues.append(("{}.overrideEnabled".format(ctrl), True))
+            if colour:
+                colourvalues.append(("{}.overrideColor".format(ctrl), {"blue": 18, "yellow": 22}[colour]))
+        Bulk_Ops.set_attrs(colourvalues)
+
+        for grp, ctrl in zip(grps, ctrls):
+            self.controls.add(ctrl, grp, component=component, role=role)
+
+        return grps, ctrls
+
+
+    def long_fkchain(self, part_name="",
+                     startjnt="", endjnt="",
+                     ctrlevery=5, scale=1,
+                     shape="circle", colour=""):
+        # FK chain for tails and tentacles of any length, with a controller on every ctrlevery'th joint
+        # Each controller's rotation is spread evenly over the joints up to the next controller, through one
+        # multiplyDivide per controller, and each controller's group follows the joint just before it
+        # Everything is created in bulk, so the cost per joint stays small for chains of hundreds of joints
+        fkjnts = self.chain_joints(startjnt=startjnt, endjnt=endjnt)
+        jntmatrices = Bulk_Ops.world_matrices(fkjnts)
+        ctrlindices = list(range(0, len(fkjnts), ctrlevery))
+
+        chaingrp = cmds.group(name="{}_FKChain".format(part_name), parent="{}_Rig".format(self.char_name), empty=True)
+        self.lockhideattr(chaingrp, hide=False)
+
+        fkgrps, fkctrls = self.bulk_controls(part_name=part_name, matrices=jntmatrices[ctrlindices],
+                                             parent=chaingrp, shape=shape,
+                                             scale=(3*scale, 3*scale, 3*scale), colour=colour,
+                                             component=part_name, role="FK")
+
+        # Each group follows the joint before it's segment, and the first follows startjnt's parent, if it has one
+        startparent = cmds.listRelatives(startjnt, parent=True)
+        drivers = [fkjnts[index - 1] for index in ctrlindices[1:]]
+        drivens = fkgrps[1:]
+        if startparent:
+            drivers.insert(0, startparent[0])
+            drivens.insert(0, fkgrps[0])
+        Bulk_Ops.parent_constraints(drivers, drivens)
+
+        # Spread each controller's rotation over it's segment of joints
+        distnodes = Bulk_Ops.create_nodes("multiplyDivide", ["{}_{}_Dist_MD".format(part_name, num)
+                                                             for num in range(len(fkctrls))])
+        restrotations = Bulk_Ops.get_attrs(["{}.rotate".format(jnt) for jnt in fkjnts])
+
+        pmanames = []
+        values = []
+        connections = []
+        for num, (ctrl, distnode, startindex) in enumerate(zip(fkctrls, distnodes, ctrlindices)):
+            segment = range(startindex, min(startindex + ctrlevery, len(fkjnts)))
+            values.append(("{}.input2".format(distnode), [1.0 / len(segment)] * 3))
+            connections.append(("{}.rotate".format(ctrl), "{}.input1".format(distnode)))
+            for index in segment:
+                if any(abs(value) > 1e-6 for value in restrotations[index]):
+                    # Joints with a rest rotation need it adding back on
+                    pmanames.append((index, distnode))
+                else:
+                    connections.append(("{}.output".format(distnode), "{}.rotate".format(fkjnts[index])))
+
+        pmanodes = Bulk_Ops.create_nodes("plusMinusAverage", ["{}_Rest_PMA".format(fkjnts[index].replace("_JNT", ""))
+                                                              for index, distnode in pmanames])
+        for pmanode, (index, distnode) in zip(pmanodes, pmanames):
+            values.append(("{}.input3D[0]".format(pmanode), restrotations[index]))
+            connections.append(("{}.output".format(distnode), "{}.input3D[1]".format(pmanode)))
+            connections.append(("{}.output3D".format(pmanode), "{}.rotate".format(fkjnts[index])))
+
+        Bulk_Ops.set_attrs(values)
+        Bulk_Ops.connect_attrs(connections)
+
+        # Only rotation is animatable on the controllers
+        Bulk_Ops.lock_attrs(["{}.{}".format(grp, attr) for grp in fkgrps
+                             for attr in ["translate", "rotate", "scale", "visibility"]])
+        Bulk_Ops.lock_attrs(["{}.{}".format(ctrl, attr) for ctrl in fkctrls
+                             for attr in ["translate", "scale", "visibility"]])
+
+        self.deselect()
+
+        return fkgrps, fkctrls
+
+
+    def long_curve_rig(self, part_name="",
+                       startjnt="", endjnt="",
+                       ctrlevery=5, scale=1,
+                       colour=""):
+        # Ribbon rig for tails and tentacles of any length, with one follicle per joint, and an FK controller on every
+        # ctrlevery'th joint (and the last joint), which skin the ribbon so the joints in between are interpolated
+        # Everything is created in bulk, so the cost per joint stays small for chains of hundreds of joints
+        rbnjnts = self.chain_joints(startjnt=startjnt, endjnt=endjnt)
+        jntmatrices = Bulk_Ops.world_matrices(rbnjnts)
+
+        rbngrp = cmds.group(name="{}_RBN_Rig".format(part_name), parent="{}_Rig".format(self.char_name), empty=True)
+        flcgrp = cmds.group(name="{}_FOLLICLES".format(part_name), parent=rbngrp, empty=True)
+
+        # Loft a surface between two curves offset 1 unit either side of the joints along their Y axes
+        positions = jntmatrices[:, 3, :3]
+        yaxes = rm.normalize(jntmatrices[:, 1, :3])
+        for i, offset in zip(["A", "B"], [yaxes, -yaxes]):
+            cmds.curve(name="{}_{}_CrvTemp".format(part_name, i), degree=1,
+                       point=[tuple(point) for point in positions + offset])
+        nrbpatch = cmds.loft("{}_A_CrvTemp".format(part_name), "{}_B_CrvTemp".format(part_name),
+                             name="{}_NRB".format(part_name))
+        nrbpatch = cmds.bakePartialHistory(nrbpatch)
+        cmds.delete("{}_A_CrvTemp".format(part_name), "{}_B_CrvTemp".format(part_name))
+        cmds.parent(nrbpatch[0], rbngrp)
+
+        # One follicle per joint, each parent constraining it's joint
+        jntcount = len(rbnjnts)
+        follicles = Bulk_Ops.create_follicles(nrbpatch[0], [(0.5, i / (jntcount - 1.0)) for i in range(jntcount)],
+                                              ["{}_{}_FLC".format(part_name, i) for i in range(jntcount)],
+                                              parent=flcgrp)
+        Bulk_Ops.parent_constraints(follicles, rbnjnts)
+
+        # FK controllers every ctrlevery'th joint, each with a joint to skin the ribbon to
+        ctrlindices = list(range(0, jntcount, ctrlevery))
+        if ctrlindices[-1] != jntcount - 1:
+            ctrlindices.append(jntcount - 1)
+        fkgrps, fkctrls = self.bulk_controls(part_name=part_name, matrices=jntmatrices[ctrlindices],
+                                             parent="{}_Rig".format(self.char_name), shape="circle",
+                                             scale=(3*scale, 3*scale, 3*scale), colour=colour,
+                                             component=part_name, role="FK", hierarchy=True)
+        # The first group follows startjnt's parent, if it has one, so the chain moves with whatever it's attached to
+        startparent = cmds.listRelatives(startjnt, parent=True)
+        if startparent:
+            Bulk_Ops.parent_constraints([startparent[0]], [fkgrps[0]])
+        skinjnts =Bulk_Ops.create_nodes("joint", ["{}_{}_Skin_JNT".format(part_name, num)
+                                                   for num in range(len(fkctrls))], parents=fkctrls)
+        cmds.skinCluster(skinjnts, nrbpatch[0], toSelectedBones=True, maximumInfluences=2,
+                         name="{}_RBN_SkinCluster".format(part_name))
+
+        # Hide the skin joints before locking their visibility, as hide can't change a locked attribute
+        cmds.hide(flcgrp, nrbpatch[0], skinjnts)
+
+        Bulk_Ops.lock_attrs(["{}.{}".format(ctrl, attr) for ctrl in fkctrls for attr in ["scale", "visibility"]])
+        Bulk_Ops.lock_attrs(["{}.visibility".format(jnt) for jnt in skinjnts])
+        for part in [rbngrp, flcgrp]:
+            self.lockhideattr(part, hide=False)
+
+        self.deselect()
+
+        return fkgrps, fkctrls, rbngrp
+
+
     def digileg(self, part_name="",
                 startjnt="", kneejnt="",
                 anklejnt="", heeljnt="",
-                footjnt="", flipped=False):
+                footjnt="", flipped=False,
+                solver=None, twist=0):
+        # solver picks the IK setup, from "eval" (digileg_eval_ik), "simple" (digileg_simple_ik) or "analytic"
+        # (digileg_analytic_ik), and defaults to eval at the full LOD and simple below it
+        # twist adds that many twist joints along each of the thigh and shin, or 3 each if it's True, see twist_setup
+        if solver is None:
+            solver = "eval" if self.lod == self.LOD_FULL else "simple"
+        if solver not in ["eval", "simple", "analytic"]:
+            raise ValueError("Digileg solver {} not recognised".format(solver))
 
         if flipped:
             side="Rt"
@@ -1048,6 +2000,36 @@ class BuildComponents(object):
         leggrp = cmds.group(name=part_name, empty=True)
         cmds.parent(leggrp, self.char_name + "_Rig")
 
+        # What's passed back out from either LOD, where the lowest has no IK, attrs or connect joints
+        class Leg:
+            def __init__(self, leggrp, fkgrps, ikgrp, legattrsgrp, connectjnts, twistjnts):
+                self.leggrp = leggrp
+                self.fkgrps = fkgrps
+                self.ikgrp = ikgrp
+                self.legattrsgrp = legattrsgrp
+                self.connectjnts = connectjnts
+                self.twistjnts = twistjnts
+
+        # The lowest LOD has FK controls driving the bind joints directly, with no IK or FKIK blending
+        if self.lod == self.LOD_LOW:
+            legjnts = [startjnt, kneejnt, anklejnt, heeljnt]
+            fkgrps = self.fk_controls_setup(part_names=["{}_FK_{}".format(part_name, cnt) for cnt in range(len(legjnts))],
+                                            joints=legjnts, parent=leggrp,
+                                            colour=colour, scale=(10,10,10),
+                                            component="Leg")
+            # Follow the hips
+            cmds.parentConstraint(cmds.listRelatives(startjnt, p=1), fkgrps[0][0], maintainOffset=True)
+            for fkgrp in fkgrps:
+                self.lockhideattr(fkgrp[0])
+            twistjnts = []
+            if twist:
+                twistjnts = self.limb_twist(part_name=part_name, startjnt=startjnt,
+                                            midjnt=kneejnt, endjnt=anklejnt,
+                                            twist=twist)
+
+            self.deselect()
+            return self.keep_result(Leg(leggrp, fkgrps, None, None, [], twistjnts))
+
 
         # Create FKIK setup
         legfkikgrp = cmds.group(name=part_name + "_FKIK", empty=True, parent=leggrp)
@@ -1080,8 +2062,10 @@ class BuildComponents(object):
         fkjnts = cmds.listRelatives(cnctjntone.replace("Connect", "FK"), allDescendents=True, c=1)
         fkjnts.append(cnctjntone.replace("Connect", "FK"))
         fkjnts.reverse()
+        fkgrps = []
         for cnt, jnt in enumerate(fkjnts):
-            fkgrp = self.controllers_setup(part_name=part_name + "_FK_" + str(cnt), scale=(10,10,10), rotation=(0,90,0), colour=colour)
+            fkgrp = self.controllers_setup(part_name=part_name + "_FK_" + str(cnt), scale=(10,10,10), rotation=(0,90,0), colour=colour,
+                                           component="Leg", role="FK")
             cmds.xform(fkgrp[0], t=(cmds.xform(jnt, translation=True, query=True, worldSpace=True)), ro=(cmds.xform(jnt, rotation=True, query=True, worldSpace=True)), worldSpace=True)
             self.lockhideattr(fkgrp[1], rotate=False)
             if cnt == 0:
@@ -1090,37 +2074,27 @@ class BuildComponents(object):
             else:
                 cmds.parent(fkgrp[0], part_name + "_FK_" + str((cnt-1)) + "_CTRL")
             cmds.parentConstraint(fkgrp[1], jnt)
+            fkgrps.append(fkgrp)
 
 
         # Create secondary IK Leg
         # Create reverse Foot>Ankle joint chain
         # Create IK Foot controller and PV control
-        ikgrp = self.controllers_setup(part_name=part_name + "_IK_Foot", shape="circle", rotation=(90,0,0), scale=(10,10,20), colour=colour)
+        ikgrp = self.controllers_setup(part_name=part_name + "_IK_Foot", shape="circle", rotation=(90,0,0), scale=(10,10,20), colour=colour,
+                                       component="Leg", role="IK")
         footjntpos = cmds.xform(footjnt, translation=True, query=True, worldSpace=True)
         cmds.xform(ikgrp[0], t=(footjntpos[0], 0, footjntpos[2]), worldSpace=True)
         cmds.parent(ikgrp[0], leggrp)
         self.lockhideattr(ikgrp[0], visibility=False)
         self.lockhideattr(ikgrp[1], rotate=False, translation=False)
 
-        # Create IK Reverse Controller
-        ikrevgrp = self.controllers_setup(part_name=part_name + "_IK_Rev_Foot", shape="square", scale=(10,10,10), colour=colour)
-        cmds.xform(ikrevgrp[0], translation=(cmds.xform(heeljnt, translation=True, query=True, worldSpace=True)))
-        cmds.xform(ikrevgrp[0], rotation=(cmds.xform(anklejnt, rotation=True, query=True, worldSpace=True)))
-        cmds.xform(ikrevgrp[0], translation=(0, 7, -7), relative=1)
-        cmds.xform(ikrevgrp[1], pivots=(cmds.xform(heeljnt, translation=True, query=True, worldSpace=True)), worldSpace=True)
-
-        cmds.parent(ikrevgrp[0], leggrp)
-        self.lockhideattr(ikrevgrp[1], rotate=False, translation=False)
-
-
-
         # Create Attrs group and controller
         if flipped:
             legattrsgrp = self.controllers_setup(part_name=side + "_Leg_Attrs", shape="pointedsquare", scale=(-8, 8, 8),
-                                                 colour=colour)
+                                                 colour=colour, component="Leg", role="Attrs")
         else:
             legattrsgrp = self.controllers_setup(part_name=side + "_Leg_Attrs", shape="pointedsquare", scale=(8, 8, 8),
-                                                 colour=colour)
+                                                 colour=colour, component="Leg", role="Attrs")
         cmds.xform(legattrsgrp[0], t=(cmds.xform(cnctjntone, translation=True, query=True, worldSpace=True)), worldSpace=True)
         # Parent arm attrs group to arm group
         cmds.parent(legattrsgrp[0], leggrp)
@@ -1130,18 +2104,17 @@ class BuildComponents(object):
 
 
         # Create FKIK, and space switching attributes for each leg
-        cmds.select(legattrsgrp[1])
-        cmds.addAttr(sn="FKIK", ln="FKIK", min=0, max=1, dv=0, ex=1, h=0, k=1)
-        cmds.addAttr(sn="Pos_SS", ln="Position_Space_Switching", enumName="Root:Hips:Chest:Scapula", **self.enum_kwargs)
-        cmds.addAttr(sn="Rot_SS", ln="Rotation_Space_Switching", enumName="Root:Hips:Chest:Scapula", **self.enum_kwargs)
-        cmds.select(deselect=True)
+        cmds.addAttr(legattrsgrp[1], sn="FKIK", ln="FKIK", min=0, max=1, dv=0, ex=1, h=0, k=1)
+        cmds.addAttr(legattrsgrp[1], sn="Pos_SS", ln="Position_Space_Switching", enumName="Root:Hips:Chest:Scapula", **self.enum_kwargs)
+        cmds.addAttr(legattrsgrp[1], sn="Rot_SS", ln="Rotation_Space_Switching", enumName="Root:Hips:Chest:Scapula", **self.enum_kwargs)
+        self.deselect()
         # default FKIK attr to IK
         cmds.setAttr(legattrsgrp[1] + ".FKIK", 1)
 
 
         # FKIK switching setup
         # Create math node to reverse (1 - fkikattr)
-        fkikreverse = cmds.createNode("floatMath", n=side + "_Arm_FKIK_Reverse_FM")
+        fkikreverse = cmds.createNode("floatMath", n=side + "_Leg_FKIK_Reverse_FM")
         cmds.setAttr(fkikreverse + ".operation", 1)
         cmds.connectAttr(legattrsgrp[1] + ".FKIK", fkikreverse + ".floatB")
 
@@ -1160,31 +2133,90 @@ class BuildComponents(object):
         cmds.connectAttr(fkikreverse + ".outFloat", fkgrpone[0] + ".visibility")
 
 
+        # IK solve, using the digitigrade eval chains, a single analytic solve, or a single two part chain
+        if solver == "eval":
+            hidenodes = self.digileg_eval_ik(part_name=part_name, startjnt=startjnt,
+                                             kneejnt=kneejnt, anklejnt=anklejnt,
+                                             heeljnt=heeljnt, leggrp=leggrp,
+                                             ikgrp=ikgrp, colour=colour)
+        elif solver == "analytic":
+            hidenodes = self.digileg_analytic_ik(part_name=part_name, startjnt=startjnt,
+                                                 kneejnt=kneejnt, anklejnt=anklejnt,
+                                                 heeljnt=heeljnt, leggrp=leggrp,
+                                                 ikgrp=ikgrp)
+        else:
+            hidenodes = self.digileg_simple_ik(part_name=part_name, startjnt=startjnt,
+                                               anklejnt=anklejnt, heeljnt=heeljnt,
+                                               leggrp=leggrp, ikgrp=ikgrp)
+
+
+        # Parent constrain Connect joints to bind joints
+        for i in [startjnt, kneejnt, anklejnt, heeljnt]:
+            bindjparentconst = cmds.parentConstraint(i.replace("_JNT", "_Connect_JNT"), i, maintainOffset=True)
+
+        # Point constrain the upper _IK_JNT to the hips, where the analytic solve chain already follows them
+        if solver != "analytic":
+            cmds.parentConstraint(cmds.listRelatives(startjnt, p=1), startjnt.replace("_JNT", "_IK_JNT"), maintainOffset=True)
+
+        for i in hidenodes + [legfkikgrp]:
+            cmds.hide(i)
+
+        # Twist joints along the thigh and shin, added last so they aren't in the duplicated joint chains
+        twistjnts = []
+        if twist:
+            twistjnts = self.limb_twist(part_name=part_name, startjnt=startjnt,
+                                        midjnt=kneejnt, endjnt=anklejnt,
+                                        twist=twist)
+
+        connectjnts = [jnt.replace("_JNT", "_Connect_JNT") for jnt in [startjnt, kneejnt, anklejnt, heeljnt]]
+
+        return self.keep_result(Leg(leggrp, fkgrps, ikgrp, legattrsgrp, connectjnts, twistjnts))
+
+
+    def digileg_eval_ik(self, part_name="",
+                        startjnt="", kneejnt="",
+                        anklejnt="", heeljnt="",
+                        leggrp="", ikgrp=None,
+                        colour=""):
+        # Full digitigrade IK, with an IK eval chain driving a reverse foot control and a reverse eval chain, which
+        # in turn drive the upper and lower IK handles on the _IK_JNT chain
+        # Returns the nodes that should be hidden
+        # Create IK Reverse Controller
+        ikrevgrp = self.controllers_setup(part_name=part_name + "_IK_Rev_Foot", shape="square", scale=(10,10,10), colour=colour,
+                                          component="Leg", role="IK_Rev")
+        cmds.xform(ikrevgrp[0], translation=(cmds.xform(heeljnt, translation=True, query=True, worldSpace=True)))
+        cmds.xform(ikrevgrp[0], rotation=(cmds.xform(anklejnt, rotation=True, query=True, worldSpace=True)))
+        cmds.xform(ikrevgrp[0], translation=(0, 7, -7), relative=1)
+        cmds.xform(ikrevgrp[1], pivots=(cmds.xform(heeljnt, translation=True, query=True, worldSpace=True)), worldSpace=True)
+
+        cmds.parent(ikrevgrp[0], leggrp)
+        self.lockhideattr(ikrevgrp[1], rotate=False, translation=False)
+
+
         # Create IK Eval chain leg
-        ikevaljntone = cmds.joint(n=part_name + "_IK_Eval_0_JNT")
-        cmds.xform(ikevaljntone, t=cmds.xform(startjnt, query=True, translation=True, worldSpace=True))
+        ikevaljntone = self.create_joint(part_name + "_IK_Eval_0_JNT",
+                                         position=cmds.xform(startjnt, query=True, translation=True, worldSpace=True))
 
-        ikevaljnttwopos = self.vector_lerp(cmds.xform(kneejnt, query=True, translation=True, worldSpace=True), cmds.xform(anklejnt, query=True, translation=True, worldSpace=True), .5)
         ikevaljnttwoposzposone = cmds.xform(kneejnt, query=True, translation=True, worldSpace=True)
         ikevaljnttwoposzpostwo = cmds.xform(anklejnt, query=True, translation=True, worldSpace=True)
+        ikevaljnttwopos = rm.lerp_points(ikevaljnttwoposzposone, ikevaljnttwoposzpostwo, .5)
         ikevaljnttwopos = (ikevaljnttwopos[0], ikevaljnttwopos[1], min(ikevaljnttwoposzposone[2], ikevaljnttwoposzpostwo[2])-5)
-        ikevaljnttwo = cmds.joint(n=part_name + "_IK_Eval_1_JNT")
-        cmds.xform(ikevaljnttwo, t=ikevaljnttwopos, worldSpace=True)
+        ikevaljnttwo = self.create_joint(part_name + "_IK_Eval_1_JNT", parent=ikevaljntone, position=ikevaljnttwopos)
 
-        ikevaljntthree = cmds.joint(n=part_name + "_IK_Eval_2_JNT")
-        cmds.xform(ikevaljntthree, t=cmds.xform(heeljnt, query=True, translation=True, worldSpace=True), worldSpace=True)
-        cmds.select(deselect=True)
+        ikevaljntthree = self.create_joint(part_name + "_IK_Eval_2_JNT", parent=ikevaljnttwo,
+                                           position=cmds.xform(heeljnt, query=True, translation=True, worldSpace=True))
+        self.deselect()
 
         cmds.parent(ikevaljntone, leggrp)
 
         evalikh = cmds.ikHandle(n=part_name + "_IK_Eval_IKH", sj=ikevaljntone, ee=ikevaljntthree)
-        cmds.select(deselect=True)
+        self.deselect()
 
         # Reverse IK Eval lower leg
-        ikevalrevjntone = cmds.joint(n=part_name + "_IK_EvalRev_0_JNT")
-        cmds.xform(ikevalrevjntone, t=cmds.xform(heeljnt, query=True, translation=True, worldSpace=True), worldSpace=True)
-        ikevalrevjnttwo = cmds.joint(n=part_name + "_IK_EvalRev_1_JNT")
-        cmds.xform(ikevalrevjnttwo, t=cmds.xform(anklejnt, query=True, translation=True, worldSpace=True), worldSpace=True)
+        ikevalrevjntone = self.create_joint(part_name + "_IK_EvalRev_0_JNT",
+                                            position=cmds.xform(heeljnt, query=True, translation=True, worldSpace=True))
+        ikevalrevjnttwo = self.create_joint(part_name + "_IK_EvalRev_1_JNT", parent=ikevalrevjntone,
+                                            position=cmds.xform(anklejnt, query=True, translation=True, worldSpace=True))
 
         cmds.parent(ikevalrevjntone, leggrp)
 
@@ -1215,14 +2247,215 @@ class BuildComponents(object):
 
         self.lockhideattr(ikrevgrp[0], visibility=False)
 
+        # Point constrain the IK eval chain to the hips
+        cmds.parentConstraint(cmds.listRelatives(startjnt, p=1), ikevaljntone, maintainOffset=True)
 
-        # Parent constrain Connect joints to bind joints
-        for i in [startjnt, kneejnt, anklejnt, heeljnt]:
-            bindjparentconst = cmds.parentConstraint(i.replace("_JNT", "_Connect_JNT"), i, maintainOffset=True)
+        return [ikevalrevjntone, ikevaljntone, evalikh, lowerikh, upperikh]
 
-        # Point constrain the upper _IK_JNT to the hips
-        cmds.parentConstraint(cmds.listRelatives(startjnt, p=1), startjnt.replace("_JNT", "_IK_JNT"), maintainOffset=True)
-        cmds.parentConstraint(cmds.listRelatives(startjnt, p=1), ikevaljntone, maintainOffset=True)
 
-        for i in [ikevalrevjntone, ikevaljntone, evalikh, lowerikh, upperikh, legfkikgrp]:
-            cmds.hide(i)
+    def digileg_simple_ik(self, part_name="",
+                          startjnt="", anklejnt="",
+                          heeljnt="", leggrp="",
+                          ikgrp=None):
+        # Simplified digitigrade IK used below the full LOD, with the upper RP and lower SC IK handles on the _IK_JNT
+        # chain parented straight under the IK foot controller, without any eval chains or reverse foot control
+        # Returns the nodes that should be hidden
+        upperikh = cmds.ikHandle(n=part_name + "_UpperIK_IKH",
+                                 sj=startjnt.replace("_JNT", "_IK_JNT"), ee=anklejnt.replace("_JNT", "_IK_JNT"))
+        cmds.parent(upperikh[0], ikgrp[1])
+
+        lowerikh = cmds.ikHandle(n=part_name + "_LowerIK_IKH",
+                                 sj=anklejnt.replace("_JNT", "_IK_JNT"), ee=heeljnt.replace("_JNT", "_IK_JNT"),
+                                 sol="ikSCsolver")
+        cmds.parent(lowerikh[0], ikgrp[1])
+
+        ikjorientconst = cmds.orientConstraint(ikgrp[1], heeljnt.replace("_JNT", "_IK_JNT"), maintainOffset=True)
+        cmds.setAttr(ikjorientconst[0] + ".interpType", 0)
+
+        self.deselect()
+
+        return [upperikh[0], lowerikh[0]]
+
+
+    def digileg_analytic_ik(self, part_name="",
+                            startjnt="", kneejnt="",
+                            anklejnt="", heeljnt="",
+                            leggrp="", ikgrp=None):
+        # Digitigrade IK from a single two bone solve, holding the ankle to heel segment at it's rest angle to the hip
+        # to knee segment. Then hip to heel is (hip to knee + ankle to heel) + knee to ankle, and the first part is
+        # a fixed length that turns with the thigh, so one RP IK handle on a hidden three joint chain solves all of it
+        # Returns the nodes that should be hidden
+        hippos, kneepos, anklepos, heelpos = [np.array(cmds.xform(jnt, query=True, translation=True, worldSpace=True))
+                                              for jnt in [startjnt, kneejnt, anklejnt, heeljnt]]
+
+        # Solve chain, with the combined thigh and metatarsus as the first bone and the shin as the second
+        solvejnts = []
+        for cnt, position in enumerate([hippos, hippos + (kneepos - hippos) + (heelpos - anklepos), heelpos]):
+            solvejnts.append(self.create_joint("{}_IK_Solve_{}_JNT".format(part_name, cnt),
+                                               parent=solvejnts[-1] if solvejnts else None,
+                                               position=tuple(position)))
+        cmds.joint(solvejnts[0], edit=True, orientJoint="xyz", secondaryAxisOrient="yup",
+                   children=True, zeroScaleOrient=True)
+        cmds.joint(solvejnts[0], edit=True, setPreferredAngles=True, children=True)
+        cmds.parent(solvejnts[0], leggrp)
+
+        solveikh = cmds.ikHandle(n=part_name + "_IK_Solve_IKH", sj=solvejnts[0], ee=solvejnts[2])
+        cmds.parent(solveikh[0], ikgrp[1])
+
+        # The thigh and metatarsus both turn with the first solve bone, and the shin with the second
+        cmds.parentConstraint(solvejnts[0], startjnt.replace("_JNT", "_IK_JNT"), maintainOffset=True)
+        cmds.orientConstraint(solvejnts[1], kneejnt.replace("_JNT", "_IK_JNT"), maintainOffset=True)
+        cmds.orientConstraint(solvejnts[0], anklejnt.replace("_JNT", "_IK_JNT"), maintainOffset=True)
+
+        ikjorientconst = cmds.orientConstraint(ikgrp[1], heeljnt.replace("_JNT", "_IK_JNT"), maintainOffset=True)
+        cmds.setAttr(ikjorientconst[0] + ".interpType", 0)
+
+        # Follow the hips
+        cmds.parentConstraint(cmds.listRelatives(startjnt, p=1), solvejnts[0], maintainOffset=True)
+
+        self.deselect()
+
+        return [solvejnts[0], solveikh[0]]
+
+
+    def multi_limb_setup(self, part_name="Legs",
+                         limbroots=None, jointcount=3,
+                         spaces=("Root_CTRL", "Hips_CTRL", "Chest_CTRL"),
+                         scale=1, colour="yellow"):
+        # FKIK limbs for creatures with many legs, built together so every limb shares one attrs control, one FKIK
+        # switch and one space switching network, instead of each limb building it's own
+        # Each limb is the jointcount joints from it's root down through the first child, and it's bind joints'
+        # rotations blend straight from the FK controls and the IK joints, through one blendColors per joint
+        limbs = []
+        for root in limbroots:
+            chain = [root]
+            while len(chain) < jointcount:
+                chain.append(cmds.listRelatives(chain[-1], children=True, type="joint")[0])
+            limbs.append(chain)
+        limbnames = [root.replace("_0_JNT", "").replace("_JNT", "") for root in limbroots]
+        bindjnts = [jnt for chain in limbs for jnt in chain]
+
+        limbsgrp = cmds.group(name=part_name, parent="{}_Rig".format(self.char_name), empty=True)
+
+        # Shared attrs control, with one FKIK attribute and one space switch for every limb
+        attrsgrp = self.controllers_setup(part_name="{}_Attrs".format(part_name), shape="pointedsquare",
+                                          scale=(8, 8, 8), colour=colour, component=part_name, role="Attrs")
+        cmds.parent(attrsgrp[0], limbsgrp)
+        self.lockhideattr(attrsgrp[1])
+        spaces = [space for space in spaces if cmds.objExists(space)]
+        cmds.addAttr(attrsgrp[1], shortName="FKIK", longName="FKIK", min=0, max=1, dv=1, exists=True, hidden=False, keyable=True)
+        cmds.addAttr(attrsgrp[1], shortName="SS", longName="Space_Switching",
+                     enumName=":".join(space.replace("_CTRL", "") for space in spaces), **self.enum_kwargs)
+
+        fkikreverse = cmds.createNode("floatMath", name="{}_FKIK_Reverse_FM".format(part_name))
+        cmds.setAttr(fkikreverse + ".operation", 1)
+        cmds.connectAttr(attrsgrp[1] + ".FKIK", fkikreverse + ".floatB")
+
+        # Every IK control sits under one space group, so switching space is a single constraint for all of them
+        spacegrp = cmds.group(name="{}_IK_Space_GRP".format(part_name), parent=limbsgrp, empty=True)
+        cmds.connectAttr(attrsgrp[1] + ".FKIK", spacegrp + ".visibility")
+        if spaces:
+            spaceconstraint = cmds.parentConstraint(spaces, spacegrp, maintainOffset=True)[0]
+            weights = cmds.parentConstraint(spaceconstraint, query=True, weightAliasList=True)
+            for index, (space, weight) in enumerate(zip(spaces, weights)):
+                condnode = cmds.createNode("condition", name="{}_{}_SS_COND".format(part_name, space.replace("_CTRL", "")))
+                cmds.connectAttr(attrsgrp[1] + ".Space_Switching", condnode + ".secondTerm")
+                cmds.setAttr(condnode + ".firstTerm", index)
+                cmds.setAttr(condnode + ".colorIfTrueR", 1)
+                cmds.setAttr(condnode + ".colorIfFalseR", 0)
+                cmds.connectAttr(condnode + ".outColorR", "{}.{}".format(spaceconstraint, weight))
+
+        # Limbs sharing a parent joint share one follow group, matching that parent's world matrix, so the FK and IK
+        # chains below it have exactly the same local space as the bind joints
+        rootparents = [cmds.listRelatives(root, parent=True)[0] for root in limbroots]
+        uniqueparents = sorted(set(rootparents), key=rootparents.index)
+        followgrps = {}
+        for follow, grp in zip(uniqueparents, Bulk_Ops.create_nodes(
+                "transform", ["{}_{}_Follow_GRP".format(part_name, parent.replace("_JNT", "")) for parent in uniqueparents],
+                parents=[limbsgrp] * len(uniqueparents))):
+            followgrps[follow] = grp
+        Bulk_Ops.set_world_matrices(list(followgrps.values()), Bulk_Ops.world_matrices(list(followgrps.keys())))
+        Bulk_Ops.parent_constraints(list(followgrps.keys()), list(followgrps.values()))
+
+        # IK joint chains, copied from the bind joints in bulk
+        restattrs = ["translate", "rotate", "jointOrient", "rotateOrder"]
+        restvalues = Bulk_Ops.get_attrs(["{}.{}".format(jnt, attr) for jnt in bindjnts for attr in restattrs])
+        iknames = [jnt.replace("_JNT", "_IK_JNT") for jnt in bindjnts]
+        ikjnts = []
+        for chain, rootparent in zip(limbs, rootparents):
+            start = len(ikjnts)
+            ikjnts += Bulk_Ops.create_nodes("joint", iknames[start:start + len(chain)],
+                                            parents=[followgrps[rootparent]] + list(range(len(chain) - 1)))
+        values = []
+        for index, jnt in enumerate(ikjnts):
+            for num, attr in enumerate(restattrs):
+                value = restvalues[index * len(restattrs) + num]
+                values.append(("{}.{}".format(jnt, attr), int(value) if attr == "rotateOrder" else value))
+        Bulk_Ops.set_attrs(values)
+
+        # FK controls, with each group at it's joint's rest frame without the rotate, so the control's rotate is the
+        # joint's rotate, and can drive it directly
+        jntworld = Bulk_Ops.world_matrices(bindjnts)
+        restrotations = np.array([restvalues[index * len(restattrs) + 1] for index in range(len(bindjnts))])
+        grpworld = jntworld.copy()
+        grpworld[:, :3, :3] = np.matmul(np.transpose(rm.matrices_from_euler(restrotations), (0, 2, 1)), jntworld[:, :3, :3])
+        fknames = [jnt.replace("_JNT", "_FK") for jnt in bindjnts]
+        fkgrps, fkctrls = self.bulk_controls(part_name=part_name, matrices=grpworld, parent=limbsgrp,
+                                             shape="circle", scale=(3*scale, 3*scale, 3*scale), colour=colour,
+                                             component=part_name, role="FK", names=fknames)
+        Bulk_Ops.set_attrs([("{}.rotate".format(ctrl), rotation) for ctrl, rotation in zip(fkctrls, restrotations)])
+        start = 0
+        fkrootgrps = []
+        for chain, rootparent in zip(limbs, rootparents):
+            fkrootgrps += cmds.parent(fkgrps[start], followgrps[rootparent])
+            for index in range(start + 1, start + len(chain)):
+                cmds.parent(fkgrps[index], fkctrls[index - 1])
+            start = start + len(chain)
+
+        # IK controls at each limb's end joint, under the shared space group, each holding the limb's IK handle
+        endindices = np.cumsum([len(chain) for chain in limbs]) - 1
+        ikgrps, ikctrls = self.bulk_controls(part_name=part_name, matrices=jntworld[endindices], parent=spacegrp,
+                                             shape="cube", scale=(4*scale, 4*scale, 4*scale), colour=colour,
+                                             component=part_name, role="IK",
+                                             names=["{}_IK".format(name) for name in limbnames])
+        ikhandles = []
+        for chain, ikctrl in zip(limbs, ikctrls):
+            cmds.joint(chain[0].replace("_JNT", "_IK_JNT"), edit=True, setPreferredAngles=True, children=True)
+            ikhandle = cmds.ikHandle(name=chain[0].replace("_JNT", "_IKH"), startJoint=chain[0].replace("_JNT", "_IK_JNT"),
+                                     endEffector=chain[-1].replace("_JNT", "_IK_JNT"))[0]
+            cmds.parent(ikhandle, ikctrl)
+            ikhandles.append(ikhandle)
+
+        # One blendColors per bind joint, between the IK joint and the FK control, all driven by the shared FKIK
+        blendnodes = Bulk_Ops.create_nodes("blendColors", [jnt.replace("_JNT", "_FKIK_BC") for jnt in bindjnts])
+        connections = []
+        for blendnode, bindjnt, ikjnt, fkctrl in zip(blendnodes, bindjnts, ikjnts, fkctrls):
+            connections += [("{}.FKIK".format(attrsgrp[1]), "{}.blender".format(blendnode)),
+                            ("{}.rotate".format(ikjnt), "{}.color1".format(blendnode)),
+                            ("{}.rotate".format(fkctrl), "{}.color2".format(blendnode)),
+                            ("{}.output".format(blendnode), "{}.rotate".format(bindjnt))]
+        # FK controls only show in FK, and the IK joints stay hidden
+        connections += [(fkikreverse + ".outFloat", "{}.visibility".format(grp)) for grp in fkrootgrps]
+        Bulk_Ops.connect_attrs(connections)
+        Bulk_Ops.set_attrs([("{}.visibility".format(ikjnts[start]), False)
+                            for start in np.cumsum([0] + [len(chain) for chain in limbs[:-1]])])
+
+        Bulk_Ops.lock_attrs(["{}.{}".format(grp, attr) for grp in fkgrps + ikgrps
+                             for attr in ["translate", "rotate", "scale", "visibility"]])
+        Bulk_Ops.lock_attrs(["{}.{}".format(ctrl, attr) for ctrl in fkctrls
+                             for attr in ["translate", "scale", "visibility"]])
+        Bulk_Ops.lock_attrs(["{}.{}".format(ctrl, attr) for ctrl in ikctrls for attr in ["scale", "visibility"]])
+        self.deselect()
+
+        class Limbs:
+            def __init__(self, limbsgrp, attrsgrp,
+                         spacegrp, fkctrls,
+                         ikctrls, ikhandles):
+                self.limbsgrp = limbsgrp
+                self.attrsgrp = attrsgrp
+                self.spacegrp = spacegrp
+                self.fkctrls = fkctrls
+                self.ikctrls = ikctrls
+                self.ikhandles = ikhandles
+
+        return self.keep_result(Limbs(limbsgrp, attrsgrp, spacegrp, fkctrls, ikctrls, ikhandles))
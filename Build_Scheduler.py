@@ -0,0 +1,148 @@
+"""
+This script houses a scheduler that runs a rig build as a list of small units during Maya's idle time, so the UI stays
+responsive, with per component progress and ETA, and the option to cancel cleanly between units and resume later
+"""
+
+# Standard library imports
+import time
+
+# Third party imports
+from maya import cmds
+
+# Local application imports
+
+
+
+class BuildUnit(object):
+    """
+    One resumable piece of a build, run with no arguments, and grouped under a component name for progress reporting
+    """
+    def __init__(self, name, function,
+                 component=""):
+        self.name = name
+        self.function = function
+        self.component = component or name
+        self.seconds = None
+
+    def __repr__(self):
+        return "BuildUnit({}, component={})".format(self.name, self.component)
+
+
+class BuildScheduler(object):
+    """
+    Runs BuildUnits in order from an idle scriptJob, fitting as many units into each idle callback as chunkseconds
+        allows. Units never get split, so cancelling always leaves the build between two units, ready to resume
+    """
+    def __init__(self, units, chunkseconds=0.1,
+                 timings=None, chunkcontext=None,
+                 on_finish=None):
+        self.units = units
+        self.chunkseconds = chunkseconds
+        # Seconds per unit name from an earlier build, used for a better ETA than the average of the units run so far
+        self.timings = dict(timings or {})
+        # Called with no arguments for a context manager to run each chunk inside of, like BuildComponents.quiet_build
+        self.chunkcontext = chunkcontext
+        self.on_finish = on_finish
+
+        self.nextunit = 0
+        self.cancelled = False
+        self.error = None
+        self.buildseconds = 0.0
+        self._job = None
+
+    @property
+    def finished(self):
+        return self.nextunit >= len(self.units)
+
+    @property
+    def running(self):
+        return self._job is not None
+
+    def eta(self):
+        # Estimated seconds left, from earlier timings where there are any, and the average unit so far otherwise
+        done = [unit.seconds for unit in self.units[:self.nextunit] if unit.seconds is not None]
+        average = sum(done) / len(done) if done else 0.0
+        return sum(self.timings.get(unit.name, average) for unit in self.units[self.nextunit:])
+
+    def status(self):
+        # One line describing the next unit to run, and the progress through it's component
+        if self.finished:
+            return "Build finished in {:.1f}s".format(self.buildseconds)
+        unit = self.units[self.nextunit]
+        component = [other for other in self.units if other.component == unit.component]
+        return "{} ({}/{}) - {}/{} units - about {:.0f}s left".format(
+            unit.component, component.index(unit) + 1, len(component),
+            self.nextunit, len(self.units), self.eta())
+
+    def start(self):
+        # Start, or resume after a cancel, running the remaining units during idle time
+        if self.running or self.finished:
+            return
+        self.cancelled = False
+        self.error = None
+        if not cmds.about(batch=True):
+            cmds.progressWindow(title="Building rig", progress=self.nextunit, maxValue=len(self.units),
+                                status=self.status(), isInterruptable=True)
+        self._job = cmds.scriptJob(idleEvent=self._idle)
+
+    def cancel(self):
+        # Stop before the next unit. The units already run stay in the scene, and start() carries on from here
+        self.cancelled = True
+        self._stop()
+
+    def run_blocking(self):
+        # Run every remaining unit straight away, the same as the original blocking build
+        while not self.finished and not self.cancelled:
+            self.step()
+        return self.finished
+
+    def step(self):
+        # Run the next unit, and record how long it took
+        unit = self.units[self.nextunit]
+        starttime = time.time()
+        unit.function()
+        unit.seconds = time.time() - starttime
+        self.timings[unit.name] = unit.seconds
+        self.buildseconds = self.buildseconds + unit.seconds
+        self.nextunit = self.nextunit + 1
+
+    def _idle(self):
+        if self._job is None:
+            return
+        if not cmds.about(batch=True) and cmds.progressWindow(query=True, isCancelled=True):
+            self.cancel()
+            return
+
+        starttime = time.time()
+        try:
+            if self.chunkcontext is None:
+                self._chunk(starttime)
+            else:
+                with self.chunkcontext():
+                    self._chunk(starttime)
+        except Exception as error:
+            # Keep the failing unit as the next one, so it can be fixed and the build resumed from it
+            self.error = error
+            self._stop()
+            raise
+
+        if self.finished:
+            self._stop()
+            if self.on_finish:
+                self.on_finish()
+        elif not cmds.about(batch=True):
+            cmds.progressWindow(edit=True, progress=self.nextunit, status=self.status())
+
+    def _chunk(self, starttime):
+        while not self.finished and time.time() - starttime < self.chunkseconds:
+            self.step()
+
+    def _stop(self):
+        if self._job is not None:
+            # scriptJobs can't kill themselves from inside of their own callback, so defer it
+            job = self._job
+            self._job = None
+            cmds.evalDeferred(lambda: cmds.scriptJob(kill=job, force=True))
+        if not cmds.about(batch=True):
+            cmds.progressWindow(endProgress=True)
+        print(self.status() if not self.cancelled else "Build cancelled before {}".format(self.status()))
@@ -0,0 +1,435 @@
+"""
+This script houses bulk versions of the scene operations used by the rig components, which create, connect, and set
+many nodes through a single OpenMaya modifier each, rather than paying the cost of one maya.cmds call per node
+"""
+
+# Standard library imports
+
+# Third party imports
+import numpy as np
+from maya import cmds
+try:
+    from maya.api import OpenMaya as om
+except ImportError:
+    # Offline_Build's stand in for maya.cmds has no API, so fall back to one maya.cmds call per node there
+    om = None
+
+# Local application imports
+import Rig_Math as rm
+
+
+
+"""
+-- NOTES --
+Modifier operations run outside of an undoable command, so these are meant for build scripts rather than tools
+Plugs are given as "node.attr" strings, and can include array indices and children, e.g. "node.input3D[2].input3Dx"
+Angle attributes are set in degrees, the same as maya.cmds
+Without the API (om is None), the scene operations fall back to maya.cmds, with the same arguments and results, but
+    the sampling and keying functions still need the API
+"""
+
+
+def _node(name):
+    # Get the MObject for a node name
+    selection = om.MSelectionList()
+    selection.add(name)
+    return selection.getDependNode(0)
+
+
+def _dagpath(name):
+    # Get the MDagPath for a DAG node name
+    selection = om.MSelectionList()
+    selection.add(name)
+    return selection.getDagPath(0)
+
+
+def _plug(path):
+    # Get the MPlug for a "node.attr[index].child" style path, creating array elements as needed
+    node, attrpath = path.split(".", 1)
+    fn = om.MFnDependencyNode(_node(node))
+    plug = None
+    for token in attrpath.split("."):
+        name, _, index = token.partition("[")
+        attr = fn.attribute(name)
+        plug = fn.findPlug(attr, False) if plug is None else plug.child(attr)
+        if index:
+            plug = plug.elementByLogicalIndex(int(index.rstrip("]")))
+    return plug
+
+
+def _set_plug(modifier, plug,
+              value):
+    # Queue setting a plug's value on the modifier, based on the type of the value and attribute
+    if isinstance(value, bool):
+        modifier.newPlugValueBool(plug, value)
+    elif isinstance(value, (int, np.integer)) and not plug.attribute().hasFn(om.MFn.kUnitAttribute):
+        modifier.newPlugValueInt(plug, int(value))
+    elif np.ndim(value) == 2:
+        matrixdata = om.MFnMatrixData()
+        modifier.newPlugValue(plug, matrixdata.create(om.MMatrix([float(v) for v in np.ravel(value)])))
+    elif np.ndim(value) == 1:
+        for index, child in enumerate(value):
+            _set_plug(modifier, plug.child(index), child)
+    elif plug.attribute().hasFn(om.MFn.kUnitAttribute) and \
+            om.MFnUnitAttribute(plug.attribute()).unitType() == om.MFnUnitAttribute.kAngle:
+        modifier.newPlugValueMAngle(plug, om.MAngle(float(value), om.MAngle.kDegrees))
+    else:
+        modifier.newPlugValueDouble(plug, float(value))
+
+
+def is_dag_type(nodetype):
+    # Check if a node type is a DAG node, and so needs a parent when created
+    return "dagNode" in (cmds.nodeType(nodetype, isTypeName=True, inherited=True) or [])
+
+
+def create_nodes(nodetype, names,
+                 parents=None):
+    # Create one node of nodetype per name in a single modifier, parenting DAG nodes under the matching parent
+    # Shape node types get a transform created for them, which is what's named, parented and returned, with the shape
+    # named after it, so a shape type gives the same result with or without a parent
+    # A parent can also be the index of an earlier name in names, for building a hierarchy in one call, like a chain
+    # of joints with parents [grp, 0, 1, 2...], without looking any of the new nodes up by name
+    # Every DAG node is created at the root, where Maya makes a transform for each shape, and parented afterwards,
+    # as creating a shape straight under a parent would leave it without a transform of it's own. Without the API
+    # the same two passes are made with maya.cmds, so offline builds create the same hierarchy as builds in Maya
+    dag = is_dag_type(nodetype)
+    if om is None:
+        shape = dag and "shape" in cmds.nodeType(nodetype, isTypeName=True, inherited=True)
+        nodes = []
+        for name in names:
+            if shape:
+                node = cmds.createNode("transform", name=name, skipSelect=True)
+                cmds.createNode(nodetype, name="{}Shape".format(node), parent=node, skipSelect=True)
+            else:
+                node = cmds.createNode(nodetype, name=name, skipSelect=True)
+            nodes.append(node)
+        for index, node in enumerate(nodes):
+            parent = parents[index] if dag and parents else None
+            if isinstance(parent, (int, np.integer)):
+                cmds.parent(node, nodes[parent], relative=True)
+            elif parent:
+                cmds.parent(node, parent, relative=True)
+        return nodes
+
+    modifier = om.MDagModifier() if dag else om.MDGModifier()
+    nodes = []
+    for name in names:
+        node = modifier.createNode(nodetype, om.MObject.kNullObj) if dag else modifier.createNode(nodetype)
+        modifier.renameNode(node, name)
+        nodes.append(node)
+    modifier.doIt()
+
+    if dag:
+        # Name any shapes after their new transforms, then parent every node in one more modifier
+        finisher = om.MDagModifier()
+        for node in nodes:
+            if om.MFnDagNode(node).childCount():
+                child = om.MFnDagNode(node).child(0)
+                if om.MFnDependencyNode(child).typeName == nodetype:
+                    finisher.renameNode(child, "{}Shape".format(om.MFnDependencyNode(node).name()))
+        for index, node in enumerate(nodes):
+            parent = parents[index] if parents else None
+            if isinstance(parent, (int, np.integer)):
+                finisher.reparentNode(node, nodes[parent])
+            elif parent:
+                finisher.reparentNode(node, _node(parent))
+        finisher.doIt()
+
+    return [om.MFnDependencyNode(node).name() for node in nodes]
+
+
+def connect_attrs(connections):
+    # Connect each (source plug, destination plug) pair through a single modifier
+    if om is None:
+        for source, destination in connections:
+            cmds.connectAttr(source, destination)
+        return
+
+    modifier = om.MDGModifier()
+    for source, destination in connections:
+        modifier.connect(_plug(source), _plug(destination))
+    modifier.doIt()
+
+
+def set_attrs(values):
+    # Set each (plug, value) pair through a single modifier, where value can be a number, bool, a list of numbers for
+    # compound attributes like translate, or a 4x4 matrix
+    if om is None:
+        for path, value in values:
+            if np.ndim(value) == 2:
+                cmds.setAttr(path, [float(v) for v in np.ravel(value)], type="matrix")
+            elif np.ndim(value) == 1:
+                cmds.setAttr(path, *[float(v) for v in value])
+            else:
+                cmds.setAttr(path, value)
+        return
+
+    modifier = om.MDGModifier()
+    for path, value in values:
+        _set_plug(modifier, _plug(path), value)
+    modifier.doIt()
+
+
+def get_attrs(paths):
+    # Get the value of each numeric plug as a float, or a list of floats for compound attributes like rotate
+    # Angle attributes are returned in degrees, the same as maya.cmds
+    if om is None:
+        values = [cmds.getAttr(path) for path in paths]
+        return [list(value[0]) if isinstance(value, list) else float(value) for value in values]
+
+    def plugvalue(plug):
+        if plug.isCompound:
+            return [plugvalue(plug.child(index)) for index in range(plug.numChildren())]
+        attr = plug.attribute()
+        if attr.hasFn(om.MFn.kUnitAttribute) and \
+                om.MFnUnitAttribute(attr).unitType() == om.MFnUnitAttribute.kAngle:
+            return plug.asMAngle().asDegrees()
+        return plug.asDouble()
+
+    return [plugvalue(_plug(path)) for path in paths]
+
+
+def lock_attrs(paths, hide=True):
+    # Lock each plug, and it's children for compound attributes like translate, also hiding them from the channel box
+    # if hide is True, the same as BuildComponents.lockhideattr
+    if om is None:
+        for path in paths:
+            node, attr = path.split(".", 1)
+            children = cmds.attributeQuery(attr, node=node, listChildren=True) or []
+            for child in ["{}.{}".format(node, child) for child in children] or [path]:
+                if hide:
+                    cmds.setAttr(child, lock=True, keyable=False, channelBox=False)
+                else:
+                    cmds.setAttr(child, lock=True)
+        return
+
+    for path in paths:
+        plug = _plug(path)
+        plugs = [plug.child(index) for index in range(plug.numChildren())] if plug.isCompound else [plug]
+        for child in plugs:
+            child.isLocked = True
+            if hide:
+                child.isKeyable = False
+                child.isChannelBox = False
+
+
+def world_matrices(nodes):
+    # Return an (N, 4, 4) array of each DAG node's current world matrix
+    matrices = np.empty((len(nodes), 4, 4))
+    for index, node in enumerate(nodes):
+        if om is None:
+            matrices[index] = np.reshape(cmds.xform(node, query=True, matrix=True, worldSpace=True), (4, 4))
+        else:
+            matrices[index] = np.reshape(list(_dagpath(node).inclusiveMatrix()), (4, 4))
+    return matrices
+
+
+def set_world_matrices(nodes, matrices):
+    # Place each transform so it's world matrix matches the given (N, 4, 4) array, by setting it's local translate and
+    # rotate relative to it's parent's current world matrix
+    parentmatrices = np.empty((len(nodes), 4, 4))
+    for index, node in enumerate(nodes):
+        if om is None:
+            parentmatrices[index] = np.reshape(cmds.getAttr("{}.parentMatrix[0]".format(node)), (4, 4))
+        else:
+            parentmatrices[index] = np.reshape(list(_dagpath(node).exclusiveMatrix()), (4, 4))
+    translations, rotations = rm.decompose_matrices(np.matmul(matrices, np.linalg.inv(parentmatrices)))
+
+    values = []
+    for node, translation, rotation in zip(nodes, translations, rotations):
+        values.append(("{}.translate".format(node), translation))
+        values.append(("{}.rotate".format(node), rotation))
+    set_attrs(values)
+
+
+def instance_shape(shape, transforms):
+    # Add an instance of shape under every transform, without removing it from it's existing parent
+    if om is None:
+        for transform in transforms:
+            cmds.parent(shape, transform, addObject=True, shape=True)
+        return
+
+    shapenode = _node(shape)
+    for transform in transforms:
+        om.MFnDagNode(_node(transform)).addChild(shapenode, om.MFnDagNode.kNextPos, True)
+
+
+def copy_shape(shape, transforms):
+    # Give every transform it's own copy of a curve shape's data, named {transform}Shape, leaving the original as it is
+    if om is None:
+        source = cmds.listRelatives(shape, parent=True)[0]
+        for transform in transforms:
+            duplicate = cmds.duplicate(source)[0]
+            copy = cmds.listRelatives(duplicate, shapes=True)[0]
+            copy = cmds.parent(copy, transform, relative=True, shape=True)[0]
+            cmds.rename(copy, "{}Shape".format(transform))
+            cmds.delete(duplicate)
+        return
+
+    shapenode = _node(shape)
+    renamer = om.MDGModifier()
+    for transform in transforms:
+        copy = om.MFnNurbsCurve().copy(shapenode, _node(transform))
+        renamer.renameNode(copy, "{}Shape".format(transform))
+    renamer.doIt()
+
+
+def parent_constraints(drivers, drivens,
+                       names=None, maintainoffset=True):
+    # Create parentConstraint nodes from each driver to it's driven node, the same as cmds.parentConstraint, but with
+    # all of the nodes, connections and offsets made in a few modifiers rather than one command per constraint
+    if names is None:
+        names = ["{}_parentConstraint1".format(driven) for driven in drivens]
+
+    # With maintainoffset, driven world = offset * driver world, so offset = driven world * inverse(driver world)
+    if maintainoffset:
+        offsets = np.matmul(world_matrices(drivens), np.linalg.inv(world_matrices(drivers)))
+        offsettranslations, offsetrotations = rm.decompose_matrices(offsets)
+    else:
+        offsettranslations = np.zeros((len(drivens), 3))
+        offsetrotations = np.zeros((len(drivens), 3))
+
+    constraints = create_nodes("parentConstraint", names, parents=drivens)
+
+    connections = []
+    values = []
+    for driver, driven, constraint, offsett, offsetr in zip(drivers, drivens, constraints,
+                                                            offsettranslations, offsetrotations):
+        target = "{}.target[0]".format(constraint)
+        for source, destination in [("translate", "targetTranslate"), ("rotate", "targetRotate"),
+                                    ("scale", "targetScale"), ("rotateOrder", "targetRotateOrder"),
+                                    ("parentMatrix[0]", "targetParentMatrix"),
+                                    ("rotatePivot", "targetRotatePivot"),
+                                    ("rotatePivotTranslate", "targetRotateTranslate")]:
+            connections.append(("{}.{}".format(driver, source), "{}.{}".format(target, destination)))
+        if cmds.objectType(driver, isAType="joint"):
+            connections.append(("{}.jointOrient".format(driver), "{}.targetJointOrient".format(target)))
+
+        for source, destination in [("parentInverseMatrix[0]", "constraintParentInverseMatrix"),
+                                    ("rotateOrder", "constraintRotateOrder"),
+                                    ("rotatePivot", "constraintRotatePivot"),
+                                    ("rotatePivotTranslate", "constraintRotateTranslate")]:
+            connections.append(("{}.{}".format(driven, source), "{}.{}".format(constraint, destination)))
+        if cmds.objectType(driven, isAType="joint"):
+            connections.append(("{}.jointOrient".format(driven), "{}.constraintJointOrient".format(constraint)))
+
+        for source, destination in [("constraintTranslate", "translate"), ("constraintRotate", "rotate")]:
+            connections.append(("{}.{}".format(constraint, source), "{}.{}".format(driven, destination)))
+
+        values.append(("{}.targetWeight".format(target), 1.0))
+        values.append(("{}.targetOffsetTranslate".format(target), offsett))
+        values.append(("{}.targetOffsetRotate".format(target), offsetr))
+
+    set_attrs(values)
+    connect_attrs(connections)
+
+    return constraints
+
+
+def create_follicles(surface, uvs,
+                     names, parent=""):
+    # Create a follicle per (u, v) pair on the NURBS surface, named from names, and parented under parent
+    # Returns the follicle transforms, which have their translate and rotate locked, the same as create_follicle
+    follicles = create_nodes("follicle", names, parents=[parent] * len(names))
+    surfaceshape = cmds.listRelatives(surface, shapes=True, noIntermediate=True)[0]
+
+    connections = []
+    values = []
+    for follicle, (upos, vpos) in zip(follicles, uvs):
+        shape = "{}Shape".format(follicle)
+        connections.append(("{}.local".format(surfaceshape), "{}.inputSurface".format(shape)))
+        connections.append(("{}.worldMatrix[0]".format(surfaceshape), "{}.inputWorldMatrix".format(shape)))
+        connections.append(("{}.outRotate".format(shape), "{}.rotate".format(follicle)))
+        connections.append(("{}.outTranslate".format(shape), "{}.translate".format(follicle)))
+        values.append(("{}.parameterU".format(shape), upos))
+        values.append(("{}.parameterV".format(shape), vpos))
+
+    set_attrs(values)
+    connect_attrs(connections)
+
+    lock_attrs(["{}.{}".format(follicle, attr) for follicle in follicles for attr in ["translate", "rotate"]],
+               hide=False)
+
+    return follicles
+
+
+def _sample(plugs, frames,
+            readvalue):
+    # Evaluate every plug at every frame in one sweep through the frames, using a DG context for each frame rather
+    # than changing the current time, so nothing else in the scene or UI updates
+    samples = []
+    guard = getattr(om, "MDGContextGuard", None)
+    for frame in frames:
+        context = om.MDGContext(om.MTime(frame, om.MTime.uiUnit()))
+        if guard is not None:
+            with guard(context):
+                samples.append([readvalue(plug, None) for plug in plugs])
+        else:
+            samples.append([readvalue(plug, context) for plug in plugs])
+    return samples
+
+
+def sample_matrix_plugs(paths, frames):
+    # Return an (F, N, 4, 4) array of each matrix plug's value at each frame
+    def readmatrix(plug, context):
+        data = plug.asMObject() if context is None else plug.asMObject(context)
+        return np.reshape(list(om.MFnMatrixData(data).matrix()), (4, 4))
+
+    plugs = [_plug(path) for path in paths]
+    return np.array(_sample(plugs, frames, readmatrix)).reshape(len(frames), len(paths), 4, 4)
+
+
+def sample_matrices(nodes, frames,
+                    attribute="worldMatrix[0]"):
+    # Return an (F, N, 4, 4) array of each node's matrix attribute at each frame
+    return sample_matrix_plugs(["{}.{}".format(node, attribute) for node in nodes], frames)
+
+
+def sample_world_matrices(nodes, frames):
+    # Return an (F, N, 4, 4) array of each DAG node's world matrix at each frame
+    return sample_matrices(nodes, frames)
+
+
+def sample_attrs(paths, frames):
+    # Return an (F, N) array of each numeric plug's value at each frame, with angles in degrees
+    def readvalue(plug, context):
+        attr = plug.attribute()
+        if attr.hasFn(om.MFn.kUnitAttribute) and \
+                om.MFnUnitAttribute(attr).unitType() == om.MFnUnitAttribute.kAngle:
+            angle = plug.asMAngle() if context is None else plug.asMAngle(context)
+            return angle.asDegrees()
+        return plug.asDouble() if context is None else plug.asDouble(context)
+
+    plugs = [_plug(path) for path in paths]
+    return np.array(_sample(plugs, frames, readvalue)).reshape(len(frames), len(paths))
+
+
+def key_attrs(keys, frames,
+              stepped=False):
+    # Key each (plug, values) pair at the given frames, with one addKeys call per animation curve rather than one
+    # setKeyframe per frame. Existing keys inside the frame range are replaced, and keys outside of it are kept
+    # Angle values are given in degrees, the same as maya.cmds. stepped keys are for enums and switches
+    from maya.api import OpenMayaAnim as oma
+
+    intangent = oma.MFnAnimCurve.kTangentClamped if stepped else oma.MFnAnimCurve.kTangentAuto
+    outtangent = oma.MFnAnimCurve.kTangentStep if stepped else oma.MFnAnimCurve.kTangentAuto
+
+    times = om.MTimeArray([om.MTime(frame, om.MTime.uiUnit()) for frame in frames])
+    for path, values in keys:
+        plug = _plug(path)
+        node, attr = path.split(".", 1)
+        cmds.cutKey(node, attribute=attr, time=(min(frames), max(frames)), clear=True)
+
+        curves = oma.MAnimUtil.findAnimation(plug)
+        curvefn = oma.MFnAnimCurve()
+        if len(curves):
+            curvefn.setObject(curves[0])
+        else:
+            curvefn.create(plug)
+
+        values = np.asarray(values, dtype=np.float64)
+        attribute = plug.attribute()
+        if attribute.hasFn(om.MFn.kUnitAttribute) and \
+                om.MFnUnitAttribute(attribute).unitType() == om.MFnUnitAttribute.kAngle:
+            values = np.radians(values)
+        curvefn.addKeys(times, om.MDoubleArray(values.tolist()), intangent, outtangent, True)
@@ -0,0 +1,163 @@
+"""
+This script houses a registry of rig components, which finds components from manifest files and installed packages'
+entry points without importing them, and only imports a component's module the first time a character spec uses it,
+so adding studio components (wings, tails, faces, props) doesn't slow down starting every build
+"""
+
+# Standard library imports
+import importlib
+import json
+import os
+import sys
+
+# Third party imports
+
+# Local application imports
+
+
+
+"""
+-- NOTES --
+Each component is registered under a name with a "module:attribute" target, the same format as entry points, like
+    "Studio_Wings:wing_setup" or "Build_Components:BuildComponents.arm_setup", and nothing is imported until it's used
+A component is called with the BuildComponents instance first, then the keyword arguments from it's spec entry, so
+    BuildComponents methods and plain functions taking the components as their first argument both work
+Components come from, with later sources replacing earlier ones
+    BUILTINS            the components in Build_Components.py
+    entry points        the ENTRY_POINT_GROUP entry points of installed studio component packages, as this repo is
+                        a flat folder of modules on sys.path, like Template_Run_Script.py uses, and registers none
+    manifests           json files of {"components": {name: target}}, with the manifest's folder added to sys.path
+A character spec is a list of entries, each {"component": name, ...keyword arguments}, and can be loaded from a json
+    file of {"char_name": name, "components": [entries]}
+"""
+
+
+ENTRY_POINT_GROUP = "autorigger.components"
+
+BUILTINS = {
+    "character": "Build_Components:BuildComponents.character_setup",
+    "spine": "Build_Components:BuildComponents.spine_setup",
+    "neck": "Build_Components:BuildComponents.neck_setup",
+    "arm": "Build_Components:BuildComponents.arm_setup",
+    "hand": "Build_Components:BuildComponents.hand_setup",
+    "digileg": "Build_Components:BuildComponents.digileg",
+    "multi_limb": "Build_Components:BuildComponents.multi_limb_setup",
+    "ribbon": "Build_Components:BuildComponents.ribbon_setup",
+    "limb_twist": "Build_Components:BuildComponents.limb_twist",
+    "long_fkchain": "Build_Components:BuildComponents.long_fkchain",
+    "long_curve_rig": "Build_Components:BuildComponents.long_curve_rig",
+}
+
+def _entry_points(group):
+    # The (name, target) pairs of every installed entry point in group, read from package metadata without importing
+    # anything. importlib.metadata is only in Python 3.8 and later, so older interpreters have no entry points
+    try:
+        from importlib import metadata
+    except ImportError:
+        return []
+    found = metadata.entry_points()
+    if hasattr(found, "select"):
+        found = found.select(group=group)
+    else:
+        found = found.get(group, [])
+    return [(entrypoint.name, entrypoint.value) for entrypoint in found]
+
+
+def reload_modules(*modules):
+    # Reload each module in place, for picking up edits between builds in the same Maya session
+    for module in modules:
+        if hasattr(importlib, "reload"):
+            importlib.reload(module)
+        else:
+            reload(module)
+
+
+class ComponentRegistry(object):
+    """
+    Component names mapped to their targets, with each target's module imported the first time it's resolved
+    """
+    def __init__(self, manifests=None, entrypoints=True):
+        self.targets = {}
+        self.sources = {}
+        # Resolved components, by name
+        self.resolved = {}
+
+        for name, target in BUILTINS.items():
+            self.add(name, target, source="builtin")
+        if entrypoints:
+            for name, target in _entry_points(ENTRY_POINT_GROUP):
+                self.add(name, target, source="entry point")
+        for manifest in manifests or []:
+            if os.path.exists(manifest):
+                self.load_manifest(manifest)
+
+    def __contains__(self, name):
+        return name in self.targets
+
+    def names(self):
+        return sorted(self.targets)
+
+    def add(self, name, target,
+            source=""):
+        # Register a component under name, replacing any with the same name, without importing it
+        if ":" not in target:
+            raise ValueError("Component target {} should be in module:attribute form".format(target))
+        self.targets[name] = target
+        self.sources[name] = source
+        self.resolved.pop(name, None)
+
+    def load_manifest(self, path):
+        # Register every component in a json manifest, with the manifest's folder added to sys.path so modules kept
+        # next to it can be imported
+        with open(path) as infile:
+            manifest = json.load(infile)
+        folder = os.path.dirname(os.path.abspath(path))
+        if folder not in sys.path:
+            sys.path.insert(0, folder)
+        for name, target in manifest.get("components", {}).items():
+            self.add(name, target, source=path)
+        return sorted(manifest.get("components", {}))
+
+    def resolve(self, name):
+        # The callable for a component, importing it's module the first time it's asked for
+        if name not in self.resolved:
+            if name not in self.targets:
+                raise ValueError("Component {} not recognised, registered components are {}".format(
+                    name, ", ".join(self.names())))
+            modulename, attribute = self.targets[name].split(":", 1)
+            target = importlib.import_module(modulename)
+            for part in attribute.split("."):
+                target = getattr(target, part)
+            self.resolved[name] = target
+        return self.resolved[name]
+
+    def loaded_modules(self):
+        # The modules that have been imported for resolved components
+        return sorted(set(self.targets[name].split(":", 1)[0] for name in self.resolved))
+
+    def reload(self):
+        # Reload the modules of every resolved component, and resolve them again the next time they're used
+        reload_modules(*[sys.modules[module] for module in self.loaded_modules() if module in sys.modules])
+        self.resolved = {}
+
+    def build_entry(self, components, entry):
+        # Build one character spec entry with the BuildComponents instance, returning what the component returns
+        kwargs = dict(entry)
+        return self.resolve(kwargs.pop("component"))(components, **kwargs)
+
+    def build(self, components, spec):
+        # Build every entry of a character spec in order, only importing the components it uses, and return each
+        # entry's result in the same order
+        return [self.build_entry(components, entry) for entry in spec]
+
+
+def load_spec(path):
+    # Read a character spec json file, returning the character name and it's list of component entries
+    with open(path) as infile:
+        spec = json.load(infile)
+    return spec.get("char_name", "Char"), spec["components"]
+
+
+def spec_components(spec):
+    # The component names a character spec uses, which are the only ones a build of it will import
+    return sorted(set(entry["component"] for entry in spec))
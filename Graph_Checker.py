@@ -0,0 +1,309 @@
+"""
+This script houses a static checker for rigs built with Build_Components.py, which reads the built node graph in a
+handful of bulk queries and reports the patterns that push Maya's parallel evaluation back to serial, or make cached
+playback invalidate more than it needs to, per component with the nodes involved
+"""
+
+# Standard library imports
+
+# Third party imports
+try:
+    from maya import cmds
+except ImportError:
+    # assign_components and find_cycles work on plain data, so Rig_Fingerprint can use them outside of Maya
+    cmds = None
+
+# Local application imports
+
+
+
+"""
+-- NOTES --
+The graph is every DAG node under {char_name}_CharacterRig, and every DG node connected to them, however far away
+Evaluation dependencies are followed per node rather than per attribute, with a few rules so common rig setups aren't
+    reported as cycles when Maya doesn't treat them as one
+    only a DAG node's world space outputs depend on it's parent, so constraints parented under the transform they
+        drive, and follicles driving their own transform, aren't cycles
+    parentMatrix and parentInverseMatrix outputs depend on the node's parent's world space, not the node itself
+    pivots, rotate orders, joint orients and message outputs don't depend on anything, so aren't dependencies
+Checks
+    cycle           a loop of dependencies, which the evaluation manager has to evaluate serially as one cluster
+    serial          node types the evaluation manager schedules serially, like expressions
+    visibility      a DAG node's visibility driven by another node, which dirties the DAG and invalidates cached
+                    playback every time it changes, rather than being keyed or set
+    pivot           a constrained transform with a moved pivot, usually from pivots being set with xform after the
+                    constraint was made, which leaves the constraint's offset wrong and adds pivot inputs to it
+    fanout          one plug driving more than fanout nodes, which makes every change to it invalidate all of them
+Each node belongs to the group it's under, below {char_name}_Rig, or it's side and part name for bind joints, and DG
+    nodes belong to the component of the nearest DAG node they drive, or are driven by
+"""
+
+
+# Node types that only organise the scene, and aren't evaluated as part of the rig
+IGNORED_TYPES = ["displayLayer", "displayLayerManager", "objectSet", "controller", "time", "dagPose",
+                 "nodeGraphEditorInfo", "shadingEngine", "renderLayer", "renderLayerManager"]
+
+# Node types the evaluation manager runs serially, and why
+SERIAL_TYPES = {
+    "expression": "expressions are untrusted, and evaluated globally serial",
+    "unknown": "unknown nodes, from a missing plugin, can't be scheduled in parallel",
+    "unknownDag": "unknown nodes, from a missing plugin, can't be scheduled in parallel",
+}
+
+# Outputs that come from the node's parent, and outputs that are constant while the rig is animated
+PARENT_ATTRS = ["parentMatrix", "parentInverseMatrix"]
+STATIC_ATTRS = ["message", "rotatePivot", "rotatePivotTranslate", "scalePivot", "scalePivotTranslate", "rotateOrder",
+                "jointOrient", "rotateAxis"]
+WORLD_ATTRS = ["worldMatrix", "worldInverseMatrix", "worldSpace", "worldMesh", "worldPosition"]
+
+VISIBILITY_ATTRS = ["visibility", "lodVisibility"]
+SIDES = ["Lf", "Rt", "Ct"]
+
+
+def _split(plug):
+    # A plug as (node, attr), and the attr's base name without indices or compound parents
+    node, attr = plug.split(".", 1)
+    return node, attr, attr.split("[")[0].split(".")[0]
+
+
+def _short(path):
+    return path.rsplit("|", 1)[-1]
+
+
+def _long_names(names):
+    # {name: long name} for each name, from a single ls call, which keeps the order of unique names it's given,
+    # falling back to one call per name if any of them didn't match exactly one node
+    unique = sorted(set(names))
+    longnames = cmds.ls(unique, long=True) or []
+    if len(longnames) != len(unique):
+        longnames = [cmds.ls(name, long=True)[0] for name in unique]
+    return dict(zip(unique, longnames))
+
+
+class RigGraph(object):
+    """
+    The nodes and connections of a built rig, read in bulk, with each node's type, parent, and component
+    """
+    def __init__(self, char_name="Char"):
+        self.char_name = char_name
+        root = "{}_CharacterRig".format(char_name)
+        dagnodes = cmds.ls([root] + (cmds.listRelatives(root, allDescendents=True, fullPath=True) or []), long=True)
+
+        # Connections as (source, source attr, destination, destination attr), with nodes as long names, found a
+        # layer of connected DG nodes at a time so DG networks of any depth are included
+        self.nodes = list(dagnodes)
+        known = set(dagnodes)
+        connections = set()
+        layer = dagnodes
+        while layer:
+            found = []
+            for incoming in [False, True]:
+                plugs = cmds.listConnections(layer, connections=True, plugs=True,
+                                             source=incoming, destination=not incoming) or []
+                longnames = _long_names([_split(plug)[0] for plug in plugs])
+                for mine, other in zip(plugs[0::2], plugs[1::2]):
+                    minenode, mineattr = _split(mine)[:2]
+                    othernode, otherattr = _split(other)[:2]
+                    minenode, othernode = longnames[minenode], longnames[othernode]
+                    if incoming:
+                        connections.add((othernode, otherattr, minenode, mineattr))
+                    else:
+                        connections.add((minenode, mineattr, othernode, otherattr))
+                    if othernode not in known:
+                        known.add(othernode)
+                        found.append(othernode)
+            self.nodes += found
+            layer = found
+
+        typelist = cmds.ls(self.nodes, showType=True, long=True) if self.nodes else []
+        self.types = dict(zip(typelist[0::2], typelist[1::2]))
+        self.shapes = set(cmds.ls(self.nodes, type="shape", long=True) or [])
+        self.transforms = set(cmds.ls(self.nodes, type="transform", long=True) or [])
+        ignored = set(node for node in self.nodes if self.types.get(node) in IGNORED_TYPES)
+        self.nodes = [node for node in self.nodes if node not in ignored]
+        self.connections = sorted(connection for connection in connections
+                                  if connection[0] not in ignored and connection[2] not in ignored)
+        self.components = assign_components(self.nodes, self.connections, char_name)
+
+    def parent(self, node):
+        # The long name of a DAG node's parent, or None for DG nodes and nodes at the root
+        parent = node.rsplit("|", 1)[0] if node.startswith("|") else ""
+        return parent or None
+
+    def dependencies(self):
+        # Evaluation dependencies as {node: set of nodes it depends on}, following the rules in the notes, where each
+        # DAG node's world space is a separate {node}@world entry depending on the node and it's parent's world space
+        depends = dict((node, set()) for node in self.nodes)
+        for node in self.nodes:
+            if node.startswith("|"):
+                parent = self.parent(node)
+                depends[node + "@world"] = set([node] + ([parent + "@world"] if parent in depends else []))
+
+        for source, sourceattr, destination, destinationattr in self.connections:
+            baseattr = sourceattr.split("[")[0].split(".")[0]
+            if baseattr in STATIC_ATTRS:
+                continue
+            if baseattr in PARENT_ATTRS:
+                source = "{}@world".format(self.parent(source))
+            elif baseattr in WORLD_ATTRS and source + "@world" in depends:
+                source = source + "@world"
+            if source in depends and destination in depends and source != destination:
+                depends[destination].add(source)
+        return depends
+
+
+def assign_components(nodes, connections,
+                      char_name="Char"):
+    # The component each node belongs to, as {long name: component}, from the nodes' long names and the
+    # (source, source attr, destination, destination attr) connections between them, see the notes
+    rigroot = "|{0}_CharacterRig|{0}_Rig|".format(char_name)
+    components = {}
+    for node in nodes:
+        if node.startswith(rigroot):
+            components[node] = node[len(rigroot):].split("|")[0]
+        elif node.startswith("|"):
+            name = _short(node).split("_")
+            components[node] = "_".join(name[:2]) if name[0] in SIDES and len(name) > 1 else name[0]
+
+    # Breadth first out from the DAG nodes, preferring the nodes each DG node drives over those driving it
+    drives, driven = {}, {}
+    for source, sourceattr, destination, destinationattr in connections:
+        drives.setdefault(source, []).append(destination)
+        driven.setdefault(destination, []).append(source)
+    remaining = [node for node in nodes if node not in components]
+    while remaining:
+        assigned = {}
+        for node in remaining:
+            for neighbour in drives.get(node, []) + driven.get(node, []):
+                if neighbour in components:
+                    assigned[node] = components[neighbour]
+                    break
+        if not assigned:
+            for node in remaining:
+                components[node] = "Unassigned"
+            break
+        components.update(assigned)
+        remaining = [node for node in remaining if node not in components]
+    return components
+
+
+def find_cycles(depends):
+    # Every strongly connected group of more than one node in a {node: dependencies} graph, using an iterative
+    # Tarjan's algorithm so deep rigs don't hit the recursion limit
+    index = {}
+    lowlink = {}
+    stack = []
+    onstack = set()
+    cycles = []
+    counter = 0
+    for start in depends:
+        if start in index:
+            continue
+        work = [(start, iter(depends[start]))]
+        index[start] = lowlink[start] = counter
+        counter += 1
+        stack.append(start)
+        onstack.add(start)
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if child not in index:
+                    index[child] = lowlink[child] = counter
+                    counter += 1
+                    stack.append(child)
+                    onstack.add(child)
+                    work.append((child, iter(depends.get(child, ()))))
+                    break
+                elif child in onstack:
+                    lowlink[node] = min(lowlink[node], index[child])
+            else:
+                work.pop()
+                if work:
+                    lowlink[work[-1][0]] = min(lowlink[work[-1][0]], lowlink[node])
+                if lowlink[node] == index[node]:
+                    group = []
+                    while True:
+                        member = stack.pop()
+                        onstack.discard(member)
+                        group.append(member)
+                        if member == node:
+                            break
+                    if len(group) > 1:
+                        cycles.append(sorted(set(member.replace("@world", "") for member in group)))
+    return cycles
+
+
+def check_graph(char_name="Char", fanout=32,
+                graph=None):
+    # Run every check over the built rig, returning a list of issue dicts, each with the component, check, the long
+    # names of the nodes involved, and a description
+    graph = graph or RigGraph(char_name)
+    issues = []
+
+    def issue(check, nodes, detail):
+        # The issue belongs to the first node's component
+        component = graph.components.get(nodes[0], "Unassigned")
+        nodes = sorted(set(nodes))
+        issues.append({"component": component, "check": check, "nodes": nodes, "detail": detail})
+
+    for cycle in find_cycles(graph.dependencies()):
+        issue("cycle", cycle, "{} nodes depend on each other".format(len(set(cycle))))
+
+    for node in graph.nodes:
+        if graph.types.get(node) in SERIAL_TYPES:
+            issue("serial", [node], SERIAL_TYPES[graph.types[node]])
+
+    constrained = {}
+    fanouts = {}
+    for source, sourceattr, destination, destinationattr in graph.connections:
+        baseattr = destinationattr.split("[")[0].split(".")[0]
+        if destination.startswith("|") and baseattr in VISIBILITY_ATTRS and \
+                not graph.types.get(source, "").startswith("animCurve"):
+            issue("visibility", [destination, source], "{} driven by {} ({})".format(
+                destinationattr, _short(source), graph.types.get(source)))
+        if graph.types.get(source, "").endswith("Constraint") and baseattr in ["translate", "rotate"] and \
+                destination in graph.transforms:
+            constrained.setdefault(destination, source)
+        if not sourceattr.startswith("message"):
+            fanouts.setdefault((source, sourceattr), set()).add(destination)
+
+    pivotplugs = ["{}.{}".format(node, attr) for node in sorted(constrained)
+                  for attr in ["rotatePivot", "rotatePivotTranslate"]]
+    for plug in pivotplugs:
+        value = cmds.getAttr(plug)
+        value = value[0] if value and isinstance(value[0], (list, tuple)) else value
+        if any(abs(axis) > 1e-6 for axis in value):
+            node = plug.rsplit(".", 1)[0]
+            issue("pivot", [node, constrained[node]], "{} is {} on a transform driven by {}".format(
+                plug.rsplit(".", 1)[1], tuple(round(axis, 4) for axis in value), _short(constrained[node])))
+
+    for (source, sourceattr), destinations in sorted(fanouts.items()):
+        if len(destinations) > fanout:
+            issues.append({"component": graph.components.get(source, "Unassigned"), "check": "fanout",
+                           "nodes": [source] + sorted(destinations),
+                           "detail": "{}.{} drives {} nodes".format(_short(source), sourceattr, len(destinations))})
+
+    issues.sort(key=lambda item: (item["component"], item["check"], item["nodes"]))
+    return issues
+
+
+def report(issues, nodecount=5):
+    # Print the issues grouped by component, with up to nodecount of each issue's nodes
+    components = {}
+    for item in issues:
+        components.setdefault(item["component"], []).append(item)
+
+    for component in sorted(components):
+        counts = {}
+        for item in components[component]:
+            counts[item["check"]] = counts.get(item["check"], 0) + 1
+        print("{} - {}".format(component, ", ".join("{} {}".format(count, check)
+                                                    for check, count in sorted(counts.items()))))
+        for item in components[component]:
+            nodes = item["nodes"][:nodecount] + (["..."] if len(item["nodes"]) > nodecount else [])
+            print("    {:<10} {}".format(item["check"], item["detail"]))
+            for node in nodes:
+                print("        {}".format(node))
+
+    print("{} issues in {} components".format(len(issues), len(components)))
+    return issues
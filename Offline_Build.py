@@ -0,0 +1,1646 @@
+"""
+This script houses an offline backend for building rigs without Maya, which runs Build_Components against an in memory
+scene graph standing in for maya.cmds, and streams the result out as a Maya ASCII file to be referenced into shots
+"""
+
+# Standard library imports
+import argparse
+import copy
+import fnmatch
+import importlib
+import json
+import os
+import runpy
+import sys
+import time
+import types
+
+# Third party imports
+import numpy as np
+
+# Local application imports
+import Rig_Math as rm
+
+
+
+"""
+-- NOTES --
+install() puts an OfflineCmds in place of maya.cmds, and leaves out maya.api, so Bulk_Ops and Build_Components fall
+    back to their maya.cmds code paths. Anything importing maya.cmds has to be imported after install() is called
+Skeleton files are json, written from inside of Maya by export_skeleton, holding every transform and joint under the
+    given roots, parents first, along with their transform attributes
+Placements are evaluated during the build from each node's translate, rotate, scale, pivots, joint orient,
+    offsetParentMatrix and parent, along with follicles on NURBS surfaces. Constraints and IK handles aren't evaluated,
+    so the nodes they drive keep their values from when they were constrained, which is already the bind pose,
+    and Maya evaluates them again when the file is opened
+Constraint offsets, IK pole vectors, control curves, ribbon surfaces and skin weights are all computed while building
+    and baked into the file, with a few differences from Maya
+    Ribbon surfaces are rebuilt by placing cubic CVs on the lofted surface at their Greville points, which is the
+        same surface rebuildSurface gives for the flat two point ribbons it's used on
+    Skin weights go to the closest influences by inverse distance to the power of dropoffRate, rather than Maya's
+        bind algorithm
+Only xyz rotate orders are supported when placing nodes in world space
+"""
+
+MAYA_VERSION = "2022"
+
+# Node types with the types they inherit from, for telling DAG and shape nodes apart. Types not listed are DG nodes
+NODE_TYPES = {
+    "transform": ["dagNode", "transform"],
+    "joint": ["dagNode", "transform", "joint"],
+    "ikHandle": ["dagNode", "transform", "ikHandle"],
+    "ikEffector": ["dagNode", "transform", "ikEffector"],
+    "parentConstraint": ["dagNode", "transform", "constraint", "parentConstraint"],
+    "pointConstraint": ["dagNode", "transform", "constraint", "pointConstraint"],
+    "orientConstraint": ["dagNode", "transform", "constraint", "orientConstraint"],
+    "poleVectorConstraint": ["dagNode", "transform", "constraint", "pointConstraint", "poleVectorConstraint"],
+    "locator": ["dagNode", "shape", "locator"],
+    "follicle": ["dagNode", "shape", "follicle"],
+    "nurbsCurve": ["dagNode", "shape", "geometryShape", "deformableShape", "controlPoint", "curveShape", "nurbsCurve"],
+    "nurbsSurface": ["dagNode", "shape", "geometryShape", "deformableShape", "controlPoint", "surfaceShape",
+                     "nurbsSurface"],
+}
+
+# Compound attributes with x, y and z children, which are stored per child
+COMPOUNDS = {name: tuple(name + axis for axis in "XYZ") for name in [
+    "translate", "rotate", "scale", "jointOrient", "rotateAxis", "rotatePivot", "scalePivot", "rotatePivotTranslate",
+    "scalePivotTranslate", "preferredAngle", "poleVector", "offset", "targetOffsetTranslate", "targetOffsetRotate",
+    "inputTranslate", "inputRotate", "inputScale", "constraintTranslate", "constraintRotate", "outTranslate",
+    "outRotate"]}
+CHILDREN = {child: (name, index) for name, children in COMPOUNDS.items() for index, child in enumerate(children)}
+
+SHORT_NAMES = {
+    "t": "translate", "r": "rotate", "s": "scale", "jo": "jointOrient", "ra": "rotateAxis", "rp": "rotatePivot",
+    "sp": "scalePivot", "rpt": "rotatePivotTranslate", "spt": "scalePivotTranslate", "pa": "preferredAngle",
+    "v": "visibility", "ro": "rotateOrder", "opm": "offsetParentMatrix", "m": "matrix", "wm": "worldMatrix",
+    "pm": "parentMatrix", "pim": "parentInverseMatrix", "wim": "worldInverseMatrix", "im": "inverseMatrix",
+    "io": "intermediateObject", "ove": "overrideEnabled", "ovc": "overrideColor", "radi": "radius", "msg": "message",
+    "pv": "poleVector",
+}
+SHORT_NAMES.update({short + axis.lower(): SHORT_NAMES[short] + axis
+                    for short in ["t", "r", "s", "jo", "ra", "rp", "sp", "pa", "pv"] for axis in "XYZ"})
+
+IDENTITY = tuple(np.identity(4).ravel())
+DEFAULTS = {"scaleX": 1.0, "scaleY": 1.0, "scaleZ": 1.0, "visibility": True, "radius": 1.0, "rotateOrder": 0,
+            "offsetParentMatrix": IDENTITY, "overrideEnabled": False, "intermediateObject": False}
+# Channels that are keyable on a new transform
+KEYABLE = set(COMPOUNDS["translate"] + COMPOUNDS["rotate"] + COMPOUNDS["scale"] + ("visibility",))
+
+# Attributes that only exist on shapes, which can be used on their transforms instead
+SHAPE_ATTRS = {"local", "worldSpace", "create", "cv", "spans", "degree", "parameterU", "parameterV", "inputSurface",
+               "inputWorldMatrix", "outTranslate", "outRotate"}
+
+MATRIX_ATTRS = ["matrix", "inverseMatrix", "worldMatrix", "worldInverseMatrix", "parentMatrix", "parentInverseMatrix"]
+ROTATE_ORDERS = ["xyz", "yzx", "zxy", "xzy", "yxz", "zyx"]
+
+# Maya's default circle, a periodic cubic curve with 8 CVs all this far from the centre
+CIRCLE_RADIUS = 1.1081941875543879
+
+# Short flag names, per command where they mean something different between commands
+FLAGS = {"n": "name", "q": "query", "e": "edit", "ws": "worldSpace", "os": "objectSpace", "mo": "maintainOffset",
+         "ss": "skipSelect", "w": "world", "em": "empty"}
+COMMAND_FLAGS = {
+    "xform": {"t": "translation", "ro": "rotation", "s": "scale", "r": "relative", "m": "matrix", "piv": "pivots",
+              "rp": "rotatePivot"},
+    "listRelatives": {"p": "parent", "c": "children", "s": "shapes", "ad": "allDescendents", "f": "fullPath",
+                      "ni": "noIntermediate"},
+    "group": {"p": "parent"},
+    "createNode": {"p": "parent"},
+    "parent": {"r": "relative", "add": "addObject", "s": "shape"},
+    "duplicate": {"po": "parentOnly", "rc": "renameChildren"},
+    "ikHandle": {"sj": "startJoint", "ee": "endEffector", "sol": "solver"},
+    "addAttr": {"sn": "shortName", "ln": "longName", "at": "attributeType", "dv": "defaultValue", "en": "enumName",
+                "h": "hidden", "k": "keyable", "ex": "exists", "dt": "dataType"},
+    "joint": {"o": "orientation", "oj": "orientJoint", "sao": "secondaryAxisOrient", "spa": "setPreferredAngles",
+              "ch": "children", "zso": "zeroScaleOrient", "p": "position", "rad": "radius"},
+    "setAttr": {"l": "lock", "k": "keyable", "cb": "channelBox", "typ": "type"},
+    "getAttr": {"l": "lock", "k": "keyable", "cb": "channelBox"},
+    "curve": {"d": "degree", "p": "point", "k": "knot"},
+    "circle": {"nr": "normal", "r": "radius", "ch": "constructionHistory"},
+    "listConnections": {"s": "source", "d": "destination", "p": "plugs", "c": "connections", "t": "type",
+                        "scn": "skipConversionNodes"},
+    "ls": {"sl": "selection", "l": "long"},
+    "select": {"cl": "clear", "d": "deselect", "r": "replace", "ne": "noExpand", "add": "add"},
+    "skinCluster": {"tsb": "toSelectedBones", "mi": "maximumInfluences", "dr": "dropoffRate"},
+    "rebuildSurface": {"rpo": "replaceOriginal", "su": "spansU", "sv": "spansV", "du": "degreeU", "dv": "degreeV"},
+    "makeIdentity": {"a": "apply"},
+    "scale": {"p": "pivot"},
+    "connectAttr": {"f": "force"},
+    "connectionInfo": {"sfd": "sourceFromDestination"},
+    "attributeQuery": {"lc": "listChildren", "ex": "exists"},
+}
+
+
+def _flags(command, kwargs):
+    # Turn the flags a command was called with into their long names
+    aliases = COMMAND_FLAGS.get(command, {})
+    return {aliases.get(key, FLAGS.get(key, key)): value for key, value in kwargs.items()}
+
+
+def _flatten(items):
+    # Flatten nested lists and tuples of node names into a single list
+    names = []
+    for item in items:
+        if isinstance(item, (list, tuple)):
+            names += _flatten(item)
+        elif item is not None:
+            names.append(item)
+    return names
+
+
+def _normalize_attr(attr, node=None):
+    # The long name form of a "attr[index].child" path, using the node's added attributes for their short names
+    tokens = []
+    for token in attr.split("."):
+        name, bracket, index = token.partition("[")
+        if node is not None and name in node.shortnames:
+            name = node.shortnames[name]
+        name = SHORT_NAMES.get(name, name)
+        tokens.append(name + bracket + index)
+    return ".".join(tokens)
+
+
+def _axis_rotation(axis, degrees):
+    cos, sin = np.cos(np.radians(degrees)), np.sin(np.radians(degrees))
+    if axis == "x":
+        return np.array([[1, 0, 0], [0, cos, sin], [0, -sin, cos]])
+    if axis == "y":
+        return np.array([[cos, 0, -sin], [0, 1, 0], [sin, 0, cos]])
+    return np.array([[cos, sin, 0], [-sin, cos, 0], [0, 0, 1]])
+
+
+def _rotation(rotate, order=0):
+    # 3x3 rotation matrix for an euler rotation in degrees, in one of Maya's rotate orders
+    matrix = np.identity(3)
+    for axis in ROTATE_ORDERS[int(order)]:
+        matrix = np.matmul(matrix, _axis_rotation(axis, rotate["xyz".index(axis)]))
+    return matrix
+
+
+def _matrix(rotation=None, translation=None):
+    matrix = np.identity(4)
+    if rotation is not None:
+        matrix[:3, :3] = rotation
+    if translation is not None:
+        matrix[3, :3] = translation
+    return matrix
+
+
+def _split_scale(matrix):
+    # Split a 3x3 matrix into scale and rotation, keeping negative scale on X so the rotation stays right handed
+    scale = np.linalg.norm(matrix, axis=1)
+    rotation = matrix / np.where(scale > 1e-12, scale, 1.0)[:, np.newaxis]
+    if np.linalg.det(rotation) < 0:
+        scale[0] = -scale[0]
+        rotation[0] = -rotation[0]
+    return scale, rotation
+
+
+def _full_knots(knots):
+    # Maya leaves out the first and last knot, which B-spline evaluation needs
+    return np.concatenate([[knots[0]], knots, [knots[-1]]])
+
+
+def _basis(knots, degree,
+           count, parameter):
+    # B-spline basis function values for each of count CVs at parameter, from Maya style knots
+    full = _full_knots(np.asarray(knots, dtype=np.float64))
+    parameter = min(max(parameter, full[degree]), full[count])
+    basis = np.array([1.0 if full[i] <= parameter < full[i + 1] else 0.0 for i in range(len(full) - 1)])
+    if parameter >= full[count]:
+        # The end of the range belongs to the last span with any length
+        basis[:] = 0.0
+        basis[max(i for i in range(len(full) - 1) if full[i] < full[i + 1])] = 1.0
+    for power in range(1, degree + 1):
+        newbasis = np.zeros(len(full) - power - 1)
+        for i in range(len(newbasis)):
+            left = full[i + power] - full[i]
+            right = full[i + power + 1] - full[i + 1]
+            if left > 0:
+                newbasis[i] += (parameter - full[i]) / left * basis[i]
+            if right > 0:
+                newbasis[i] += (full[i + power + 1] - parameter) / right * basis[i + 1]
+        basis = newbasis
+    return basis[:count]
+
+
+def _knot_range(knots, degree):
+    return knots[degree - 1], knots[len(knots) - degree]
+
+
+def _uniform_knots(spans, degree,
+                   start=0.0, end=None):
+    # Maya style knots for an open curve, with each span the same length
+    end = float(spans) if end is None else end
+    inner = list(np.linspace(start, end, spans + 1))
+    return [start] * (degree - 1) + inner + [end] * (degree - 1)
+
+
+def surface_point(surface, u,
+                  v):
+    # Position on a surface at the actual (not normalized) u and v parameters
+    cvs = surface["cvs"]
+    basisu = _basis(surface["knotsU"], surface["degreeU"], cvs.shape[0], u)
+    basisv = _basis(surface["knotsV"], surface["degreeV"], cvs.shape[1], v)
+    return np.einsum("i,j,ijk->k", basisu, basisv, cvs)
+
+
+
+class OfflineNode(object):
+    """
+    One node in an OfflineScene, with the attribute values that have been set on it, it's added attributes and locks
+    """
+    def __init__(self, name, nodetype):
+        self.name = name
+        self.type = nodetype
+        self.parent = None
+        self.children = []
+        # Transforms other than parent that a shape has been instanced under
+        self.instances = []
+        self.values = {}
+        # Added attributes by long name, in the order they were added, along with long names by short name
+        self.added = {}
+        self.shortnames = {}
+        self.locked = set()
+        self.keyable = {}
+        self.channelbox = {}
+        # Geometry for nurbsCurve and nurbsSurface shapes
+        self.data = None
+
+    def __repr__(self):
+        return "OfflineNode({}, {})".format(self.path(), self.type)
+
+    @property
+    def inherited(self):
+        return NODE_TYPES.get(self.type, [self.type])
+
+    @property
+    def dag(self):
+        return "dagNode" in self.inherited
+
+    @property
+    def shape(self):
+        return "shape" in self.inherited
+
+    def path(self):
+        # The full DAG path, which for DG nodes is just their name, the same as Maya
+        if not self.dag:
+            return self.name
+        names = []
+        node = self
+        while node is not None:
+            names.append(node.name)
+            node = node.parent
+        return "|" + "|".join(reversed(names))
+
+    def descendants(self):
+        # Every node below this one, depth first with parents before their children
+        nodes = []
+        for child in self.children:
+            if child.parent is self:
+                nodes.append(child)
+                nodes += child.descendants()
+        return nodes
+
+
+class OfflineScene(object):
+    """
+    An in memory scene graph of nodes, attribute values and connections, which evaluates transforms the same as Maya
+    """
+    def __init__(self):
+        self.nodes = []
+        self.names = {}
+        # Every connection as [source node, source attr, destination node, destination attr], in the order made
+        self.connections = []
+        self.inputs = {}
+        self.selection = []
+        self.displaylayers = 0
+        # Plugins loaded by the build, which the .ma file requires
+        self.plugins = []
+
+    # -- Nodes --
+
+    def find(self, name):
+        # The node for a name, which can be a short name, a full path, or the end of a path
+        if isinstance(name, OfflineNode):
+            return name
+        name = name.split(".", 1)[0]
+        short = name.rsplit("|", 1)[-1]
+        matches = [node for node in self.names.get(short, []) if "|" not in name or
+                   node.path().endswith(name if name.startswith("|") or node.path() == name else "|" + name)]
+        if name.startswith("|"):
+            matches = [node for node in matches if node.path() == name]
+        if not matches:
+            raise ValueError("No object matches name: {}".format(name))
+        if len(matches) > 1:
+            raise ValueError("More than one object matches name: {}".format(name))
+        return matches[0]
+
+    def exists(self, name):
+        try:
+            self.find(name)
+        except ValueError:
+            return False
+        return True
+
+    def ref(self, node, fullpath=False):
+        # The shortest name that finds node, which is it's own name unless another node shares it
+        if fullpath:
+            return node.path()
+        if len(self.names.get(node.name, [])) == 1:
+            return node.name
+        return node.path()
+
+    def unique_name(self, name):
+        # Make name unique the same way Maya does, replacing a trailing # or counting up the trailing number
+        base = name.rstrip("#").rstrip("0123456789") if name.endswith("#") or name in self.names else name
+        if not name.endswith("#") and name not in self.names:
+            return name
+        number = 1
+        while "{}{}".format(base, number) in self.names:
+            number = number + 1
+        return "{}{}".format(base, number)
+
+    def _rename(self, node, name):
+        self.names[node.name].remove(node)
+        if not self.names[node.name]:
+            del self.names[node.name]
+        node.name = name
+        self.names.setdefault(name, []).append(node)
+
+    def create(self, nodetype, name,
+               parent=None, unique=True):
+        # Add a new node, without creating a transform for shapes
+        node = OfflineNode(self.unique_name(name) if unique else name, nodetype)
+        self.nodes.append(node)
+        self.names.setdefault(node.name, []).append(node)
+        if parent is not None:
+            node.parent = parent
+            parent.children.append(node)
+        return node
+
+    def reparent(self, node, parent):
+        if node.parent is not None:
+            node.parent.children.remove(node)
+        node.parent = parent
+        if parent is not None:
+            parent.children.append(node)
+
+    def delete(self, node):
+        # Delete node along with everything below it, and all of their connections
+        doomed = [node] + node.descendants()
+        doomedids = set(id(each) for each in doomed)
+        for each in doomed:
+            if each in self.nodes:
+                self.nodes.remove(each)
+                self.names[each.name].remove(each)
+                if not self.names[each.name]:
+                    del self.names[each.name]
+            for transform in each.instances:
+                transform.children.remove(each)
+            if each in self.selection:
+                self.selection.remove(each)
+        if node.parent is not None:
+            node.parent.children.remove(node)
+        for other in self.nodes:
+            other.children = [child for child in other.children if id(child) not in doomedids]
+        self.connections = [connection for connection in self.connections
+                            if id(connection[0]) not in doomedids and id(connection[2]) not in doomedids]
+        self.inputs = {(connection[2], connection[3]): connection for connection in self.connections}
+
+    # -- Attributes --
+
+    def plug(self, path):
+        # Split a "node.attr" path into the node and the long name of the attribute, passing shape attributes on a
+        # transform through to it's shape the same as Maya does
+        name, attr = path.split(".", 1)
+        node = self.find(name)
+        attr = _normalize_attr(attr, node)
+        if node.dag and not node.shape and attr.split("[")[0].split(".")[0] in SHAPE_ATTRS:
+            shapes = [child for child in node.children if child.shape and not self.read(child, "intermediateObject")]
+            if shapes:
+                return shapes[0], attr
+        return node, attr
+
+    def source(self, node, attr):
+        connection = self.inputs.get((node, attr))
+        return (connection[0], connection[1]) if connection else None
+
+    def connect(self, source, sourceattr,
+                destination, destinationattr,
+                force=False):
+        if (destination, destinationattr) in self.inputs:
+            if not force:
+                raise RuntimeError("{}.{} is already connected".format(destination.name, destinationattr))
+            self.disconnect(destination, destinationattr)
+        if self.is_locked(destination, destinationattr):
+            raise RuntimeError("The destination attribute '{}.{}' is locked".format(destination.name,
+                                                                                    destinationattr))
+        connection = [source, sourceattr, destination, destinationattr]
+        self.connections.append(connection)
+        self.inputs[(destination, destinationattr)] = connection
+
+    def disconnect(self, destination, destinationattr):
+        connection = self.inputs.pop((destination, destinationattr), None)
+        if connection is not None:
+            self.connections.remove(connection)
+
+    def is_locked(self, node, attr):
+        parent = CHILDREN.get(attr, (None,))[0]
+        return attr in node.locked or parent in node.locked
+
+    def _stored(self, node, attr):
+        # The value attr was last set to, looking in it's compound parent for children, or None if it's never been set
+        if attr in node.values:
+            return node.values[attr]
+        for parent in [attr[:-1], attr.rsplit(".", 1)[0]] if attr[-1:] in "XYZxyzRGB" else []:
+            if isinstance(node.values.get(parent), tuple) and len(node.values[parent]) == 3:
+                return node.values[parent]["XYZxyzRGB".index(attr[-1]) % 3]
+        return None
+
+    def read(self, node, attr):
+        # The current value of node.attr, evaluating matrices and follicles, otherwise the value it was last set to
+        attr = attr.replace("[0]", "") if attr.split("[")[0] in MATRIX_ATTRS else attr
+        if attr in MATRIX_ATTRS:
+            return self.matrix_attr(node, attr)
+        if attr in COMPOUNDS:
+            evaluated = self._evaluate(node, attr)
+            if evaluated is not None:
+                return tuple(evaluated)
+            return tuple(self.read(node, child) for child in COMPOUNDS[attr])
+        if attr in CHILDREN:
+            evaluated = self._evaluate(node, CHILDREN[attr][0])
+            if evaluated is not None:
+                return evaluated[CHILDREN[attr][1]]
+        stored = self._stored(node, attr)
+        if stored is not None:
+            return stored
+        if attr in node.added:
+            return node.added[attr].get("defaultValue", 0.0)
+        return DEFAULTS.get(attr, 0.0)
+
+    def write(self, node, attr,
+              value, force=False):
+        if not force and self.is_locked(node, attr):
+            raise RuntimeError("The attribute '{}.{}' is locked or connected and cannot be modified".format(
+                node.name, attr))
+        if attr in COMPOUNDS and np.ndim(value) == 1:
+            for child, childvalue in zip(COMPOUNDS[attr], value):
+                node.values[child] = float(childvalue)
+            return
+        if attr[-1:] in "XYZxyzRGB" and attr not in CHILDREN:
+            # Update a child of a compound that was set as a whole
+            for parent in [attr[:-1], attr.rsplit(".", 1)[0]]:
+                if isinstance(node.values.get(parent), tuple) and len(node.values[parent]) == 3:
+                    values = list(node.values[parent])
+                    values["XYZxyzRGB".index(attr[-1]) % 3] = value
+                    node.values[parent] = tuple(values)
+                    return
+        node.values[attr] = tuple(float(v) for v in value) if np.ndim(value) == 1 else value
+
+    def _evaluate(self, node, attr):
+        # Evaluate the compound attr if it's driven by something this scene can evaluate, which is only follicles
+        source = self.source(node, attr)
+        if source is not None and source[0].type == "follicle" and source[1] in ["outTranslate", "outRotate"]:
+            translation, rotation = self.follicle(source[0])
+            return translation if source[1] == "outTranslate" else rotation
+        return None
+
+    # -- Transforms --
+
+    def vector(self, node, attr):
+        return np.array(self.read(node, attr), dtype=np.float64)
+
+    def local_matrix(self, node, translate=None):
+        # Maya's transform matrix, -scalePivot * scale * scalePivot * scalePivotTranslate * -rotatePivot * rotateAxis *
+        # rotate * rotatePivot * rotatePivotTranslate * translate, or scale * rotate * jointOrient * translate for joints
+        if not node.dag or node.shape:
+            return np.identity(4)
+        scale = np.diag(np.append(self.vector(node, "scale"), 1.0))
+        rotate = _matrix(_rotation(self.vector(node, "rotate"), self.read(node, "rotateOrder")))
+        rotateaxis = _matrix(_rotation(self.vector(node, "rotateAxis")))
+        translate = _matrix(translation=self.vector(node, "translate") if translate is None else translate)
+        if node.type == "joint":
+            jointorient = _matrix(_rotation(self.vector(node, "jointOrient")))
+            return np.linalg.multi_dot([scale, rotateaxis, rotate, jointorient, translate])
+        scalepivot = self.vector(node, "scalePivot")
+        rotatepivot = self.vector(node, "rotatePivot")
+        return np.linalg.multi_dot([_matrix(translation=-scalepivot), scale, _matrix(translation=scalepivot),
+                                    _matrix(translation=self.vector(node, "scalePivotTranslate")),
+                                    _matrix(translation=-rotatepivot), rotateaxis, rotate,
+                                    _matrix(translation=rotatepivot),
+                                    _matrix(translation=self.vector(node, "rotatePivotTranslate")), translate])
+
+    def parent_space(self, node):
+        # The matrix a node's local matrix sits in, it's offsetParentMatrix times it's parent's world matrix
+        offset = np.reshape(self.read(node, "offsetParentMatrix"), (4, 4)) if node.dag and not node.shape \
+            else np.identity(4)
+        return np.matmul(offset, self.world_matrix(node.parent) if node.parent is not None else np.identity(4))
+
+    def world_matrix(self, node):
+        if not node.dag:
+            return np.identity(4)
+        if node.shape:
+            return self.world_matrix(node.parent) if node.parent is not None else np.identity(4)
+        return np.matmul(self.local_matrix(node), self.parent_space(node))
+
+    def matrix_attr(self, node, attr):
+        if attr == "matrix":
+            matrix = self.local_matrix(node)
+        elif attr == "inverseMatrix":
+            matrix = np.linalg.inv(self.local_matrix(node))
+        elif attr == "worldMatrix":
+            matrix = self.world_matrix(node)
+        elif attr == "worldInverseMatrix":
+            matrix = np.linalg.inv(self.world_matrix(node))
+        elif attr == "parentMatrix":
+            matrix = self.world_matrix(node.parent) if node.parent is not None else np.identity(4)
+        else:
+            matrix = np.linalg.inv(self.world_matrix(node.parent)) if node.parent is not None else np.identity(4)
+        return tuple(matrix.ravel())
+
+    def set_local_matrix(self, node, matrix,
+                         force=False):
+        # Set a transform's attributes so it's local matrix matches matrix, keeping it's pivots, and for joints keeping
+        # their rotate and putting the rotation into the joint orient instead, the same as Maya does when reparenting
+        # force sets locked attributes too, which reparenting does in Maya
+        scale, rotation = _split_scale(matrix[:3, :3])
+        self.write(node, "scale", scale, force=force)
+        if node.type == "joint":
+            rotate = np.matmul(_rotation(self.vector(node, "rotateAxis")),
+                               _rotation(self.vector(node, "rotate"), self.read(node, "rotateOrder")))
+            self.write(node, "jointOrient", rm.euler_from_matrices(np.matmul(rotate.T, rotation)), force=force)
+        else:
+            rotateaxis = _rotation(self.vector(node, "rotateAxis"))
+            self.write(node, "rotate", rm.euler_from_matrices(np.matmul(rotateaxis.T, rotation)), force=force)
+        offset = self.local_matrix(node, translate=(0, 0, 0))[3, :3]
+        self.write(node, "translate", matrix[3, :3] - offset, force=force)
+
+    def set_world_matrix(self, node, matrix,
+                         force=False):
+        self.set_local_matrix(node, np.matmul(matrix, np.linalg.inv(self.parent_space(node))), force=force)
+
+    def set_world_position(self, node, position):
+        local = np.matmul(np.append(position, 1.0), np.linalg.inv(self.parent_space(node)))[:3]
+        self.write(node, "translate", local - self.local_matrix(node, translate=(0, 0, 0))[3, :3])
+
+    def set_world_rotation(self, node, rotation):
+        # Set the rotate of a transform or joint so it's world rotation matches the 3x3 rotation, keeping it's position
+        position = self.world_matrix(node)[3, :3]
+        _, parentrotation = _split_scale(self.parent_space(node)[:3, :3])
+        local = np.matmul(rotation, parentrotation.T)
+        if node.type == "joint":
+            local = np.matmul(local, _rotation(self.vector(node, "jointOrient")).T)
+        self.write(node, "rotate", rm.euler_from_matrices(np.matmul(_rotation(self.vector(node, "rotateAxis")).T,
+                                                                    local)))
+        self.set_world_position(node, position)
+
+    # -- Geometry --
+
+    def world_cvs(self, shape):
+        # A curve or surface shape's CVs in world space
+        world = self.world_matrix(shape)
+        cvs = np.asarray(shape.data["cvs"])
+        homogeneous = np.concatenate([cvs, np.ones(cvs.shape[:-1] + (1,))], axis=-1)
+        return np.matmul(homogeneous, world)[..., :3]
+
+    def follicle(self, follicle):
+        # The world translate and rotate of a follicle from it's surface and parameters, with the X axis along the
+        # surface's U direction, Y along it's normal, and Z across them both
+        source = self.source(follicle, "inputSurface")
+        if source is None or source[0].data is None:
+            return np.zeros(3), np.zeros(3)
+        surface = source[0].data
+        worldsource = self.source(follicle, "inputWorldMatrix")
+        world = self.world_matrix(worldsource[0]) if worldsource else np.identity(4)
+
+        ranges = [_knot_range(surface["knotsU"], surface["degreeU"]), _knot_range(surface["knotsV"],
+                                                                                  surface["degreeV"])]
+        u, v = [low + (high - low) * float(self.read(follicle, "parameter" + axis))
+                for (low, high), axis in zip(ranges, "UV")]
+        stepu, stepv = [(high - low) * 1e-4 for low, high in ranges]
+        point = surface_point(surface, u, v)
+
+        # Central differences, moved inside of the surface at it's edges
+        du = surface_point(surface, min(u + stepu, ranges[0][1]), v) - \
+            surface_point(surface, max(u - stepu, ranges[0][0]), v)
+        dv = surface_point(surface, u, min(v + stepv, ranges[1][1])) - \
+            surface_point(surface, u, max(v - stepv, ranges[1][0]))
+
+        position = np.matmul(np.append(point, 1.0), world)[:3]
+        xaxis = rm.normalize(np.matmul(du, world[:3, :3]))[0]
+        yaxis = rm.normalize(np.cross(xaxis, np.matmul(dv, world[:3, :3])))[0]
+        zaxis = np.cross(xaxis, yaxis)
+        return position, rm.euler_from_matrices(np.stack([xaxis, yaxis, zaxis]))
+
+    # -- Skeleton files --
+
+    def load_skeleton(self, path):
+        # Create the nodes from a skeleton file written by export_skeleton
+        with open(path) as infile:
+            skeleton = json.load(infile)
+        nodes = {}
+        for entry in skeleton["nodes"]:
+            parentpath, _, name = entry["path"].rpartition("|")
+            node = self.create(entry["type"], name, parent=nodes.get(parentpath), unique=False)
+            nodes[entry["path"]] = node
+            for attr, value in entry["attrs"].items():
+                self.write(node, attr, value)
+        return [nodes[entry["path"]] for entry in skeleton["nodes"]]
+
+
+class OfflineCmds(types.ModuleType):
+    """
+    The maya.cmds commands the rig components use, working on an OfflineScene, with the same arguments and results
+    """
+    def __init__(self, scene):
+        super(OfflineCmds, self).__init__("maya.cmds")
+        self.scene = scene
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        raise NotImplementedError("cmds.{} isn't supported by offline builds".format(name))
+
+    def _names(self, nodes, fullpath=False):
+        return [self.scene.ref(node, fullpath=fullpath) for node in nodes]
+
+    def _targets(self, args):
+        # The nodes a command works on, from it's arguments, or the selection without any
+        names = _flatten(args)
+        return [self.scene.find(name) for name in names] if names else list(self.scene.selection)
+
+    # -- Scene queries --
+
+    def about(self, batch=False, **kwargs):
+        return True
+
+    def currentUnit(self, **kwargs):
+        flags = _flags("currentUnit", kwargs)
+        if flags.get("time"):
+            return "film"
+        return "cm" if flags.get("linear") else "deg"
+
+    def currentTime(self, *args, **kwargs):
+        return 1.0
+
+    def playbackOptions(self, **kwargs):
+        flags = _flags("playbackOptions", kwargs)
+        return 120.0 if flags.get("maxTime") or flags.get("max") else 1.0
+
+    def undoInfo(self, **kwargs):
+        return True if _flags("undoInfo", kwargs).get("query") else None
+
+    def refresh(self, **kwargs):
+        return None
+
+    def evalDeferred(self, *args, **kwargs):
+        return None
+
+    def pluginInfo(self, name, **kwargs):
+        flags = _flags("pluginInfo", kwargs)
+        if flags.get("loaded"):
+            return name in self.scene.plugins
+        raise NotImplementedError("cmds.pluginInfo only supports querying loaded in offline builds")
+
+    def loadPlugin(self, name, **kwargs):
+        # Nodes from plugins are written out like any other, with the plugin added to the file's requires
+        if name not in self.scene.plugins:
+            self.scene.plugins.append(name)
+        return [name]
+
+    def objExists(self, name):
+        return self.scene.exists(name)
+
+    def ls(self, *args, **kwargs):
+        flags = _flags("ls", kwargs)
+        if flags.get("selection"):
+            nodes = list(self.scene.selection)
+        elif args:
+            nodes = []
+            for name in _flatten(args):
+                if "*" in name or "?" in name:
+                    nodes += [node for node in self.scene.nodes if fnmatch.fnmatchcase(node.name, name)]
+                elif self.scene.exists(name):
+                    nodes.append(self.scene.find(name))
+        else:
+            nodes = list(self.scene.nodes)
+        if flags.get("type"):
+            types_ = _flatten([flags["type"]])
+            nodes = [node for node in nodes if any(nodetype in node.inherited for nodetype in types_)]
+        names = self._names(nodes, fullpath=flags.get("long", False))
+        if flags.get("showType"):
+            return [item for name, node in zip(names, nodes) for item in [name, node.type]]
+        return names
+
+    def nodeType(self, name, isTypeName=False,
+                 inherited=False, **kwargs):
+        if isTypeName:
+            inheritedtypes = NODE_TYPES.get(name, [name])
+            return inheritedtypes if inherited else name
+        node = self.scene.find(name)
+        return list(node.inherited) if inherited else node.type
+
+    def objectType(self, name, isAType=None,
+                   isType=None, **kwargs):
+        node = self.scene.find(name)
+        if isAType is not None:
+            return isAType in node.inherited
+        if isType is not None:
+            return node.type == isType
+        return node.type
+
+    def listRelatives(self, *args, **kwargs):
+        flags = _flags("listRelatives", kwargs)
+        nodes = []
+        for node in self._targets(args):
+            if flags.get("parent"):
+                relatives = [node.parent] if node.parent is not None else []
+            elif flags.get("allDescendents"):
+                # Deepest first, so renaming them in order never changes the path of one still to come
+                relatives = list(reversed(node.descendants()))
+            else:
+                relatives = list(node.children)
+            if flags.get("shapes"):
+                relatives = [relative for relative in relatives if relative.shape]
+            if flags.get("noIntermediate"):
+                relatives = [relative for relative in relatives if not self.scene.read(relative,
+                                                                                       "intermediateObject")]
+            if flags.get("type"):
+                types_ = _flatten([flags["type"]])
+                relatives = [relative for relative in relatives
+                             if any(nodetype in relative.inherited for nodetype in types_)]
+            nodes += [relative for relative in relatives if relative not in nodes]
+        return self._names(nodes, fullpath=flags.get("fullPath", False)) or None
+
+    def listConnections(self, target, **kwargs):
+        flags = _flags("listConnections", kwargs)
+        if isinstance(target, (list, tuple)):
+            results = []
+            for name in _flatten(target):
+                results += self.listConnections(name, **kwargs)
+            return results
+        source = flags.get("source", True)
+        destination = flags.get("destination", True)
+        if "." in target:
+            node, attr = self.scene.plug(target)
+            matches = lambda other: other == attr or other.startswith(attr + ".") or \
+                other.startswith(attr + "[") or CHILDREN.get(other, (None,))[0] == attr
+        else:
+            node = self.scene.find(target)
+            matches = lambda other: True
+
+        results = []
+        for sourcenode, sourceattr, destnode, destattr in self.scene.connections:
+            if source and destnode is node and matches(destattr):
+                mine, other = (destnode, destattr), (sourcenode, sourceattr)
+            elif destination and sourcenode is node and matches(sourceattr):
+                mine, other = (sourcenode, sourceattr), (destnode, destattr)
+            else:
+                continue
+            if flags.get("type") and flags["type"] not in other[0].inherited:
+                continue
+            othername = self.scene.ref(other[0])
+            if flags.get("connections"):
+                results.append("{}.{}".format(self.scene.ref(mine[0]), mine[1]))
+            results.append("{}.{}".format(othername, other[1]) if flags.get("plugs") else othername)
+        return results
+
+    def connectionInfo(self, plug, **kwargs):
+        flags = _flags("connectionInfo", kwargs)
+        node, attr = self.scene.plug(plug)
+        if flags.get("sourceFromDestination"):
+            source = self.scene.source(node, attr)
+            return "{}.{}".format(self.scene.ref(source[0]), source[1]) if source else ""
+        raise NotImplementedError("connectionInfo only supports sourceFromDestination offline")
+
+    def attributeQuery(self, attr, node=None,
+                       **kwargs):
+        flags = _flags("attributeQuery", kwargs)
+        node = self.scene.find(node)
+        attr = _normalize_attr(attr, node)
+        if flags.get("listChildren"):
+            return list(COMPOUNDS[attr]) if attr in COMPOUNDS else None
+        if flags.get("exists"):
+            return attr in node.added or attr in node.values or attr in DEFAULTS or attr in COMPOUNDS or \
+                attr in CHILDREN or attr in MATRIX_ATTRS
+        raise NotImplementedError("attributeQuery only supports listChildren and exists offline")
+
+    # -- Selection --
+
+    def select(self, *args, **kwargs):
+        flags = _flags("select", kwargs)
+        if flags.get("clear") or (flags.get("deselect") and not args):
+            self.scene.selection = []
+            return
+        nodes = [self.scene.find(name) for name in _flatten(args)]
+        if flags.get("deselect"):
+            self.scene.selection = [node for node in self.scene.selection if node not in nodes]
+        elif flags.get("add"):
+            self.scene.selection += [node for node in nodes if node not in self.scene.selection]
+        else:
+            self.scene.selection = nodes
+
+    # -- Creating nodes --
+
+    def createNode(self, nodetype, **kwargs):
+        flags = _flags("createNode", kwargs)
+        parent = self.scene.find(flags["parent"]) if flags.get("parent") else None
+        inherited = NODE_TYPES.get(nodetype, [nodetype])
+        if "shape" in inherited and parent is None:
+            # Shapes get a transform made for them, the same as in Maya
+            parent = self.scene.create("transform", "{}#".format(nodetype if not flags.get("name") else "transform"))
+            node = self.scene.create(nodetype, flags.get("name") or "{}Shape#".format(nodetype), parent=parent)
+        else:
+            node = self.scene.create(nodetype, flags.get("name") or "{}#".format(nodetype), parent=parent)
+        if not flags.get("skipSelect") and node.dag:
+            self.scene.selection = [node]
+        return self.scene.ref(node)
+
+    def group(self, *args, **kwargs):
+        flags = _flags("group", kwargs)
+        parent = self.scene.find(flags["parent"]) if flags.get("parent") else None
+        node = self.scene.create("transform", flags.get("name") or "group#", parent=parent)
+        if not flags.get("empty"):
+            for child in self._targets(args):
+                world = self.scene.world_matrix(child)
+                self.scene.reparent(child, node)
+                self.scene.set_world_matrix(child, world)
+        self.scene.selection = [node]
+        return self.scene.ref(node)
+
+    def spaceLocator(self, **kwargs):
+        flags = _flags("spaceLocator", kwargs)
+        node = self.scene.create("transform", flags.get("name") or "locator#")
+        self.scene.create("locator", "{}Shape".format(node.name), parent=node)
+        self.scene.selection = [node]
+        return [self.scene.ref(node)]
+
+    def _curve_node(self, name, data):
+        node = self.scene.create("transform", name)
+        shape = self.scene.create("nurbsCurve", "{}Shape".format(node.name), parent=node)
+        shape.data = data
+        self.scene.selection = [node]
+        return node
+
+    def curve(self, **kwargs):
+        flags = _flags("curve", kwargs)
+        degree = flags.get("degree", 3)
+        points = np.asarray(flags["point"], dtype=np.float64)
+        knots = flags.get("knot") or _uniform_knots(len(points) - degree, degree)
+        node = self._curve_node(flags.get("name") or "curve#", {"degree": degree, "form": 0,
+                                                               "knots": list(knots), "cvs": points})
+        return self.scene.ref(node)
+
+    def circle(self, **kwargs):
+        flags = _flags("circle", kwargs)
+        # Maya's periodic circle, with it's 8 CVs in the plane facing normal
+        angles = np.radians(np.arange(8) * 45.0 + 45.0)
+        cvs = np.stack([np.cos(angles), np.sin(angles), np.zeros(8)], axis=-1) * CIRCLE_RADIUS * \
+            flags.get("radius", 1.0)
+        normal = rm.normalize(flags.get("normal", (0, 0, 1)))[0]
+        if not np.allclose(normal, (0, 0, 1)):
+            cvs = np.matmul(cvs, rm.aim_matrices((0, 0, 0), normal, world_up=(0, 0, 1) if abs(normal[2]) < 0.99
+                                                 else (0, 1, 0))[[1, 2, 0]])
+        node = self._curve_node(flags.get("name") or "nurbsCircle#", {"degree": 3, "form": 2,
+                                                                     "knots": list(range(-2, 11)), "cvs": cvs})
+        return [self.scene.ref(node)]
+
+    def loft(self, *args, **kwargs):
+        # Loft between degree 1 curves, with U going from one curve to the next and V along the curves
+        flags = _flags("loft", kwargs)
+        curves = [self.scene.find(name) for name in _flatten(args)]
+        shapes = [curve if curve.type == "nurbsCurve" else [child for child in curve.children if child.shape][0]
+                  for curve in curves]
+        cvs = np.stack([self.scene.world_cvs(shape) for shape in shapes])
+        node = self.scene.create("transform", flags.get("name") or "loftedSurface#")
+        shape = self.scene.create("nurbsSurface", "{}Shape".format(node.name), parent=node)
+        shape.data = {"degreeU": 1, "degreeV": shapes[0].data["degree"], "formU": 0, "formV": 0,
+                      "knotsU": list(range(len(shapes))), "knotsV": list(shapes[0].data["knots"]), "cvs": cvs}
+        self.scene.selection = [node]
+        return [self.scene.ref(node)]
+
+    def rebuildSurface(self, *args, **kwargs):
+        # Rebuild to uniform knots, keeping the parameter range, with the new CVs on the old surface at their
+        # Greville points, which keeps any surface that's flat across each span exactly
+        flags = _flags("rebuildSurface", kwargs)
+        nodes = self._targets(args)
+        for node in nodes:
+            shape = node if node.type == "nurbsSurface" else [child for child in node.children if child.shape][0]
+            surface = shape.data
+            newsurface = {"formU": 0, "formV": 0}
+            greville = []
+            for axis, spans in zip("UV", [flags.get("spansU", 4), flags.get("spansV", 4)]):
+                degree = flags.get("degree" + axis, 3)
+                low, high = _knot_range(surface["knots" + axis], surface["degree" + axis])
+                knots = _uniform_knots(spans, degree, start=low, end=high)
+                full = _full_knots(np.asarray(knots))
+                greville.append([np.mean(full[i + 1:i + degree + 1]) for i in range(spans + degree)])
+                newsurface["degree" + axis] = degree
+                newsurface["knots" + axis] = knots
+            newsurface["cvs"] = np.array([[surface_point(surface, u, v) for v in greville[1]] for u in greville[0]])
+            shape.data = newsurface
+        return self._names(nodes)
+
+    def bakePartialHistory(self, *args, **kwargs):
+        # Offline geometry never has any history to bake
+        return _flatten(args)
+
+    def makeIdentity(self, *args, **kwargs):
+        # Freeze transforms, moving each transform's local matrix into the CVs of it's curve and surface shapes
+        for node in self._targets(args):
+            matrix = self.scene.local_matrix(node)
+            for shape in [child for child in node.children if child.data is not None]:
+                cvs = np.asarray(shape.data["cvs"])
+                homogeneous = np.concatenate([cvs, np.ones(cvs.shape[:-1] + (1,))], axis=-1)
+                shape.data["cvs"] = np.matmul(homogeneous, matrix)[..., :3]
+            for attr, value in [("translate", (0, 0, 0)), ("rotate", (0, 0, 0)), ("scale", (1, 1, 1))]:
+                self.scene.write(node, attr, value)
+
+    def scale(self, x, y,
+              z, *args, **kwargs):
+        # Only scaling CVs is supported, e.g. "curveShape.cv[2]"
+        flags = _flags("scale", kwargs)
+        pivot = np.asarray(flags.get("pivot", (0, 0, 0)), dtype=np.float64)
+        for component in _flatten(args):
+            node, attr = component.split(".", 1)
+            node = self.scene.find(node)
+            shape = node if node.data is not None else [child for child in node.children if child.data is not None][0]
+            index = int(attr.split("[")[1].rstrip("]"))
+            shape.data["cvs"][index] = pivot + (shape.data["cvs"][index] - pivot) * np.array([x, y, z])
+
+    def duplicate(self, *args, **kwargs):
+        flags = _flags("duplicate", kwargs)
+        original = self._targets(args)[0]
+
+        def copynode(node, parent, name, unique):
+            new = self.scene.create(node.type, name, parent=parent, unique=unique)
+            for attr in ["values", "added", "shortnames", "keyable", "channelbox"]:
+                setattr(new, attr, copy.deepcopy(getattr(node, attr)))
+            new.locked = set(node.locked)
+            new.data = copy.deepcopy(node.data)
+            return new
+
+        # The new root is named uniquely, and everything below it keeps the same names as the originals
+        newnodes = [copynode(original, original.parent, flags.get("name") or original.name, True)]
+        if not flags.get("parentOnly"):
+            def copychildren(node, newparent):
+                for child in [child for child in node.children if child.parent is node]:
+                    newchild = copynode(child, newparent, child.name, False)
+                    newnodes.append(newchild)
+                    copychildren(child, newchild)
+            copychildren(original, newnodes[0])
+        self.scene.selection = [newnodes[0]]
+        return [self.scene.ref(newnodes[0])] + [node.name for node in newnodes[1:]]
+
+    def rename(self, name, newname):
+        node = self.scene.find(_flatten([name])[0])
+        if newname != node.name:
+            self.scene._rename(node, self.scene.unique_name(newname))
+        return self.scene.ref(node)
+
+    def delete(self, *args, **kwargs):
+        for node in self._targets(args):
+            if node in self.scene.nodes:
+                self.scene.delete(node)
+
+    def parent(self, *args, **kwargs):
+        flags = _flags("parent", kwargs)
+        names = _flatten(args)
+        if flags.get("world"):
+            children, newparent = [self.scene.find(name) for name in names], None
+        else:
+            children, newparent = [self.scene.find(name) for name in names[:-1]], self.scene.find(names[-1])
+
+        for child in children:
+            if flags.get("addObject"):
+                # Add an instance of the shape under the new parent
+                child.instances.append(newparent)
+                newparent.children.append(child)
+                continue
+            world = self.scene.world_matrix(child)
+            self.scene.reparent(child, newparent)
+            # Driven nodes are left to whatever drives them
+            driven = any(self.scene.source(child, attr) for attr in ["translate", "rotate"] + list(
+                COMPOUNDS["translate"] + COMPOUNDS["rotate"]))
+            if not flags.get("relative") and child.dag and not child.shape and not driven:
+                self.scene.set_world_matrix(child, world, force=True)
+        return self._names(children)
+
+    def hide(self, *args, **kwargs):
+        for node in self._targets(args):
+            self.scene.write(node, "visibility", False)
+
+    def sets(self, *args, **kwargs):
+        flags = _flags("sets", kwargs)
+        objectset = self.scene.create("objectSet", flags.get("name") or "set#")
+        members = [] if flags.get("empty") else self._targets(args)
+        for index, member in enumerate(members):
+            if member.type == "objectSet":
+                self.scene.connect(member, "message", objectset, "dnSetMembers[{}]".format(index))
+            else:
+                self.scene.connect(member, "instObjGroups[0]", objectset, "dagSetMembers[{}]".format(index))
+        return self.scene.ref(objectset)
+
+    def createDisplayLayer(self, **kwargs):
+        flags = _flags("createDisplayLayer", kwargs)
+        self.scene.displaylayers = self.scene.displaylayers + 1
+        layer = self.scene.create("displayLayer", flags.get("name") or "layer#")
+        self.scene.write(layer, "identification", self.scene.displaylayers)
+        self.scene.write(layer, "displayOrder", self.scene.displaylayers)
+        if not flags.get("empty"):
+            self.editDisplayLayerMembers(layer.name, list(self.scene.selection))
+        return self.scene.ref(layer)
+
+    def editDisplayLayerMembers(self, layer, *args, **kwargs):
+        layer = self.scene.find(layer)
+        for node in self._targets(args):
+            self.scene.connect(layer, "drawInfo", node, "drawOverride", force=True)
+
+    def controller(self, *args, **kwargs):
+        for node in self._targets(args):
+            tag = self.scene.create("controller", "{}_tag".format(node.name))
+            self.scene.connect(node, "message", tag, "controllerObject")
+
+    # -- Attributes --
+
+    def addAttr(self, *args, **kwargs):
+        flags = _flags("addAttr", kwargs)
+        node = self._targets(args)[0]
+        longname = flags.get("longName") or flags["shortName"]
+        if longname in node.added:
+            raise RuntimeError("Found a duplicate attribute '{}' on {}".format(longname, node.name))
+        settings = {"shortName": flags.get("shortName", longname)}
+        if flags.get("dataType"):
+            settings["dataType"] = flags["dataType"]
+        else:
+            settings["attributeType"] = flags.get("attributeType", "double")
+        for flag in ["min", "max", "defaultValue", "enumName", "hidden", "keyable"]:
+            if flag in flags:
+                settings[flag] = flags[flag]
+        node.added[longname] = settings
+        node.shortnames[settings["shortName"]] = longname
+
+    def setAttr(self, plug, *values, **kwargs):
+        flags = _flags("setAttr", kwargs)
+        node, attr = self.scene.plug(plug)
+        if values:
+            if flags.get("type") == "string":
+                value = values[0]
+            elif flags.get("type") == "matrix" or len(_flatten(values)) == 16:
+                value = tuple(float(v) for v in _flatten(values))
+            elif len(values) == 1 and isinstance(values[0], (list, tuple)):
+                value = values[0]
+            elif len(values) == 1:
+                value = values[0]
+            else:
+                value = values
+            self.scene.write(node, attr, value)
+        for flag, store in [("keyable", node.keyable), ("channelBox", node.channelbox)]:
+            if flag in flags:
+                store[attr] = bool(flags[flag])
+        if "lock" in flags:
+            if flags["lock"]:
+                node.locked.add(attr)
+            else:
+                node.locked.discard(attr)
+
+    def getAttr(self, plug, **kwargs):
+        flags = _flags("getAttr", kwargs)
+        node, attr = self.scene.plug(plug)
+        if flags.get("lock"):
+            return self.scene.is_locked(node, attr)
+        if flags.get("keyable"):
+            if attr in node.keyable:
+                return node.keyable[attr]
+            return bool(node.added[attr].get("keyable")) if attr in node.added else \
+                (node.dag and not node.shape and attr in KEYABLE)
+        if flags.get("channelBox"):
+            return node.channelbox.get(attr, False)
+
+        # Curve shapes
+        if node.data is not None and attr.startswith("cv["):
+            cvs = [tuple(cv) for cv in np.asarray(node.data["cvs"])]
+            return cvs if attr == "cv[*]" else [cvs[int(attr[3:].rstrip("]"))]]
+        if node.data is not None and attr == "degree":
+            return node.data["degree"]
+        if node.data is not None and attr == "spans":
+            count = len(node.data["cvs"])
+            return count if node.data["form"] == 2 else count - node.data["degree"]
+
+        value = self.scene.read(node, attr)
+        if attr.split("[")[0] in MATRIX_ATTRS or attr == "offsetParentMatrix" or \
+                (isinstance(value, tuple) and len(value) == 16):
+            return list(value)
+        if isinstance(value, tuple):
+            return [value]
+        return value
+
+    def connectAttr(self, source, destination,
+                    **kwargs):
+        flags = _flags("connectAttr", kwargs)
+        sourcenode, sourceattr = self.scene.plug(source)
+        destnode, destattr = self.scene.plug(destination)
+        self.scene.connect(sourcenode, sourceattr, destnode, destattr, force=flags.get("force", False))
+
+    def disconnectAttr(self, source, destination):
+        self.scene.disconnect(*self.scene.plug(destination))
+
+    # -- Transforms --
+
+    def xform(self, *args, **kwargs):
+        flags = _flags("xform", kwargs)
+        nodes = self._targets(args)
+        worldspace = flags.get("worldSpace", False)
+        if flags.get("query"):
+            node = nodes[0]
+            world = self.scene.world_matrix(node)
+            if flags.get("matrix"):
+                return list((world if worldspace else self.scene.local_matrix(node)).ravel())
+            if flags.get("translation"):
+                return list(world[3, :3]) if worldspace else list(self.scene.read(node, "translate"))
+            if flags.get("rotation"):
+                return list(rm.euler_from_matrices(_split_scale(world[:3, :3])[1])) if worldspace \
+                    else list(self.scene.read(node, "rotate"))
+            if flags.get("scale"):
+                return list(np.abs(_split_scale(world[:3, :3])[0])) if worldspace \
+                    else list(self.scene.read(node, "scale"))
+            if flags.get("rotatePivot") or flags.get("pivots"):
+                pivot = self.scene.vector(node, "rotatePivot")
+                if worldspace:
+                    pivot = np.matmul(np.append(pivot, 1.0), world)[:3]
+                return list(pivot) * (2 if flags.get("pivots") else 1)
+            raise NotImplementedError("xform query flags {} aren't supported offline".format(sorted(flags)))
+
+        relative = flags.get("relative", False)
+        for node in nodes:
+            if flags.get("pivots") is not None:
+                before = self.scene.local_matrix(node)
+                pivot = np.asarray(flags["pivots"][:3], dtype=np.float64)
+                if worldspace:
+                    pivot = np.matmul(np.append(pivot, 1.0), np.linalg.inv(self.scene.world_matrix(node)))[:3]
+                self.scene.write(node, "rotatePivot", pivot)
+                self.scene.write(node, "scalePivot", pivot)
+                # Compensate the pivot change so the node doesn't move
+                shift = before[3, :3] - self.scene.local_matrix(node)[3, :3]
+                self.scene.write(node, "rotatePivotTranslate", self.scene.vector(node, "rotatePivotTranslate") + shift)
+            if flags.get("matrix") is not None:
+                matrix = np.reshape(flags["matrix"], (4, 4))
+                if worldspace:
+                    self.scene.set_world_matrix(node, matrix)
+                else:
+                    self.scene.set_local_matrix(node, matrix)
+            if flags.get("scale") is not None:
+                scale = np.asarray(flags["scale"], dtype=np.float64)
+                self.scene.write(node, "scale", self.scene.vector(node, "scale") * scale if relative else scale)
+            if flags.get("rotation") is not None:
+                rotation = np.asarray(flags["rotation"], dtype=np.float64)
+                if worldspace and not relative:
+                    self.scene.set_world_rotation(node, rm.matrices_from_euler(rotation))
+                else:
+                    self.scene.write(node, "rotate", self.scene.vector(node, "rotate") + rotation if relative
+                                     else rotation)
+            if flags.get("translation") is not None:
+                translation = np.asarray(flags["translation"], dtype=np.float64)
+                if worldspace and not relative:
+                    self.scene.set_world_position(node, translation)
+                elif worldspace:
+                    self.scene.set_world_position(node, self.scene.world_matrix(node)[3, :3] + translation)
+                else:
+                    self.scene.write(node, "translate", self.scene.vector(node, "translate") + translation
+                                     if relative else translation)
+
+    def joint(self, *args, **kwargs):
+        flags = _flags("joint", kwargs)
+        if not flags.get("edit"):
+            parent = self.scene.selection[0] if self.scene.selection and \
+                self.scene.selection[0].type == "joint" else None
+            node = self.scene.create("joint", flags.get("name") or "joint#", parent=parent)
+            if flags.get("position") is not None:
+                self.scene.set_world_position(node, np.asarray(flags["position"], dtype=np.float64))
+            if flags.get("radius") is not None:
+                self.scene.write(node, "radius", flags["radius"])
+            self.scene.selection = [node]
+            return self.scene.ref(node)
+
+        node = self._targets(args)[0]
+        joints = [node] + ([child for child in node.descendants() if child.type == "joint"]
+                           if flags.get("children") else [])
+        if flags.get("orientation") is not None:
+            self.scene.write(node, "jointOrient", flags["orientation"])
+        if flags.get("radius") is not None:
+            self.scene.write(node, "radius", flags["radius"])
+        if flags.get("orientJoint"):
+            if flags["orientJoint"] != "xyz" or flags.get("secondaryAxisOrient", "yup") != "yup":
+                raise NotImplementedError("Only orientJoint xyz with secondaryAxisOrient yup is supported offline")
+            positions = {joint: self.scene.world_matrix(joint)[3, :3] for joint in joints}
+            for joint in joints:
+                # Aim X at the first child joint with Y as close to world up as it can be, and match the parent
+                # joint's orientation at the end of the chain, then put the children back where they were
+                childjoints = [child for child in joint.children if child.type == "joint"]
+                for attr, value in [("rotate", (0, 0, 0)), ("jointOrient", (0, 0, 0))]:
+                    self.scene.write(joint, attr, value)
+                if childjoints:
+                    _, parentrotation = _split_scale(self.scene.parent_space(joint)[:3, :3])
+                    aim = rm.aim_matrices(positions[joint], positions.get(childjoints[0],
+                                                                         self.scene.world_matrix(childjoints[0])[3, :3]))
+                    self.scene.write(joint, "jointOrient", rm.euler_from_matrices(np.matmul(aim, parentrotation.T)))
+                for child in [child for child in joint.children if child.parent is joint and child.dag and
+                              not child.shape]:
+                    self.scene.set_world_position(child, positions.get(child, self.scene.world_matrix(child)[3, :3]))
+        if flags.get("setPreferredAngles"):
+            for joint in joints:
+                self.scene.write(joint, "preferredAngle", self.scene.read(joint, "rotate"))
+
+    # -- Rigging --
+
+    def ikHandle(self, **kwargs):
+        flags = _flags("ikHandle", kwargs)
+        startjoint = self.scene.find(flags["startJoint"])
+        endjoint = self.scene.find(flags["endEffector"])
+        solvertype = flags.get("solver", "ikRPsolver")
+        solver = self.scene.names.get(solvertype, [None])[0] or self.scene.create(solvertype, solvertype)
+
+        # The effector sits under the end joint's parent, following the end joint's translate
+        effector = self.scene.create("ikEffector", "effector#", parent=endjoint.parent)
+        self.scene.write(effector, "translate", self.scene.read(endjoint, "translate"))
+        handle = self.scene.create("ikHandle", flags.get("name") or "ikHandle#")
+        self.scene.set_world_position(handle, self.scene.world_matrix(endjoint)[3, :3])
+
+        # The default pole vector keeps the chain in it's current plane, in the start joint's parent space
+        startpos = self.scene.world_matrix(startjoint)[3, :3]
+        endpos = self.scene.world_matrix(endjoint)[3, :3]
+        midpos = self.scene.world_matrix(endjoint.parent)[3, :3]
+        aim = rm.normalize(endpos - startpos)[0]
+        polevector = (midpos - startpos) - np.dot(midpos - startpos, aim) * aim
+        if startjoint.parent is not None:
+            polevector = np.matmul(polevector, np.linalg.inv(self.scene.world_matrix(startjoint.parent))[:3, :3])
+        self.scene.write(handle, "poleVector", rm.normalize(polevector)[0])
+
+        for axis in "XYZ":
+            self.scene.connect(endjoint, "translate" + axis, effector, "translate" + axis)
+        self.scene.connect(startjoint, "message", handle, "startJoint")
+        self.scene.connect(effector, "handlePath[0]", handle, "endEffector")
+        self.scene.connect(solver, "message", handle, "ikSolver")
+        self.scene.selection = [handle]
+        return [self.scene.ref(handle), self.scene.ref(effector)]
+
+    def _constraint(self, kind, args,
+                    kwargs):
+        # Create, or add targets to, a constraint of kind, with every argument but the last as a target
+        flags = _flags(kind, kwargs)
+        nodes = self._targets(args)
+        if flags.get("query"):
+            constraint = nodes[0] if nodes[0].type == kind else \
+                [child for child in nodes[0].children if child.type == kind][0]
+            if flags.get("weightAliasList"):
+                return [attr for attr in constraint.added if constraint.added[attr]["shortName"].startswith("w")]
+            raise NotImplementedError("{} queries other than weightAliasList aren't supported offline".format(kind))
+
+        targets, driven = nodes[:-1], nodes[-1]
+        existing = [child for child in driven.children if child.type == kind]
+        if existing:
+            constraint = existing[0]
+        else:
+            constraint = self.scene.create(kind, flags.get("name") or "{}_{}1".format(driven.name, kind),
+                                           parent=driven)
+        # New targets go after any the constraint already has, which each have a weight attribute
+        start = len(constraint.added)
+
+        joint = driven.type == "joint"
+        drivenworld = self.scene.world_matrix(driven)
+        targetworlds = [self.scene.world_matrix(target) for target in targets]
+        connect = self.scene.connect
+
+        if kind == "poleVectorConstraint":
+            # The pole vector is the target's position relative to the start joint, in the start joint's parent space
+            startjoint = self.scene.source(driven, "startJoint")[0]
+            connect(driven, "parentInverseMatrix[0]", constraint, "constraintParentInverseMatrix")
+            connect(startjoint, "parentMatrix[0]", constraint, "pivotSpace")
+            connect(startjoint, "translate", constraint, "constraintRotatePivot")
+            startworld = self.scene.world_matrix(startjoint)[3, :3]
+            space = self.scene.world_matrix(startjoint.parent) if startjoint.parent is not None else np.identity(4)
+            polevector = np.matmul(targetworlds[0][3, :3] - startworld, np.linalg.inv(space)[:3, :3])
+            self.scene.write(driven, "poleVector", polevector)
+            for axis in "XYZ":
+                connect(constraint, "constraintTranslate" + axis, driven, "poleVector" + axis)
+
+        for index, target in enumerate(targets, start):
+            prefix = "target[{}].".format(index)
+            if kind in ["parentConstraint", "pointConstraint", "poleVectorConstraint"]:
+                for source, destination in [("translate", "targetTranslate"), ("rotatePivot", "targetRotatePivot"),
+                                            ("rotatePivotTranslate", "targetRotateTranslate")]:
+                    connect(target, source, constraint, prefix + destination)
+            if kind in ["parentConstraint", "orientConstraint"]:
+                connect(target, "rotate", constraint, prefix + "targetRotate")
+                connect(target, "rotateOrder", constraint, prefix + "targetRotateOrder")
+                if target.type == "joint":
+                    connect(target, "jointOrient", constraint, prefix + "targetJointOrient")
+            if kind == "parentConstraint":
+                connect(target, "scale", constraint, prefix + "targetScale")
+            connect(target, "parentMatrix[0]", constraint, prefix + "targetParentMatrix")
+
+            # Each target's weight is an added attribute named after the target, the same as in Maya
+            weight = "{}W{}".format(target.name, index)
+            self.addAttr(constraint, longName=weight, shortName="w{}".format(index), min=0, defaultValue=1.0,
+                         keyable=True)
+            connect(constraint, weight, constraint, prefix + "targetWeight")
+
+            if kind == "parentConstraint" and flags.get("maintainOffset"):
+                translation, rotation = rm.decompose_matrices(np.matmul(drivenworld,
+                                                                        np.linalg.inv(targetworlds[index - start])))
+                self.scene.write(constraint, prefix + "targetOffsetTranslate", translation)
+                self.scene.write(constraint, prefix + "targetOffsetRotate", rotation)
+
+        if kind == "poleVectorConstraint":
+            self.scene.selection = [constraint]
+            return [self.scene.ref(constraint)]
+
+        # Constrained node connections and outputs
+        if kind in ["parentConstraint", "pointConstraint"]:
+            connect(driven, "rotatePivot", constraint, "constraintRotatePivot")
+            connect(driven, "rotatePivotTranslate", constraint, "constraintRotateTranslate")
+        if kind in ["parentConstraint", "orientConstraint"]:
+            connect(driven, "rotateOrder", constraint, "constraintRotateOrder")
+            if joint:
+                connect(driven, "jointOrient", constraint, "constraintJointOrient")
+        connect(driven, "parentInverseMatrix[0]", constraint, "constraintParentInverseMatrix")
+
+        # Offsets for point and orient constraints are single values against the average of the targets
+        targetpositions = np.mean([world[3, :3] for world in targetworlds], axis=0)
+        quaternions = rm.quaternions_from_matrices(np.array([_split_scale(world[:3, :3])[1]
+                                                             for world in targetworlds]))
+        quaternions *= np.where(np.dot(quaternions, quaternions[0]) < 0, -1.0, 1.0)[:, np.newaxis]
+        targetrotation = rm.matrices_from_quaternions(np.mean(quaternions, axis=0))
+        drivenrotation = _split_scale(drivenworld[:3, :3])[1]
+        if flags.get("maintainOffset") and kind == "pointConstraint":
+            self.scene.write(constraint, "offset", drivenworld[3, :3] - targetpositions)
+        elif flags.get("maintainOffset") and kind == "orientConstraint":
+            self.scene.write(constraint, "offset", rm.euler_from_matrices(np.matmul(drivenrotation,
+                                                                                    targetrotation.T)))
+        elif not flags.get("maintainOffset"):
+            # Without an offset, the driven node snaps to it's targets
+            if kind in ["parentConstraint", "orientConstraint"]:
+                self.scene.set_world_rotation(driven, targetrotation)
+            if kind in ["parentConstraint", "pointConstraint"]:
+                self.scene.set_world_position(driven, targetpositions)
+
+        outputs = {"parentConstraint": ["translate", "rotate"], "pointConstraint": ["translate"],
+                   "orientConstraint": ["rotate"]}[kind]
+        for output in outputs:
+            for axis in "XYZ":
+                if not self.scene.source(driven, output + axis):
+                    connect(constraint, "constraint{}{}".format(output.capitalize(), axis), driven, output + axis)
+
+        self.scene.selection = [constraint]
+        return [self.scene.ref(constraint)]
+
+    def parentConstraint(self, *args, **kwargs):
+        return self._constraint("parentConstraint", args, kwargs)
+
+    def pointConstraint(self, *args, **kwargs):
+        return self._constraint("pointConstraint", args, kwargs)
+
+    def orientConstraint(self, *args, **kwargs):
+        return self._constraint("orientConstraint", args, kwargs)
+
+    def poleVectorConstraint(self, *args, **kwargs):
+        return self._constraint("poleVectorConstraint", args, kwargs)
+
+    def skinCluster(self, *args, **kwargs):
+        # Bind a surface or curve to joints, with an intermediate Orig shape holding the undeformed CVs
+        flags = _flags("skinCluster", kwargs)
+        nodes = self._targets(args)
+        influences, geometry = nodes[:-1], nodes[-1]
+        shape = geometry if geometry.shape else [child for child in geometry.children if child.shape][0]
+        maxinfluences = flags.get("maximumInfluences", 5)
+        dropoff = flags.get("dropoffRate", 4.0)
+
+        orig = self.scene.create(shape.type, "{}Orig".format(shape.name), parent=shape.parent)
+        orig.data = copy.deepcopy(shape.data)
+        self.scene.write(orig, "intermediateObject", True)
+        skin = self.scene.create("skinCluster", flags.get("name") or "skinCluster#")
+        self.scene.connect(orig, "local" if shape.type == "nurbsSurface" else "local", skin,
+                           "input[0].inputGeometry")
+        self.scene.connect(skin, "outputGeometry[0]", shape, "create")
+        self.scene.write(skin, "geomMatrix", tuple(self.scene.world_matrix(shape).ravel()))
+        self.scene.write(skin, "maxInfluences", maxinfluences)
+        self.scene.write(skin, "maintainMaxInfluences", True)
+
+        jointpositions = []
+        for index, influence in enumerate(influences):
+            world = self.scene.world_matrix(influence)
+            jointpositions.append(world[3, :3])
+            self.scene.connect(influence, "worldMatrix[0]", skin, "matrix[{}]".format(index))
+            self.scene.write(skin, "bindPreMatrix[{}]".format(index), tuple(np.linalg.inv(world).ravel()))
+
+        # Weight each CV to it's closest influences, by inverse distance
+        cvs = self.scene.world_cvs(shape).reshape(-1, 3)
+        distances = np.linalg.norm(cvs[:, np.newaxis] - np.array(jointpositions)[np.newaxis], axis=-1)
+        for cvindex, cvdistances in enumerate(distances):
+            closest = np.argsort(cvdistances)[:maxinfluences]
+            weights = 1.0 / np.maximum(cvdistances[closest], 1e-6) ** dropoff
+            weights = weights / weights.sum()
+            for influence, weight in zip(closest, weights):
+                if weight > 1e-6:
+                    self.scene.write(skin, "weightList[{}].weights[{}]".format(cvindex, influence), float(weight))
+        return [self.scene.ref(skin)]
+
+
+def install(scene=None):
+    # Put an OfflineCmds for scene (or a new scene) in place of maya.cmds and maya.mel, and return the scene
+    # Build modules imported before this keep using whatever maya.cmds they imported
+    scene = scene or OfflineScene()
+    maya = types.ModuleType("maya")
+    maya.cmds = OfflineCmds(scene)
+    maya.mel = types.ModuleType("maya.mel")
+    maya.mel.eval = lambda *args, **kwargs: None
+    sys.modules["maya"] = maya
+    sys.modules["maya.cmds"] = maya.cmds
+    sys.modules["maya.mel"] = maya.mel
+    return scene
+
+
+def export_skeleton(path, roots):
+    # Write every transform and joint under the roots, and the roots themselves, to a skeleton file for offline
+    # builds. Run this inside of Maya, on the file the rig would normally be built on top of
+    from maya import cmds
+
+    attrs = ["translate", "rotate", "scale", "rotateOrder", "rotateAxis", "visibility"]
+    jointattrs = ["jointOrient", "radius", "preferredAngle"]
+    nodes = []
+    for root in roots:
+        paths = cmds.ls(root, long=True) + (cmds.listRelatives(root, allDescendents=True, type="transform",
+                                                                fullPath=True) or [])
+        for nodepath in sorted(set(paths), key=lambda nodepath: nodepath.count("|")):
+            nodetype = cmds.nodeType(nodepath)
+            if nodetype not in ["transform", "joint"]:
+                continue
+            values = {}
+            for attr in attrs + (jointattrs if nodetype == "joint" else []):
+                value = cmds.getAttr("{}.{}".format(nodepath, attr))
+                values[attr] = list(value[0]) if isinstance(value, list) else value
+            nodes.append({"path": nodepath, "type": nodetype, "attrs": values})
+
+    with open(path, "w") as outfile:
+        json.dump({"nodes": nodes}, outfile, indent=1)
+    return len(nodes)
+
+
+def _format_value(value):
+    # The setAttr arguments for a value
+    if isinstance(value, bool):
+        return "yes" if value else "no"
+    if isinstance(value, str):
+        return '-type "string" "{}"'.format(value.replace("\\", "\\\\").replace('"', '\\"'))
+    if isinstance(value, tuple) and len(value) == 16:
+        return '-type "matrix" ' + " ".join(repr(float(v)) for v in value)
+    if isinstance(value, tuple):
+        return '-type "double{}" '.format(len(value)) + " ".join(repr(float(v)) for v in value)
+    if isinstance(value, (int, np.integer)):
+        return str(int(value))
+    return repr(float(value))
+
+
+def _geometry_lines(node):
+    # The cached geometry setAttr for a nurbsCurve or nurbsSurface shape
+    data = node.data
+    cvs = np.asarray(data["cvs"], dtype=np.float64)
+    if node.type == "nurbsCurve":
+        if data["form"] == 2:
+            # Periodic curves repeat their first degree CVs at the end
+            cvs = np.concatenate([cvs, cvs[:data["degree"]]])
+        spans = len(data["cvs"]) if data["form"] == 2 else len(cvs) - data["degree"]
+        yield '\tsetAttr ".cc" -type "nurbsCurve" '
+        yield "\t\t{} {} {} no 3".format(data["degree"], spans, data["form"])
+        yield "\t\t{} {}".format(len(data["knots"]), " ".join(repr(float(k)) for k in data["knots"]))
+        yield "\t\t{}".format(len(cvs))
+    else:
+        yield '\tsetAttr ".cc" -type "nurbsSurface" '
+        yield "\t\t{} {} {} {} no ".format(data["degreeU"], data["degreeV"], data["formU"], data["formV"])
+        for axis in "UV":
+            yield "\t\t{} {}".format(len(data["knots" + axis]), " ".join(repr(float(k)) for k in data["knots" + axis]))
+        yield "\t\t"
+        cvs = cvs.reshape(-1, 3)
+        yield "\t\t{}".format(len(cvs))
+    for index, cv in enumerate(cvs):
+        yield "\t\t{}{}".format(" ".join(repr(float(v)) for v in cv), ";" if index == len(cvs) - 1 else "")
+
+
+def _added_attr_line(longname, settings):
+    flags = ["-ci true"]
+    if settings.get("keyable"):
+        flags.append("-k true")
+    if settings.get("hidden"):
+        flags.append("-h true")
+    flags += ['-sn "{}"'.format(settings["shortName"]), '-ln "{}"'.format(longname)]
+    for flag, setting in [("-min", "min"), ("-max", "max"), ("-dv", "defaultValue")]:
+        if setting in settings:
+            flags.append("{} {}".format(flag, repr(float(settings[setting]))))
+    if "enumName" in settings:
+        flags.append('-en "{}"'.format(settings["enumName"]))
+    if "dataType" in settings:
+        flags.append('-dt "{}"'.format(settings["dataType"]))
+    else:
+        flags.append('-at "{}"'.format(settings["attributeType"]))
+    return "\taddAttr {};".format(" ".join(flags))
+
+
+def ma_lines(scene, name="rig.ma"):
+    # Yield the lines of a Maya ASCII file for the whole scene, one node at a time, so nothing is built up in memory
+    yield "//Maya ASCII {} scene".format(MAYA_VERSION)
+    yield "//Name: {}".format(name)
+    yield "//Codeset: UTF-8"
+    yield 'requires maya "{}";'.format(MAYA_VERSION)
+    for plugin in scene.plugins:
+        yield 'requires "{}" "1.0";'.format(plugin)
+    yield "currentUnit -l centimeter -a degree -t film;"
+    yield 'fileInfo "application" "maya";'
+
+    # DAG nodes parents first, then DG nodes, each in the order they were created
+    dagnodes = []
+    for root in [node for node in scene.nodes if node.dag and node.parent is None]:
+        dagnodes += [root] + root.descendants()
+    dgnodes = [node for node in scene.nodes if not node.dag]
+
+    for node in dagnodes + dgnodes:
+        line = 'createNode {} -n "{}"'.format(node.type, node.name)
+        if node.parent is not None:
+            line += ' -p "{}"'.format(scene.ref(node.parent))
+        yield line + ";"
+        for longname, settings in node.added.items():
+            yield _added_attr_line(longname, settings)
+
+        # Compounds go out as a single double3 where any of their children have been set
+        written = set()
+        for attr in node.values:
+            if attr in CHILDREN:
+                compound = CHILDREN[attr][0]
+                if compound not in written:
+                    written.add(compound)
+                    value = tuple(scene._stored(node, child) or DEFAULTS.get(child, 0.0)
+                                  for child in COMPOUNDS[compound])
+                    yield '\tsetAttr ".{}" {};'.format(compound, _format_value(value))
+            else:
+                yield '\tsetAttr ".{}" {};'.format(attr, _format_value(node.values[attr]))
+        if node.data is not None:
+            for line in _geometry_lines(node):
+                yield line
+
+        for attr in sorted(set(node.keyable) | set(node.channelbox) | node.locked):
+            flags = []
+            if attr in node.keyable:
+                flags.append("-k {}".format("on" if node.keyable[attr] else "off"))
+            if attr in node.channelbox:
+                flags.append("-cb {}".format("on" if node.channelbox[attr] else "off"))
+            if attr in node.locked:
+                flags.append("-l on")
+            yield '\tsetAttr {} ".{}";'.format(" ".join(flags), attr)
+
+    # Instanced shapes, then every connection
+    for node in dagnodes:
+        for transform in node.instances:
+            yield 'parent -s -nc -r -add "{}" "{}";'.format(node.path(), transform.path())
+    for node in dgnodes:
+        if node.type == "displayLayer":
+            yield 'connectAttr "layerManager.displayLayerId[{}]" "{}.identification";'.format(
+                scene.read(node, "identification"), scene.ref(node))
+    for source, sourceattr, destination, destattr in scene.connections:
+        yield 'connectAttr "{}.{}" "{}.{}";'.format(scene.ref(source), sourceattr, scene.ref(destination), destattr)
+    yield "// End of {}".format(name)
+
+
+def write_ma(scene, path):
+    # Stream the scene out to a Maya ASCII file, returning the number of nodes written
+    with open(path, "w") as outfile:
+        for line in ma_lines(scene, name=os.path.basename(path)):
+            outfile.write(line)
+            outfile.write("\n")
+    return len(scene.nodes)
+
+
+def build(skeleton, output,
+          script):
+    # Build a rig without Maya, by loading the skeleton file, running the character's build script (a copy of
+    # Template_Run_Script.py) against the offline scene, and writing the result to output as Maya ASCII
+    starttime = time.time()
+    scene = install()
+    basenodes = len(scene.load_skeleton(skeleton))
+
+    # Character scripts are written for Maya's Python 2, where reload is a builtin
+    runpy.run_path(script, init_globals={"reload": importlib.reload}, run_name="__offline__")
+    buildtime = time.time() - starttime
+
+    write_ma(scene, output)
+    print("Built {} nodes on a {} node skeleton in {:.2f}s, and wrote {} in {:.2f}s".format(
+        len(scene.nodes) - basenodes, basenodes, buildtime, output, time.time() - starttime - buildtime))
+    return scene
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a rig without Maya, and write it out as a Maya ASCII file")
+    parser.add_argument("skeleton", help="Skeleton json file, written from Maya with export_skeleton")
+    parser.add_argument("output", help="Maya ASCII file to write")
+    parser.add_argument("script", help="The character's build script, a copy of Template_Run_Script.py")
+    arguments = parser.parse_args()
+    build(arguments.skeleton, arguments.output, arguments.script)
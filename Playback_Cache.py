@@ -0,0 +1,228 @@
+"""
+This script houses a playback cache for rigs built with Build_Components.py, which records the evaluated bind joint
+world matrices for a shot into a memory mapped file, and plays them back on a lightweight proxy skeleton so reviewing
+motion doesn't depend on how heavy the rig is
+"""
+
+# Standard library imports
+import json
+import os
+
+# Third party imports
+import numpy as np
+from maya import cmds
+from maya.api import OpenMaya as om
+from maya.api import OpenMayaAnim as oma
+
+# Local application imports
+import Anim_Export
+import Anim_Tools
+import Bulk_Ops
+
+
+
+"""
+-- NOTES --
+Each shot is stored in cachedir as three files
+    {shot}.npy          float32 (frames, joints, 4, 4) world matrices, opened as a memory map
+    {shot}_valid.npy    bool (frames), which frames in the matrices file are up to date
+    {shot}.json         the joint names and the first frame, so the cache can be reopened later
+Editing a key on any control only invalidates the frames that key can change, and record() only evaluates the rig for
+    invalid frames. Keys are compared by time, value, tangent types and tangents, and the invalid range reaches two
+    keys past the edit on either side, as auto and spline tangents on the neighbouring keys change with it
+Setting an attribute on a control that isn't keyed or driven changes every frame, so invalidates the whole shot
+"""
+
+
+class PlaybackCache(object):
+    """
+    The bind joint world matrices for one shot, recorded from the rig and played back on a proxy skeleton
+    """
+    def __init__(self, cachedir, shot,
+                 char_name="Char", frames=None):
+        self.cachedir = cachedir
+        self.shot = shot
+        self.char_name = char_name
+        self.proxyjoints = []
+        self._callbacks = []
+        self._curvekeys = {}
+
+        if not os.path.isdir(cachedir):
+            os.makedirs(cachedir)
+
+        infopath = self._path(".json")
+        if os.path.exists(infopath):
+            with open(infopath) as infile:
+                info = json.load(infile)
+            self.joints = info["joints"]
+            self.startframe = info["startframe"]
+            self.matrices = np.load(self._path(".npy"), mmap_mode="r+")
+            self.valid = np.load(self._path("_valid.npy"), mmap_mode="r+")
+            return
+
+        if frames is None:
+            frames = Anim_Tools.frame_range()
+        self.joints = Anim_Export.bind_joints("{}_BindJoints".format(char_name))[0]
+        self.startframe = int(frames[0])
+        with open(infopath, "w") as outfile:
+            json.dump({"joints": self.joints, "startframe": self.startframe}, outfile)
+
+        shape = (len(frames), len(self.joints), 4, 4)
+        self.matrices = np.lib.format.open_memmap(self._path(".npy"), mode="w+", dtype=np.float32, shape=shape)
+        self.valid = np.lib.format.open_memmap(self._path("_valid.npy"), mode="w+", dtype=bool, shape=(len(frames),))
+
+    def _path(self, suffix):
+        return os.path.join(self.cachedir, self.shot + suffix)
+
+    @property
+    def frames(self):
+        return np.arange(len(self.valid)) + self.startframe
+
+    def invalidate(self, start=None, end=None):
+        # Mark the frames from start to end as out of date, defaulting to every frame in the shot
+        first = 0 if start is None else max(int(np.floor(start)) - self.startframe, 0)
+        last = len(self.valid) if end is None else min(int(np.ceil(end)) - self.startframe + 1, len(self.valid))
+        if first < last:
+            self.valid[first:last] = False
+
+    def record(self, chunkframes=64):
+        # Evaluate the rig for every out of date frame, a chunk at a time, and write them into the cache
+        # Returns the number of frames that were recorded
+        frames = self.frames[~np.asarray(self.valid)]
+        for start in range(0, len(frames), chunkframes):
+            chunkframelist = frames[start:start + chunkframes]
+            indices = chunkframelist - self.startframe
+            self.matrices[indices] = Bulk_Ops.sample_world_matrices(self.joints, chunkframelist.tolist())
+            self.valid[indices] = True
+        self.matrices.flush()
+        self.valid.flush()
+        return len(frames)
+
+    def build_proxy(self, radius=1.0):
+        # Create a flat proxy joint for each bind joint under a {shot}_Proxy_GRP, which playback sets straight to the
+        # cached world matrices, so no hierarchy needs evaluating
+        proxygrp = "{}_Proxy_GRP".format(self.shot)
+        if cmds.ls(proxygrp):
+            cmds.delete(proxygrp)
+        cmds.group(name=proxygrp, empty=True)
+        names = ["{}_Proxy_{}".format(self.shot, joint.rsplit("|", 1)[-1]) for joint in self.joints]
+        self.proxyjoints = Bulk_Ops.create_nodes("joint", names, parents=[proxygrp] * len(names))
+        Bulk_Ops.set_attrs([("{}.radius".format(joint), radius) for joint in self.proxyjoints])
+        return proxygrp
+
+    def show_frame(self, frame):
+        # Pose the proxy skeleton from the cache, falling back to the rig for a frame that's out of date
+        index = int(round(frame)) - self.startframe
+        if not 0 <= index < len(self.valid):
+            return
+        if not self.valid[index]:
+            self.matrices[index] = Bulk_Ops.sample_world_matrices(self.joints, [frame])[0]
+            self.valid[index] = True
+        Bulk_Ops.set_world_matrices(self.proxyjoints, self.matrices[index].astype(np.float64))
+
+    def start_playback(self):
+        # Hide the rig and drive the proxy skeleton from the cache whenever the time changes, invalidating the cache
+        # whenever a control's animation or attributes are edited
+        self.stop_playback()
+        if not self.proxyjoints:
+            self.build_proxy()
+        self._rig_visibility(False)
+
+        # Snapshot the keys on every control curve, so the first edit to each one can be narrowed down too
+        self._curvekeys = {}
+        iterator = om.MItDependencyNodes(om.MFn.kAnimCurve)
+        while not iterator.isDone():
+            curve = iterator.thisNode()
+            if self._controls_curve(curve):
+                curvefn = oma.MFnAnimCurve(curve)
+                self._curvekeys[curvefn.name()] = self._keys(curvefn)
+            iterator.next()
+
+        self._callbacks = [
+            om.MEventMessage.addEventCallback("timeChanged", self._time_changed),
+            oma.MAnimMessage.addAnimCurveEditedCallback(self._curves_edited),
+        ]
+        selection = om.MSelectionList()
+        for ctrl in cmds.ls("*_CTRL", type="transform", recursive=True):
+            selection.add(ctrl)
+        for index in range(selection.length()):
+            self._callbacks.append(om.MNodeMessage.addAttributeChangedCallback(selection.getDependNode(index),
+                                                                               self._attribute_changed))
+        self.show_frame(cmds.currentTime(query=True))
+
+    def stop_playback(self):
+        # Remove the callbacks and show the rig again
+        for callback in self._callbacks:
+            om.MMessage.removeCallback(callback)
+        self._callbacks = []
+        self._rig_visibility(True)
+
+    def _rig_visibility(self, visible):
+        # character_setup locks the visibility of the Rig and Meshes groups, so unlock it to change it
+        for group in ["Rig", "Meshes"]:
+            attr = "{}_{}.visibility".format(self.char_name, group)
+            if cmds.objExists(attr):
+                cmds.setAttr(attr, lock=False)
+                cmds.setAttr(attr, visible, lock=True)
+
+    def _time_changed(self, *args):
+        self.show_frame(cmds.currentTime(query=True))
+
+    def _controls_curve(self, curve):
+        # Whether an animation curve drives one of the rig's controls
+        plug = om.MFnDependencyNode(curve).findPlug("output", False)
+        for destination in plug.connectedTo(False, True):
+            name = om.MFnDependencyNode(destination.node()).name()
+            if name.endswith("_CTRL"):
+                return True
+        return False
+
+    def _keys(self, curvefn):
+        # Each key as a (time, value, in tangent type, out tangent type, in tangent x, y, out tangent x, y) row
+        keys = []
+        for key in range(curvefn.numKeys):
+            keys.append((curvefn.input(key).asUnits(om.MTime.uiUnit()), curvefn.value(key),
+                         curvefn.inTangentType(key), curvefn.outTangentType(key))
+                        + tuple(curvefn.getTangentXY(key, True)) + tuple(curvefn.getTangentXY(key, False)))
+        return keys
+
+    def _attribute_changed(self, message, plug,
+                           otherplug, *args):
+        # A control attribute set without a key holds for every frame, where keyed and driven attributes are left to
+        # their curves, which _curves_edited handles
+        if message & om.MNodeMessage.kAttributeSet and not plug.isDestination:
+            self.invalidate()
+
+    def _curves_edited(self, curves, *args):
+        # Compare each edited curve against it's keys from the last edit, and invalidate from the key before the first
+        # change to the key after the last one, since those are the only frames the change can reach
+        for index in range(len(curves)):
+            curve = curves[index]
+            if not self._controls_curve(curve):
+                continue
+            curvefn = oma.MFnAnimCurve(curve)
+            keys = self._keys(curvefn)
+
+            name = curvefn.name()
+            previous = self._curvekeys.get(name)
+            self._curvekeys[name] = keys
+            if previous is None:
+                self.invalidate()
+                continue
+
+            # Keys that were added, removed, moved, or had their value or tangents changed show up in only one of the
+            # two sets of keys
+            changed = set(previous) ^ set(keys)
+            if changed:
+                changedtimes = [key[0] for key in changed]
+                times = np.union1d([key[0] for key in previous], [key[0] for key in keys])
+                self._invalidate_changes(times, min(changedtimes), max(changedtimes))
+
+    def _invalidate_changes(self, times, first, last,
+                            reach=2):
+        # Widen a changed range out by reach keys either side, as the tangents of the keys next to an edit can change
+        # with it, or to the ends of the shot when there aren't that many keys past the first and last changes
+        before = times[times < first]
+        after = times[times > last]
+        self.invalidate(before[-reach] if len(before) >= reach else None,
+                        after[reach - 1] if len(after) >= reach else None)
@@ -0,0 +1,317 @@
+"""
+This script houses fingerprinting for rigs built with Build_Components.py, which turns a built rig into sorted node,
+attribute and connection tables, hashes them per component, and diffs two builds through those tables, so changes to
+the builders that alter the rig show up per component before they reach animators
+"""
+
+# Standard library imports
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+# Third party imports
+try:
+    from maya import cmds
+except ImportError:
+    # Fingerprints can be made from Maya ASCII files, like Offline_Build.py writes, and diffed outside of Maya
+    cmds = None
+
+# Local application imports
+import Graph_Checker
+
+
+
+"""
+-- NOTES --
+A fingerprint is read from a Maya ASCII file, either exported from the open scene or written by an offline build, as
+    nodes           {long name: node type}
+    attrs           {(long name, attr): value}, from every setAttr and addAttr, with lock, keyable, channel box and
+                    array sizes as their own "attr@lock" style entries
+    connections     {(source plug, destination plug)}, with plugs as long name.attr, kept as pairs so every
+                    connectAttr -na into the same plug, like set members, is it's own connection
+Numbers are rounded to precision decimal places, so floating point noise between builds isn't reported as a change,
+    and node UUIDs are left out, as they change every build
+Every node is hashed from it's type, attributes and incoming connections, and each component's hash comes from it's
+    nodes' hashes, with components assigned the same way as Graph_Checker.assign_components
+Diffs look nodes up by name in each fingerprint's tables, so comparing two builds is linear in their size
+Fingerprints are saved as json, gzipped when the path ends in .gz
+"""
+
+
+# Maya ASCII commands that don't describe the rig, or change every time it's saved
+SKIPPED_COMMANDS = ["requires", "currentUnit", "fileInfo", "relationship", "lockNode", "dataStructure", "cycleCheck",
+                    "applyMetadata", "rename"]
+SETATTR_FLAGS = {"-l": "lock", "-k": "keyable", "-cb": "channelBox", "-s": "size"}
+# Flags that Maya writes without a value, like createNode -s for the default cameras, where every other flag takes one
+NO_VALUE_FLAGS = {
+    "createNode": ["-s", "-shared", "-ss", "-skipSelect"],
+    "addAttr": ["-m", "-multi", "-uac", "-usedAsColor", "-uaf", "-usedAsFilename"],
+}
+# createNode types that are DAG nodes, so parentless ones get a "|" long name, where DG nodes are just their name
+DAG_TYPES = ["transform", "joint", "ikHandle", "ikEffector", "locator", "nurbsCurve", "nurbsSurface", "mesh",
+             "follicle", "clusterHandle", "camera"]
+
+_STATEMENT = re.compile(r'(?:[^;"]|"(?:\\.|[^"\\])*")+;')
+_TOKEN = re.compile(r'"(?:\\.|[^"\\])*"|[^\s]+')
+
+
+def _unquote(token):
+    if token.startswith('"') and token.endswith('"'):
+        return token[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+    return token
+
+
+def _flags(command, tokens):
+    # {flag: value} of a statement's flag tokens, with the flags in NO_VALUE_FLAGS for command set to True
+    novalue = NO_VALUE_FLAGS.get(command, [])
+    flags = {}
+    index = 0
+    while index < len(tokens):
+        if tokens[index] in novalue:
+            flags[tokens[index]] = True
+            index += 1
+        else:
+            flags[tokens[index]] = tokens[index + 1] if index + 1 < len(tokens) else True
+            index += 2
+    return flags
+
+
+def _number(token, precision):
+    # A numeric token rounded to precision, or the token itself
+    try:
+        value = round(float(token), precision)
+    except ValueError:
+        return token
+    return repr(value + 0.0) if value else "0.0"
+
+
+def _open(path, mode="rt"):
+    return gzip.open(path, mode) if path.endswith(".gz") else open(path, mode[0])
+
+
+class Fingerprint(object):
+    """
+    The node, attribute and connection tables of one built rig, with per node and per component hashes
+    """
+    def __init__(self, nodes, attrs,
+                 connections, char_name="Char"):
+        self.nodes = dict(nodes)
+        self.attrs = dict(attrs)
+        self.connections = set(tuple(connection) for connection in connections)
+        self.char_name = char_name
+
+        # Each node's attribute and connection rows, indexed once so hashing and diffing never search the tables
+        self.nodeattrs = dict((node, []) for node in self.nodes)
+        for (node, attr), value in self.attrs.items():
+            self.nodeattrs.setdefault(node, []).append((attr, value))
+        self.nodeinputs = dict((node, []) for node in self.nodes)
+        for source, destination in self.connections:
+            self.nodeinputs.setdefault(destination.split(".", 1)[0], []).append((destination, source))
+
+        # Sorted, so every node is assigned the same component however the set happens to be ordered
+        splits = [(source.split(".", 1)[0], source.split(".", 1)[1], destination.split(".", 1)[0],
+                   destination.split(".", 1)[1]) for source, destination in sorted(self.connections)]
+        self.components = Graph_Checker.assign_components(sorted(self.nodes), splits, char_name)
+        self._hashes = None
+
+    def __len__(self):
+        return len(self.nodes)
+
+    @classmethod
+    def from_ma(cls, path, char_name="Char",
+                precision=5):
+        # Read a fingerprint from a Maya ASCII file
+        with open(path) as infile:
+            text = infile.read()
+
+        nodes, attrs, connections = {}, {}, set()
+        byname = {}
+
+        def resolve(name):
+            # The long name for a node name as written in the file, which can be a short name or a partial path
+            name = name.lstrip(":")
+            if name.startswith("|"):
+                return name
+            candidates = byname.get(name.rsplit("|", 1)[-1], [])
+            if "|" in name:
+                candidates = [candidate for candidate in candidates if candidate.endswith("|" + name)]
+            return candidates[-1] if candidates else name
+
+        def plug(token):
+            node, attr = _unquote(token).split(".", 1)
+            return "{}.{}".format(resolve(node), attr)
+
+        current = None
+        for statement in _STATEMENT.finditer(text):
+            tokens = _TOKEN.findall(statement.group(0)[:-1])
+            if not tokens or tokens[0].startswith("//") or tokens[0] in SKIPPED_COMMANDS:
+                continue
+            command = tokens[0]
+
+            if command == "createNode":
+                nodetype = tokens[1]
+                flags = _flags(command, tokens[2:])
+                name = _unquote(flags.get("-n", flags.get("-name", "")))
+                if "-p" in flags or "-parent" in flags:
+                    current = "{}|{}".format(resolve(_unquote(flags.get("-p", flags.get("-parent")))), name)
+                elif nodetype in DAG_TYPES or nodetype.endswith("Constraint"):
+                    current = "|" + name
+                else:
+                    current = name
+                nodes[current] = nodetype
+                byname.setdefault(name, []).append(current)
+            elif command == "select" and "-ne" in tokens:
+                current = resolve(_unquote(tokens[-1]))
+                nodes.setdefault(current, "default")
+            elif command == "setAttr" and current is not None:
+                attrtoken = next(token for token in tokens[1:] if token.startswith('"'))
+                attr = _unquote(attrtoken)
+                node = current
+                if not attr.startswith("."):
+                    node, attr = plug(attrtoken).split(".", 1)
+                attr = attr.lstrip(".")
+                position = tokens.index(attrtoken)
+                for flag, name in SETATTR_FLAGS.items():
+                    if flag in tokens[1:position]:
+                        attrs[(node, "{}@{}".format(attr, name))] = tokens[tokens.index(flag) + 1]
+                values = [_number(token, precision) for token in tokens[position + 1:]]
+                if values:
+                    attrs[(node, attr)] = " ".join(values)
+            elif command == "addAttr" and current is not None:
+                flags = _flags(command, tokens[1:])
+                longname = _unquote(flags.get("-ln", flags.get("-sn", "")))
+                attrs[(current, "{}@addAttr".format(longname))] = " ".join(
+                    flag if value is True else "{} {}".format(flag, _number(value, precision))
+                    for flag, value in sorted(flags.items()))
+            elif command == "connectAttr":
+                source, destination = [token for token in tokens[1:] if token.startswith('"')][:2]
+                connections.add((plug(source), plug(destination)))
+            elif command == "parent" and "-add" in tokens:
+                # Extra instance parents
+                child, parent = [_unquote(token) for token in tokens if token.startswith('"')][:2]
+                attrs[(resolve(child), "@instance")] = resolve(parent)
+
+        return cls(nodes, attrs, connections, char_name=char_name)
+
+    @classmethod
+    def from_scene(cls, char_name="Char",
+                   precision=5):
+        # Fingerprint the open scene, by exporting it to a temporary Maya ASCII file, which keeps the scene's own name
+        handle, path = tempfile.mkstemp(suffix=".ma")
+        os.close(handle)
+        try:
+            cmds.file(path, exportAll=True, type="mayaAscii", force=True, preserveReferences=True)
+            return cls.from_ma(path, char_name=char_name, precision=precision)
+        finally:
+            os.remove(path)
+
+    @classmethod
+    def load(cls, path):
+        with _open(path) as infile:
+            data = json.load(infile)
+        return cls(data["nodes"], [((node, attr), value) for node, attr, value in data["attrs"]],
+                   data["connections"], char_name=data["char_name"])
+
+    def save(self, path):
+        # Write the tables as sorted json, so saved fingerprints can be diffed as text as well
+        data = {"char_name": self.char_name, "nodes": self.nodes,
+                "attrs": sorted([node, attr, value] for (node, attr), value in self.attrs.items()),
+                "connections": sorted(self.connections), "components": self.component_hashes()}
+        with _open(path, "wt") as outfile:
+            json.dump(data, outfile, indent=0, sort_keys=True)
+        return path
+
+    def node_hashes(self):
+        # {long name: hash} of each node's type, attributes and incoming connections
+        if self._hashes is None:
+            self._hashes = {}
+            for node, nodetype in self.nodes.items():
+                rows = [nodetype] + ["{}={}".format(attr, value) for attr, value in sorted(self.nodeattrs[node])] + \
+                    ["{}<{}".format(destination, source) for destination, source in sorted(self.nodeinputs[node])]
+                self._hashes[node] = hashlib.sha1("\n".join(rows).encode("utf-8")).hexdigest()
+        return self._hashes
+
+    def component_hashes(self):
+        # {component: hash} from the names and hashes of the nodes in each component
+        rows = {}
+        for node, nodehash in sorted(self.node_hashes().items()):
+            rows.setdefault(self.components[node], []).append("{} {}".format(node, nodehash))
+        return dict((component, hashlib.sha1("\n".join(lines).encode("utf-8")).hexdigest())
+                    for component, lines in rows.items())
+
+
+def diff(old, new):
+    # Compare two fingerprints, returning {component: {"added": nodes, "removed": nodes, "changed": {node: changes}}}
+    # for every component that differs, where each node's changes list the attributes and connections that differ
+    oldhashes, newhashes = old.node_hashes(), new.node_hashes()
+    components = {}
+
+    def entry(component):
+        return components.setdefault(component, {"added": [], "removed": [], "changed": {}})
+
+    for node in sorted(set(newhashes) - set(oldhashes)):
+        entry(new.components[node])["added"].append(node)
+    for node in sorted(set(oldhashes) - set(newhashes)):
+        entry(old.components[node])["removed"].append(node)
+
+    for node in sorted(set(oldhashes) & set(newhashes)):
+        if oldhashes[node] == newhashes[node]:
+            continue
+        changes = []
+        if old.nodes[node] != new.nodes[node]:
+            changes.append("type {} -> {}".format(old.nodes[node], new.nodes[node]))
+        oldattrs, newattrs = dict(old.nodeattrs[node]), dict(new.nodeattrs[node])
+        for attr in sorted(set(oldattrs) | set(newattrs)):
+            if oldattrs.get(attr) != newattrs.get(attr):
+                changes.append("{} {} -> {}".format(attr, oldattrs.get(attr), newattrs.get(attr)))
+        oldinputs, newinputs = set(old.nodeinputs[node]), set(new.nodeinputs[node])
+        for sign, inputs in [("-", oldinputs - newinputs), ("+", newinputs - oldinputs)]:
+            for destination, source in sorted(inputs):
+                changes.append("{} {} <- {}".format(sign, destination.split(".", 1)[1], source))
+        entry(new.components[node])["changed"][node] = changes
+
+    return components
+
+
+def report(components, linecount=10):
+    # Print a diff per component, with up to linecount nodes for each kind of change
+    for component in sorted(components):
+        changes = components[component]
+        print("{} - {} added, {} removed, {} changed".format(component, len(changes["added"]),
+                                                             len(changes["removed"]), len(changes["changed"])))
+        for kind in ["added", "removed"]:
+            for node in changes[kind][:linecount]:
+                print("    {:<8} {}".format(kind, node))
+        for node in sorted(changes["changed"])[:linecount]:
+            print("    changed  {}".format(node))
+            for change in changes["changed"][node][:linecount]:
+                print("        {}".format(change))
+
+    if not components:
+        print("No differences")
+    return components
+
+
+def fingerprint(path, char_name="Char"):
+    # A fingerprint from a saved fingerprint (.json or .json.gz) or a Maya ASCII file
+    if path.endswith(".ma"):
+        return Fingerprint.from_ma(path, char_name=char_name)
+    return Fingerprint.load(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two rig builds per component, from Maya ASCII files or "
+                                                 "saved fingerprints")
+    parser.add_argument("old", help="The earlier build, as .ma, .json or .json.gz")
+    parser.add_argument("new", help="The later build, as .ma, .json or .json.gz")
+    parser.add_argument("--char", default="Char", help="Character name the rig was built with")
+    parser.add_argument("--save", help="Also save the later build's fingerprint to this path")
+    arguments = parser.parse_args()
+    newprint = fingerprint(arguments.new, char_name=arguments.char)
+    if arguments.save:
+        newprint.save(arguments.save)
+    report(diff(fingerprint(arguments.old, char_name=arguments.char), newprint))
@@ -0,0 +1,264 @@
+"""
+This script houses the placement maths used by the rig components, so that positions and orientations can be
+computed from cached joint positions instead of from temporary constraints and joints inside of Maya
+"""
+
+# Standard library imports
+
+# Third party imports
+import numpy as np
+
+# Local application imports
+
+
+
+"""
+-- NOTES --
+All matrices follow Maya's row vector convention, so each row of a 3x3 rotation matrix is one of the object's
+    world axes (row 0 = X, row 1 = Y, row 2 = Z), and points are transformed as (point * matrix)
+All euler angles are in degrees, using the xyz rotate order
+Every function accepts either a single value or a stack of N values, and returns the same shape it was given
+"""
+
+
+def as_points(points):
+    # Convert a single (x,y,z) point or a list of points into an (N, 3) float array
+    return np.atleast_2d(np.asarray(points, dtype=np.float64))
+
+
+def normalize(vectors):
+    # Normalize each vector in an (N, 3) array, leaving zero length vectors as zero
+    vectors = as_points(vectors)
+    lengths = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return np.divide(vectors, lengths, out=np.zeros_like(vectors), where=lengths > 1e-12)
+
+
+def _restore_shape(values, single):
+    # Return a single value rather than a stack of one if the caller passed in a single value
+    if single:
+        return values[0]
+    return values
+
+
+def lerp(mins, maxs,
+         percents):
+    # Interpolate between mins and maxs by percents (0-1), for any mix of single values and arrays that numpy can
+    # broadcast together
+    mins = np.asarray(mins, dtype=np.float64)
+    return (np.asarray(maxs, dtype=np.float64) - mins) * percents + mins
+
+
+def lerp_points(starts, ends,
+                percents):
+    # Points percents (0-1) of the way from each start point to it's end point, as (N, M, 3) for N pairs of points and
+    # M percents, with the N or M axis dropped when a single pair or a single percent is given
+    singlepoint = np.ndim(starts) == 1
+    singlepercent = np.ndim(percents) == 0
+    starts = as_points(starts)
+    percents = np.atleast_1d(np.asarray(percents, dtype=np.float64))
+    points = starts[:, np.newaxis] + (as_points(ends) - starts)[:, np.newaxis] * percents[:, np.newaxis]
+    if singlepercent:
+        points = points[:, 0]
+    return _restore_shape(points, singlepoint)
+
+
+def aim_matrices(origins, targets,
+                 world_up=(0, 1, 0)):
+    # Compute the rotation matrices an aimConstraint with its default settings would give, where the X axis aims
+    # from origins at targets, and the Y axis points as close to world_up as it can
+    single = np.ndim(origins) == 1
+    aim = normalize(as_points(targets) - as_points(origins))
+    up = np.broadcast_to(normalize(world_up), aim.shape)
+
+    side = np.cross(aim, up)
+    # If the aim and up vectors are parallel there is no single answer, so fall back to world Z as the up vector
+    degenerate = np.linalg.norm(side, axis=-1) < 1e-9
+    if np.any(degenerate):
+        side[degenerate] = np.cross(aim[degenerate], (0, 0, 1))
+    side = normalize(side)
+    up = np.cross(side, aim)
+
+    matrices = np.stack([aim, up, side], axis=1)
+    return _restore_shape(matrices, single)
+
+
+def matrices_from_euler(rotations):
+    # Build (N, 3, 3) rotation matrices from (N, 3) xyz euler rotations in degrees
+    single = np.ndim(rotations) == 1
+    rx, ry, rz = np.radians(as_points(rotations)).T
+    cx, cy, cz = np.cos(rx), np.cos(ry), np.cos(rz)
+    sx, sy, sz = np.sin(rx), np.sin(ry), np.sin(rz)
+
+    # Expanded form of Rx * Ry * Rz using row vectors
+    matrices = np.empty((len(rx), 3, 3))
+    matrices[:, 0] = np.stack([cy * cz, cy * sz, -sy], axis=-1)
+    matrices[:, 1] = np.stack([sx * sy * cz - cx * sz, sx * sy * sz + cx * cz, sx * cy], axis=-1)
+    matrices[:, 2] = np.stack([cx * sy * cz + sx * sz, cx * sy * sz - sx * cz, cx * cy], axis=-1)
+    return _restore_shape(matrices, single)
+
+
+def euler_from_matrices(matrices):
+    # Decompose (N, 3, 3) rotation matrices into (N, 3) xyz euler rotations in degrees
+    matrices = np.asarray(matrices, dtype=np.float64)
+    single = matrices.ndim == 2
+    matrices = matrices.reshape(-1, 3, 3)
+
+    ry = np.arcsin(np.clip(-matrices[:, 0, 2], -1.0, 1.0))
+    rx = np.arctan2(matrices[:, 1, 2], matrices[:, 2, 2])
+    rz = np.arctan2(matrices[:, 0, 1], matrices[:, 0, 0])
+
+    # In gimbal lock X and Z rotate around the same axis, so put all of the rotation into X
+    gimbal = np.abs(matrices[:, 0, 2]) > 1.0 - 1e-9
+    if np.any(gimbal):
+        rz[gimbal] = 0.0
+        rx[gimbal] = np.arctan2(-matrices[gimbal, 2, 1], matrices[gimbal, 1, 1])
+
+    rotations = np.degrees(np.stack([rx, ry, rz], axis=-1))
+    return _restore_shape(rotations, single)
+
+
+def aim_rotations(origins, targets,
+                  world_up=(0, 1, 0)):
+    # Euler rotations (xyz, degrees) for objects at origins aiming their X axis at targets
+    return euler_from_matrices(aim_matrices(origins, targets, world_up=world_up))
+
+
+def pole_vector_placements(startpos, midpos,
+                           endpos, distance=50.0):
+    # Compute the world position and rotation for pole vector controls, matching an object placed halfway between
+    # startpos and endpos, aim constrained at midpos, then moved distance units down it's own X axis
+    single = np.ndim(startpos) == 1
+    halfway = (as_points(startpos) + as_points(endpos)) * 0.5
+    matrices = aim_matrices(halfway, midpos)
+    positions = halfway + matrices[:, 0] * distance
+    rotations = euler_from_matrices(matrices)
+    return _restore_shape(positions, single), _restore_shape(rotations, single)
+
+
+def joint_orients(startpos, endpos,
+                  parent_rotations=None, world_up=(0, 1, 0)):
+    # Compute the jointOrient that `joint -edit -orientJoint xyz` gives a joint at startpos with a single child at
+    # endpos, expressed relative to a parent with the world space parent_rotations (xyz, degrees)
+    # Returns the joint orients, and the joint's world rotation matrices for any further placement
+    single = np.ndim(startpos) == 1
+    world = aim_matrices(as_points(startpos), endpos, world_up=world_up)
+    if parent_rotations is None:
+        local = world
+    else:
+        # world = local * parent, so local = world * inverse(parent), and rotation matrices invert by transposing
+        parent = matrices_from_euler(as_points(parent_rotations))
+        local = np.matmul(world, np.transpose(parent, (0, 2, 1)))
+    orients = euler_from_matrices(local)
+    return _restore_shape(orients, single), _restore_shape(world, single)
+
+
+def compose_matrices(translations, rotations,
+                     scales=None):
+    # Build (N, 4, 4) matrices from (N, 3) translations, (N, 3) xyz euler rotations in degrees, and optionally (N, 3)
+    # scales, applied before the rotation the same as a transform's scale
+    single = np.ndim(translations) == 1
+    translations = as_points(translations)
+    matrices = np.zeros((len(translations), 4, 4))
+    matrices[:, :3, :3] = matrices_from_euler(as_points(rotations))
+    if scales is not None:
+        matrices[:, :3, :3] *= as_points(scales)[:, :, np.newaxis]
+    matrices[:, 3, :3] = translations
+    matrices[:, 3, 3] = 1.0
+    return _restore_shape(matrices, single)
+
+
+def decompose_matrices(matrices, scales=False):
+    # Split (N, 4, 4) matrices into (N, 3) translations and (N, 3) xyz euler rotations in degrees, removing any scale
+    # If scales is on, the (N, 3) scales are returned as well, so compose_matrices can rebuild the same matrices
+    matrices = np.asarray(matrices, dtype=np.float64)
+    single = matrices.ndim == 2
+    matrices = matrices.reshape(-1, 4, 4)
+
+    axisscales = np.linalg.norm(matrices[:, :3, :3], axis=-1)
+    rotations = normalize(matrices[:, :3, :3].reshape(-1, 3)).reshape(-1, 3, 3)
+    # A negative scale flips the handedness of the axes, so flip the X axis back to get a pure rotation
+    flipped = np.linalg.det(rotations) < 0
+    rotations[flipped, 0] *= -1.0
+    axisscales[flipped, 0] *= -1.0
+
+    translations = matrices[:, 3, :3].copy()
+    if scales:
+        return (_restore_shape(translations, single), _restore_shape(euler_from_matrices(rotations), single),
+                _restore_shape(axisscales, single))
+    return _restore_shape(translations, single), _restore_shape(euler_from_matrices(rotations), single)
+
+
+def inverse_matrices(matrices):
+    # Invert (N, 4, 4) matrices, like a transform's worldInverseMatrix
+    return np.linalg.inv(np.asarray(matrices, dtype=np.float64))
+
+
+def local_matrices(matrices, parents):
+    # The (N, 4, 4) matrices relative to (N, 4, 4) parents, the matrix a transform would need under a parent at parents
+    # to end up at matrices, as world = local * parent
+    return np.matmul(np.asarray(matrices, dtype=np.float64), inverse_matrices(parents))
+
+
+def mirror_points(points, axis=0):
+    # Mirror (N, 3) points across the plane through the origin facing axis (0 = X, for Lf to Rt)
+    points = np.array(points, dtype=np.float64)
+    points[..., axis] *= -1.0
+    return points
+
+
+def mirror_matrices(matrices, axis=0,
+                    behaviour=True):
+    # Mirror (N, 4, 4) matrices across the plane through the origin facing axis (0 = X, for Lf to Rt)
+    # With behaviour on every axis is flipped, like mirrorJoint's behaviour mode, so the same rotation on both sides
+    # moves them in opposite directions, otherwise the mirrored matrices keep their world orientation
+    matrices = np.array(matrices, dtype=np.float64)
+    mirrored = matrices.copy()
+    mirrored[..., axis] *= -1.0
+    if behaviour:
+        mirrored[..., :3, :3] *= -1.0
+    else:
+        mirrored[..., :3, :3] = matrices[..., :3, :3]
+    return mirrored
+
+
+def quaternions_from_matrices(matrices):
+    # Convert (N, 3, 3) rotation matrices into (N, 4) unit quaternions in Maya's (x, y, z, w) order, with w kept
+    # positive so each rotation only has one representation
+    matrices = np.asarray(matrices, dtype=np.float64)
+    single = matrices.ndim == 2
+    m = matrices.reshape(-1, 3, 3)
+
+    # Pick the largest of w, x, y and z to divide by, so the result stays accurate for every rotation
+    diagonal = np.stack([m[:, 0, 0] + m[:, 1, 1] + m[:, 2, 2],
+                         m[:, 0, 0] - m[:, 1, 1] - m[:, 2, 2],
+                         m[:, 1, 1] - m[:, 0, 0] - m[:, 2, 2],
+                         m[:, 2, 2] - m[:, 0, 0] - m[:, 1, 1]], axis=-1)
+    largest = np.argmax(diagonal, axis=-1)
+    root = np.sqrt(np.maximum(1.0 + diagonal[np.arange(len(m)), largest], 1e-12)) * 2.0
+
+    # Each row of candidates holds the quaternion worked out from one of the four choices, in x, y, z, w order
+    candidates = np.stack([
+        np.stack([m[:, 1, 2] - m[:, 2, 1], m[:, 2, 0] - m[:, 0, 2], m[:, 0, 1] - m[:, 1, 0], root * root * 0.25], -1),
+        np.stack([root * root * 0.25, m[:, 0, 1] + m[:, 1, 0], m[:, 2, 0] + m[:, 0, 2], m[:, 1, 2] - m[:, 2, 1]], -1),
+        np.stack([m[:, 0, 1] + m[:, 1, 0], root * root * 0.25, m[:, 1, 2] + m[:, 2, 1], m[:, 2, 0] - m[:, 0, 2]], -1),
+        np.stack([m[:, 2, 0] + m[:, 0, 2], m[:, 1, 2] + m[:, 2, 1], root * root * 0.25, m[:, 0, 1] - m[:, 1, 0]], -1),
+    ], axis=1)
+    quaternions = candidates[np.arange(len(m)), largest] / root[:, np.newaxis]
+
+    quaternions *= np.where(quaternions[:, 3:] < 0, -1.0, 1.0)
+    quaternions /= np.linalg.norm(quaternions, axis=-1, keepdims=True)
+    return _restore_shape(quaternions, single)
+
+
+def matrices_from_quaternions(quaternions):
+    # Build (N, 3, 3) rotation matrices from (N, 4) quaternions in (x, y, z, w) order, normalizing them first so
+    # quantized quaternions can be passed straight in
+    single = np.ndim(quaternions) == 1
+    quaternions = np.atleast_2d(np.asarray(quaternions, dtype=np.float64))
+    x, y, z, w = (quaternions / np.linalg.norm(quaternions, axis=-1, keepdims=True)).T
+
+    matrices = np.empty((len(x), 3, 3))
+    matrices[:, 0] = np.stack([1 - 2 * (y * y + z * z), 2 * (x * y + z * w), 2 * (x * z - y * w)], axis=-1)
+    matrices[:, 1] = np.stack([2 * (x * y - z * w), 1 - 2 * (x * x + z * z), 2 * (y * z + x * w)], axis=-1)
+    matrices[:, 2] = np.stack([2 * (x * z + y * w), 2 * (y * z - x * w), 1 - 2 * (x * x + y * y)], axis=-1)
+    return _restore_shape(matrices, single)
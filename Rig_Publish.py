@@ -0,0 +1,195 @@
+"""
+This script houses publishing of built rigs as reusable assets, built once per skeleton template, which shots then
+load by reference with overrides for only the controls that differ, so crowds of the same character don't each carry
+a full copy of the control rig network
+"""
+
+# Standard library imports
+import hashlib
+import importlib
+import json
+import os
+
+# Third party imports
+from maya import cmds
+
+# Local application imports
+
+
+
+"""
+-- NOTES --
+An asset is a Maya file of the built rig, with an asset json next to it holding
+    skeleton            the skeleton template's path and sha1
+    params              the build parameters, like char_name, lod and lean
+    builders            the sha1 of each BUILDER_MODULES source file
+    controls            {control: {attr: value}} of every keyable, unlocked attribute on the rig's controls as built
+Publishing skips an asset when it's skeleton, params and builders all match, so changing the LOD, or any of the
+    builder code, publishes it again
+Instances reference the asset under their own namespace, so every instance shares the asset's file on disk, and Maya
+    only stores each instance's reference edits in the shot instead of the whole rig
+Overrides are {control: {attr: value}}, without namespaces, and only the values that differ from the asset json's are
+    set, so the reference edits stay as small as the differences between instances
+A shot file is json of {"instances": [{"asset": path, "namespace": name, "overrides": {...}}]}, which can be loaded
+    into an empty scene, or saved from the references in the open scene
+"""
+
+
+# The modules whose code decides what a build creates
+BUILDER_MODULES = ["Build_Components", "Bulk_Ops", "Rig_Math", "Shape_Store"]
+
+
+def file_hash(path):
+    # The sha1 of a file's contents, read in chunks so large skeleton files aren't read into memory at once
+    sha = hashlib.sha1()
+    with open(path, "rb") as infile:
+        for chunk in iter(lambda: infile.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def builder_hashes(modules=None):
+    # {module name: sha1 of it's source} for each of BUILDER_MODULES, or modules, which can be names or modules
+    hashes = {}
+    for module in modules or BUILDER_MODULES:
+        if not hasattr(module, "__file__"):
+            module = importlib.import_module(module)
+        path = module.__file__
+        if path.endswith(".pyc") and os.path.exists(path[:-1]):
+            path = path[:-1]
+        hashes[module.__name__] = file_hash(path)
+    return hashes
+
+
+def asset_info_path(asset_file):
+    # The asset json kept next to an asset file
+    return os.path.splitext(asset_file)[0] + ".json"
+
+
+def load_asset_info(asset_file):
+    # Read an asset's json, or None if it hasn't been published
+    path = asset_info_path(asset_file)
+    if not os.path.exists(path):
+        return None
+    with open(path) as infile:
+        return json.load(infile)
+
+
+def control_values(controls, namespace=""):
+    # {control: {attr: value}} of every keyable, unlocked, single value attribute on each control, with the namespace
+    # left out of the control names
+    prefix = "{}:".format(namespace) if namespace else ""
+    values = {}
+    for ctrl in controls:
+        attrs = {}
+        for attr in cmds.listAttr(prefix + ctrl, keyable=True, unlocked=True, scalar=True) or []:
+            attrs[attr] = cmds.getAttr("{}{}.{}".format(prefix, ctrl, attr))
+        values[ctrl] = attrs
+    return values
+
+
+def differing_values(values, published,
+                     tolerance=1e-5):
+    # The entries of values that differ from published by more than tolerance, as {control: {attr: value}}
+    overrides = {}
+    for ctrl, attrs in values.items():
+        defaults = published.get(ctrl, {})
+        for attr, value in attrs.items():
+            default = defaults.get(attr)
+            if default is None or abs(float(value) - float(default)) > tolerance:
+                overrides.setdefault(ctrl, {})[attr] = value
+    return overrides
+
+
+def publish_rig(skeleton_file, asset_file,
+                build, params=None,
+                modules=None, force=False):
+    # Build a rig asset on a fresh copy of skeleton_file and save it to asset_file, with it's asset json next to it
+    # build is called with the skeleton open, builds the rig, and returns the names of it's controls
+    # params are the json friendly build parameters build uses, and modules the builder modules, see the notes
+    # A publish is skipped when the asset was built from the same skeleton, params and builders, unless force is on
+    key = {
+        "skeleton": {"path": skeleton_file, "sha1": file_hash(skeleton_file)},
+        "params": params or {},
+        "builders": builder_hashes(modules),
+    }
+    info = load_asset_info(asset_file)
+    if not force and info and os.path.exists(asset_file) and info["skeleton"]["sha1"] == key["skeleton"]["sha1"] \
+            and info.get("params") == key["params"] and info.get("builders") == key["builders"]:
+        print("{} is up to date with {}".format(asset_file, skeleton_file))
+        return info
+
+    cmds.file(skeleton_file, open=True, force=True)
+    controls = build()
+    info = dict(key, controls=control_values(controls))
+
+    cmds.file(rename=asset_file)
+    cmds.file(save=True, force=True, type="mayaAscii" if asset_file.endswith(".ma") else "mayaBinary")
+    with open(asset_info_path(asset_file), "w") as outfile:
+        json.dump(info, outfile, indent=1, sort_keys=True)
+
+    print("Published {} with {} controls".format(asset_file, len(controls)))
+    return info
+
+
+def reference_instance(asset_file, namespace,
+                       overrides=None, info=None):
+    # Reference an asset into the open scene under namespace, then set only the overrides that differ from the
+    # published values, returning the reference node
+    info = info or load_asset_info(asset_file)
+    if info is None:
+        raise ValueError("{} has not been published, there's no {}".format(asset_file, asset_info_path(asset_file)))
+
+    reffile = cmds.file(asset_file, reference=True, namespace=namespace, mergeNamespacesOnClash=False)
+    namespace = cmds.file(reffile, query=True, namespace=True)
+    for ctrl, attrs in differing_values(overrides or {}, info["controls"]).items():
+        for attr, value in attrs.items():
+            cmds.setAttr("{}:{}.{}".format(namespace, ctrl, attr), value)
+
+    return cmds.referenceQuery(reffile, referenceNode=True)
+
+
+def instance_overrides(namespace, info):
+    # The overrides of an instance in the open scene, as the control values that differ from it's asset's
+    return differing_values(control_values(sorted(info["controls"]), namespace=namespace), info["controls"])
+
+
+def scene_instances():
+    # The (namespace, asset file) pairs of every top level reference in the open scene that's a published asset
+    instances = []
+    for reffile in cmds.file(query=True, reference=True) or []:
+        asset_file = cmds.referenceQuery(reffile, filename=True, withoutCopyNumber=True)
+        if os.path.exists(asset_info_path(asset_file)):
+            instances.append((cmds.file(reffile, query=True, namespace=True), asset_file))
+    return instances
+
+
+def save_shot(path):
+    # Save every asset instance in the open scene, with it's overrides, to a shot file
+    infos = {}
+    instances = []
+    for namespace, asset_file in scene_instances():
+        if asset_file not in infos:
+            infos[asset_file] = load_asset_info(asset_file)
+        instances.append({"asset": asset_file, "namespace": namespace,
+                          "overrides": instance_overrides(namespace, infos[asset_file])})
+
+    with open(path, "w") as outfile:
+        json.dump({"instances": instances}, outfile, indent=1, sort_keys=True)
+    return instances
+
+
+def load_shot(path):
+    # Reference every instance in a shot file into the open scene, reading each asset's json once, and return the
+    # reference nodes in the same order
+    with open(path) as infile:
+        shot = json.load(infile)
+
+    infos = {}
+    refnodes = []
+    for instance in shot["instances"]:
+        if instance["asset"] not in infos:
+            infos[instance["asset"]] = load_asset_info(instance["asset"])
+        refnodes.append(reference_instance(instance["asset"], instance["namespace"],
+                                           overrides=instance.get("overrides"), info=infos[instance["asset"]]))
+    return refnodes
@@ -0,0 +1,156 @@
+"""
+This script houses a control shape store for rigs built with Build_Components.py, which saves the CVs of every control's
+curve shapes to a single file per character, and puts them back onto the rebuilt controls in one API pass, so hand
+tweaked control shapes survive rebuilding the rig
+"""
+
+# Standard library imports
+
+# Third party imports
+import numpy as np
+from maya import cmds
+try:
+    from maya.api import OpenMaya as om
+except ImportError:
+    # Offline builds (Offline_Build.py) have no maya.api, and can't store or restore control shapes
+    om = None
+
+# Local application imports
+
+
+
+"""
+-- NOTES --
+Each character's shapes are stored in one .npz file holding
+    controls    the name of each stored control shape's control, joined with newlines
+    indices     int32 (shapes), which of it's control's curve shapes each stored shape is
+    curves      int32 (shapes), which stored curve each shape uses, as instanced shapes all share a single curve
+    counts      int32 (curves), the number of CVs in each stored curve
+    cvs         float32 (CVs, 3), the object space CVs of every stored curve, one curve after another
+Curves are only put back onto shapes with the same number of CVs, as a control built with a different shape can't take
+    the old CVs, and those controls are returned as skipped
+Instanced master shapes (BuildComponents.instance_shapes) are stored and set once, so a tweak to one changes every
+    control sharing it, the same as editing it in Maya
+Like Bulk_Ops, applying shapes runs outside of an undoable command
+"""
+
+
+def _curve_shapes(dagpath):
+    # The non intermediate nurbsCurve shapes directly under a transform, in child order
+    dagfn = om.MFnDagNode(dagpath)
+    shapes = []
+    for index in range(dagfn.childCount()):
+        child = dagfn.child(index)
+        if child.hasFn(om.MFn.kNurbsCurve) and not om.MFnDagNode(child).isIntermediateObject:
+            shapes.append(child)
+    return shapes
+
+
+def _shape_id(shape):
+    # A shape node's UUID, which every instance of the shape shares, and unlike MObjectHandle hash codes is unique
+    return om.MFnDependencyNode(shape).uuid().asString()
+
+
+def _selection(names):
+    # An MSelectionList of the names that exist, along with those names in the same order
+    selection = om.MSelectionList()
+    found = []
+    for name in names:
+        try:
+            selection.add(name)
+        except RuntimeError:
+            continue
+        found.append(name)
+    return selection, found
+
+
+class ShapeStore(object):
+    """
+    The stored curve CVs for a set of controls, captured from the scene or loaded from a file
+    """
+    def __init__(self, controls, indices,
+                 curves, counts,
+                 cvs):
+        self.controls = list(controls)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.curves = np.asarray(curves, dtype=np.int32)
+        self.counts = np.asarray(counts, dtype=np.int32)
+        self.cvs = np.asarray(cvs, dtype=np.float32).reshape(-1, 3)
+        self.offsets = np.concatenate([[0], np.cumsum(self.counts)])
+
+    def __len__(self):
+        return len(self.controls)
+
+    def curve(self, index):
+        # The (CVs, 3) object space CVs of one stored curve
+        return self.cvs[self.offsets[index]:self.offsets[index + 1]]
+
+    @classmethod
+    def capture(cls, ctrls=None):
+        # Store the curve shapes of ctrls, defaulting to every _CTRL transform in the scene
+        if ctrls is None:
+            ctrls = cmds.ls("*_CTRL", type="transform")
+        selection, found = _selection(ctrls)
+
+        controls, indices, curves, counts, cvs = [], [], [], [], []
+        curveids = {}
+        for number, ctrl in enumerate(found):
+            for index, shape in enumerate(_curve_shapes(selection.getDagPath(number))):
+                # Instances of a shape are the same node, so each one is only stored once
+                shapeid = _shape_id(shape)
+                if shapeid not in curveids:
+                    points = om.MFnNurbsCurve(shape).cvPositions(om.MSpace.kObject)
+                    curveids[shapeid] = len(counts)
+                    counts.append(len(points))
+                    cvs.append(np.array([(point.x, point.y, point.z) for point in points]))
+                controls.append(ctrl)
+                indices.append(index)
+                curves.append(curveids[shapeid])
+
+        return cls(controls, indices, curves, counts, np.concatenate(cvs) if cvs else np.zeros((0, 3)))
+
+    def save(self, path):
+        # Write the store to a single .npz file at path
+        np.savez_compressed(path, controls=np.array("\n".join(self.controls)), indices=self.indices,
+                            curves=self.curves, counts=self.counts, cvs=self.cvs)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            controls = str(data["controls"]).split("\n") if len(data["indices"]) else []
+            return cls(controls, data["indices"], data["curves"], data["counts"], data["cvs"])
+
+    def apply(self, ctrls=None):
+        # Put the stored CVs back onto every matching control in the scene, or only those in ctrls, returning the
+        # controls that were skipped because they're missing or their curves have a different number of CVs
+        wanted = None if ctrls is None else set(ctrls)
+        entries = {}
+        for entry, ctrl in enumerate(self.controls):
+            if wanted is None or ctrl in wanted:
+                entries.setdefault(ctrl, []).append(entry)
+
+        selection, found = _selection(list(entries))
+        skipped = [ctrl for ctrl in entries if ctrl not in set(found)]
+        done = set()
+        for number, ctrl in enumerate(found):
+            shapes = _curve_shapes(selection.getDagPath(number))
+            for entry in entries[ctrl]:
+                if self.indices[entry] >= len(shapes):
+                    skipped.append(ctrl)
+                    continue
+                shape = shapes[self.indices[entry]]
+                shapeid = _shape_id(shape)
+                if shapeid in done:
+                    continue
+
+                curvefn = om.MFnNurbsCurve(shape)
+                cvs = self.curve(self.curves[entry])
+                if curvefn.numCVs != len(cvs):
+                    skipped.append(ctrl)
+                    continue
+                curvefn.setCVPositions(om.MPointArray(cvs.tolist()), om.MSpace.kObject)
+                curvefn.updateCurve()
+                done.add(shapeid)
+
+        return sorted(set(skipped))
@@ -0,0 +1,273 @@
+"""
+This script houses bulk skin weight saving and loading for rigs built with Build_Components.py, which reads and writes
+a whole skinCluster's weights through the API in a single call, and stores them as sparse memory mapped files keyed
+by influence name, so they can be put back after a rebuild even if the influences have changed
+"""
+
+# Standard library imports
+import json
+import os
+
+# Third party imports
+import numpy as np
+try:
+    from maya import cmds
+    from maya.api import OpenMaya as om
+    from maya.api import OpenMayaAnim as oma
+except ImportError:
+    # Weights files can be read and remapped outside of Maya, and offline builds (Offline_Build.py) have no maya.api
+    cmds = om = oma = None
+
+# Local application imports
+
+
+
+"""
+-- NOTES --
+Each set of weights is stored in weightsdir as four files, named after the geometry they came from
+    {name}.json             the influence names, the vertex count, and the skinCluster and geometry they came from
+    {name}_offsets.npy      int64 (vertices + 1), where each vertex's weights start and end in the two arrays below
+    {name}_influences.npy   uint16 (or uint32 past 65535 influences) index into the influence names for each weight
+    {name}_weights.npy      float32, the weights themselves
+Only weights above the threshold are stored, so a vertex with 4 influences costs 4 entries however many joints the
+    skinCluster has. The npy files are memory mapped when read, so only the vertices that are asked for are loaded
+Influences are matched by name when loading, with any saved influences missing from the skinCluster added to it if
+    they exist in the scene, and otherwise dropped, with the weights of each vertex normalized again afterwards
+A vertex whose saved influences were all dropped is left with no weights by WeightsFile.dense, so import_weights keeps
+    the weights it already has on the skinCluster instead, and prints which vertices those were
+"""
+
+
+def skin_cluster(geometry):
+    # The skinCluster deforming geometry, or None if it isn't skinned
+    skins = cmds.ls(cmds.listHistory(geometry, pruneDagObjects=True) or [], type="skinCluster")
+    return skins[0] if skins else None
+
+
+def _skin_fn(skincluster):
+    # The function set for the skinCluster, along with the path to it's output shape and a component for every
+    # vertex or CV on that shape
+    selection = om.MSelectionList()
+    selection.add(skincluster)
+    skinfn = oma.MFnSkinCluster(selection.getDependNode(0))
+    shape = skinfn.getPathAtIndex(0)
+
+    if shape.hasFn(om.MFn.kMesh):
+        component = om.MFnSingleIndexedComponent()
+        components = component.create(om.MFn.kMeshVertComponent)
+        component.setCompleteData(om.MFnMesh(shape).numVertices)
+    elif shape.hasFn(om.MFn.kNurbsSurface):
+        surface = om.MFnNurbsSurface(shape)
+        component = om.MFnDoubleIndexedComponent()
+        components = component.create(om.MFn.kSurfaceCVComponent)
+        component.setCompleteData(surface.numCVsInU, surface.numCVsInV)
+    else:
+        component = om.MFnSingleIndexedComponent()
+        components = component.create(om.MFn.kCurveCVComponent)
+        component.setCompleteData(om.MFnNurbsCurve(shape).numCVs)
+
+    return skinfn, shape, components
+
+
+def influence_names(skincluster):
+    # The short names of the skinCluster's influences, in the order the skinCluster indexes them
+    skinfn = _skin_fn(skincluster)[0]
+    return [path.partialPathName().rsplit("|", 1)[-1] for path in skinfn.influenceObjects()]
+
+
+def get_weights(skincluster):
+    # Return the skinCluster's weights as a dense (vertices, influences) float64 array, in a single API call,
+    # along with the influence names for each column
+    skinfn, shape, components = _skin_fn(skincluster)
+    weights, influencecount = skinfn.getWeights(shape, components)
+    names = [path.partialPathName().rsplit("|", 1)[-1] for path in skinfn.influenceObjects()]
+    return np.array(weights, dtype=np.float64).reshape(-1, influencecount), names
+
+
+def set_weights(skincluster, weights):
+    # Set every weight on the skinCluster from a dense (vertices, influences) array, in a single API call, with
+    # the columns in the skinCluster's influence order
+    skinfn, shape, components = _skin_fn(skincluster)
+    weights = np.asarray(weights, dtype=np.float64)
+    indices = om.MIntArray(list(range(weights.shape[1])))
+    skinfn.setWeights(shape, components, indices, om.MDoubleArray(weights.ravel().tolist()), normalize=False)
+
+
+def _paths(weightsdir, name):
+    return {suffix: os.path.join(weightsdir, name + suffix)
+            for suffix in [".json", "_offsets.npy", "_influences.npy", "_weights.npy"]}
+
+
+def write_weights(weightsdir, name,
+                  weights, influences,
+                  info=None, threshold=1e-5):
+    # Write a dense (vertices, influences) weights array to weightsdir as sparse rows, dropping weights at or below
+    # threshold. info is any extra json data to store alongside, like where the weights came from
+    if not os.path.isdir(weightsdir):
+        os.makedirs(weightsdir)
+    paths = _paths(weightsdir, name)
+
+    weights = np.asarray(weights)
+    vertices, columns = np.nonzero(weights > threshold)
+    offsets = np.zeros(len(weights) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(vertices, minlength=len(weights)), out=offsets[1:])
+
+    np.save(paths["_offsets.npy"], offsets)
+    np.save(paths["_influences.npy"], columns.astype(np.uint16 if len(influences) <= 65535 else np.uint32))
+    np.save(paths["_weights.npy"], weights[vertices, columns].astype(np.float32))
+
+    info = dict(info or {})
+    info.update({"influences": list(influences), "vertices": len(weights)})
+    with open(paths[".json"], "w") as outfile:
+        json.dump(info, outfile, indent=1)
+
+    return paths
+
+
+def export_weights(geometry, weightsdir,
+                   name=None, threshold=1e-5):
+    # Save the weights of the skinCluster on geometry to weightsdir, named after the geometry by default
+    # Returns the paths of the files written
+    skincluster = skin_cluster(geometry)
+    if skincluster is None:
+        raise ValueError("{} has no skinCluster to export weights from".format(geometry))
+    weights, influences = get_weights(skincluster)
+    name = name or geometry.rsplit("|", 1)[-1].replace(":", "_")
+    return write_weights(weightsdir, name, weights, influences, threshold=threshold,
+                         info={"geometry": geometry, "skinCluster": skincluster})
+
+
+class WeightsFile(object):
+    """
+    Memory mapped access to weights written by write_weights, which rebuilds dense weights for any influence order
+    """
+    def __init__(self, weightsdir, name):
+        self.paths = _paths(weightsdir, name)
+        with open(self.paths[".json"]) as infile:
+            self.info = json.load(infile)
+        self.influences = self.info["influences"]
+        self.offsets = np.load(self.paths["_offsets.npy"], mmap_mode="r")
+        self.indices = np.load(self.paths["_influences.npy"], mmap_mode="r")
+        self.weights = np.load(self.paths["_weights.npy"], mmap_mode="r")
+
+    def __len__(self):
+        return self.info["vertices"]
+
+    @classmethod
+    def exists(cls, weightsdir, name):
+        return os.path.exists(_paths(weightsdir, name)[".json"])
+
+    def dense(self, influences=None,
+              vertices=None, normalize=True):
+        # Return (vertices, influences) weights, with the columns in the order of influences, matched by name, which
+        # defaults to the saved order. Saved influences that aren't in influences are dropped, and each vertex is
+        # normalized again if normalize is set. vertices is a list of vertex indices, defaulting to every vertex
+        # Vertices with none of their saved influences in influences are left as rows of zeros
+        influences = self.influences if influences is None else list(influences)
+        columns = {name: column for column, name in enumerate(influences)}
+        remap = np.array([columns.get(name, -1) for name in self.influences], dtype=np.int64)
+
+        if vertices is None:
+            start, end = self.offsets[0], self.offsets[-1]
+            rows = np.repeat(np.arange(len(self)), np.diff(self.offsets))
+            entries = slice(start, end)
+            rowcount = len(self)
+        else:
+            # Only read the entries for the vertices asked for
+            vertices = np.asarray(vertices, dtype=np.int64)
+            counts = self.offsets[vertices + 1] - self.offsets[vertices]
+            rows = np.repeat(np.arange(len(vertices)), counts)
+            entries = np.repeat(self.offsets[vertices] - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+            rowcount = len(vertices)
+
+        targetcolumns = remap[np.asarray(self.indices[entries], dtype=np.int64)]
+        values = np.asarray(self.weights[entries], dtype=np.float64)
+        keep = targetcolumns >= 0
+
+        dense = np.zeros((rowcount, len(influences)))
+        dense[rows[keep], targetcolumns[keep]] = values[keep]
+        if normalize:
+            totals = dense.sum(axis=1, keepdims=True)
+            np.divide(dense, totals, out=dense, where=totals > 0)
+        return dense
+
+    def missing(self, influences):
+        # The saved influences that aren't in influences, which would lose their weights when loading
+        influences = set(influences)
+        return [name for name in self.influences if name not in influences]
+
+
+def import_weights(geometry, weightsdir,
+                   name=None, addmissing=True):
+    # Load weights saved for geometry back onto it's skinCluster, binding it to the saved influences first if it
+    # isn't skinned. Saved influences missing from the skinCluster are added if they exist in the scene and addmissing
+    # is set. Returns the names of any saved influences that couldn't be used, whose weights were redistributed
+    name = name or geometry.rsplit("|", 1)[-1].replace(":", "_")
+    weightsfile = WeightsFile(weightsdir, name)
+
+    skincluster = skin_cluster(geometry)
+    if skincluster is None:
+        joints = [influence for influence in weightsfile.influences if cmds.objExists(influence)]
+        skincluster = cmds.skinCluster(joints, geometry, toSelectedBones=True,
+                                       name="{}_SkinCluster".format(geometry.rsplit("|", 1)[-1]))[0]
+
+    influences = influence_names(skincluster)
+    if addmissing:
+        addable = [influence for influence in weightsfile.missing(influences) if cmds.objExists(influence)]
+        if addable:
+            cmds.skinCluster(skincluster, edit=True, addInfluence=addable, weight=0.0)
+            influences = influence_names(skincluster)
+
+    vertexcount = om.MFnComponent(_skin_fn(skincluster)[2]).elementCount
+    if vertexcount != len(weightsfile):
+        raise ValueError("{} has {} vertices, but the weights saved for it have {}".format(geometry, vertexcount,
+                                                                                          len(weightsfile)))
+
+    weights = weightsfile.dense(influences)
+    # Vertices whose saved influences were all dropped have no weights left, and would collapse to the origin, so they
+    # keep the weights they have on the skinCluster now, which are it's bind weights if it was only just bound
+    unweighted = np.flatnonzero(weights.sum(axis=1) <= 0)
+    if len(unweighted):
+        weights[unweighted] = get_weights(skincluster)[0][unweighted]
+        print("{} vertices on {} kept their current weights, as none of their saved influences could be used: "
+              "{}".format(len(unweighted), geometry, unweighted.tolist()))
+
+    set_weights(skincluster, weights)
+    return weightsfile.missing(influences)
+
+
+def skinned_geometry(grp):
+    # Every skinned mesh, surface or curve transform under grp
+    shapes = cmds.listRelatives(grp, allDescendents=True, type=["mesh", "nurbsSurface", "nurbsCurve"],
+                                noIntermediate=True, fullPath=True) or []
+    transforms = []
+    for shape in shapes:
+        transform = cmds.listRelatives(shape, parent=True, fullPath=True)[0]
+        if transform not in transforms and skin_cluster(transform) is not None:
+            transforms.append(transform)
+    return transforms
+
+
+def export_group(grp, weightsdir,
+                 threshold=1e-5):
+    # Save the weights of every skinned geometry under grp, like the character's _Meshes group, to weightsdir
+    # Returns the names the weights were saved under
+    names = []
+    for geometry in skinned_geometry(grp):
+        export_weights(geometry, weightsdir, threshold=threshold)
+        names.append(geometry.rsplit("|", 1)[-1].replace(":", "_"))
+    return names
+
+
+def import_group(grp, weightsdir,
+                 addmissing=True):
+    # Load saved weights back onto every geometry under grp that has weights saved for it in weightsdir, returning
+    # a dict of the saved influences each one couldn't use
+    shapes = cmds.listRelatives(grp, allDescendents=True, type=["mesh", "nurbsSurface", "nurbsCurve"],
+                                noIntermediate=True, fullPath=True) or []
+    missing = {}
+    for geometry in sorted(set(cmds.listRelatives(shapes, parent=True, fullPath=True) or [])):
+        name = geometry.rsplit("|", 1)[-1].replace(":", "_")
+        if WeightsFile.exists(weightsdir, name):
+            missing[name] = import_weights(geometry, weightsdir, name=name, addmissing=addmissing)
+    return missing
@@ -13,17 +13,49 @@ from maya import mel
 
 
 # Local application imports
-path_dir = "/home/aurorafreir/github/Autorigger"
+# The Autorigger folder, from the AUTORIGGER_PATH environment variable if it's set, or else this script's own folder,
+# with the original location as a fallback when run from the Script Editor, where there's no __file__
+if os.environ.get("AUTORIGGER_PATH"):
+    path_dir = os.environ["AUTORIGGER_PATH"]
+elif "__file__" in globals():
+    path_dir = os.path.dirname(os.path.abspath(__file__))
+else:
+    path_dir = "/home/aurorafreir/github/Autorigger"
 if path_dir not in sys.path:
     sys.path.insert(0,path_dir)
 
 import Build_Components as bc # Needs to be imported after modification to sys.path
-reload(bc)
+import Build_Scheduler
+import Component_Registry
+import Rig_Publish
+Component_Registry.reload_modules(bc, Build_Scheduler, Rig_Publish)
 
 
+# Studio components are found from components.json next to this file, if there is one, and any installed packages,
+# but are only imported if extra_components uses them
+registry = Component_Registry.ComponentRegistry(manifests=[os.path.join(path_dir, "components.json")])
+
+# Extra components built after the standard ones, as character spec entries, like
+#   {"component": "long_curve_rig", "part_name": "Ct_Tail", "startjnt": "Ct_Tail_0_JNT", "endjnt": "Ct_Tail_20_JNT"}
+extra_components = []
+
+
+# Hand tweaked control shapes, saved with components.save_control_shapes(control_shapes_file) after tweaking them,
+# and put back onto the controls at the end of every build
+control_shapes_file = os.path.join(path_dir, "Char_ControlShapes.npz")
+
+# Build the rig straight away when this script is run
+# Set to False to only load the builder, and then call build_blocking(), build_interactive(), lod_report(),
+# lean_report() or publish_asset()
+run_build = True
+
 # Load the Build_Components class as components and set up it's class-wide variables
+# lod can be set to bc.BuildComponents.LOD_MEDIUM or LOD_LOW for lighter layout and crowd rigs
+# lean moves the control groups into each control's offsetParentMatrix once the rig is built
 components = bc.BuildComponents(
-    char_name="Char"
+    char_name="Char",
+    lod=bc.BuildComponents.LOD_FULL,
+    lean=False
 )
 
 
@@ -42,79 +74,159 @@ class Char_Builder(object):
         self.Rt_armparts = []
         self.Lf_handparts = []
         self.Rt_handparts = []
+        self.Lf_legparts = []
+        self.Rt_legparts = []
+        self.extraparts = {}
 
 
     def components_build(self):
         # Call each component piece, and set it's output variables
         # as class-wide variables for use in components_connect later
-
+        for name, component, function in self.build_steps():
+            function()
+
+
+    def build_steps(self):
+        # Each component build as a separate (name, component, function) step, in build order, so they can be run
+        # one at a time, with component being the part of the character the step belongs to
+        return [
+            ("Character", "Torso", self.build_character),
+            ("Spine", "Torso", self.build_spine),
+            ("Neck", "Torso", self.build_neck),
+            ("Lf_Arm", "Lf_Arm", lambda: self.build_arm(side="Lf")),
+            ("Rt_Arm", "Rt_Arm", lambda: self.build_arm(side="Rt")),
+            ("Lf_Hand", "Lf_Arm", lambda: self.build_hand(side="Lf")),
+            ("Rt_Hand", "Rt_Arm", lambda: self.build_hand(side="Rt")),
+            ("Lf_Leg", "Legs", lambda: self.build_leg(side="Lf")),
+            ("Rt_Leg", "Legs", lambda: self.build_leg(side="Rt")),
+        ] + [(entry.get("part_name", entry["component"]), "Extras", lambda entry=entry: self.build_extra(entry))
+             for entry in extra_components]
+
+
+    def build_character(self):
         # Basic character setup
         setupparts = components.character_setup()
         self.setupparts = setupparts
 
+
+    def build_spine(self):
         # Spine setup
         spineparts = components.spine_setup(startjnt="Ct_Root_0_JNT", endjnt="Ct_Spine_4_JNT")
 
         self.spineparts = spineparts
 
+
+    def build_neck(self):
         # Neck setup
         neckparts = components.neck_setup(neckjnt="Ct_Neck_0_JNT")
         self.neckparts = neckparts
 
+
+    def build_arm(self, side="Lf"):
         # Arm setup
-        Lf_armparts = components.arm_setup(scapjnt="Lf_Clavicle_0_JNT", shouljnt="Lf_Arm_0_JNT",
-                                             wristjnt="Lf_Arm_2_JNT")
-        self.Lf_armparts = Lf_armparts
+        armparts = components.arm_setup(scapjnt="{}_Clavicle_0_JNT".format(side), shouljnt="{}_Arm_0_JNT".format(side),
+                                        wristjnt="{}_Arm_2_JNT".format(side), flipped=side == "Rt")
+        setattr(self, "{}_armparts".format(side), armparts)
 
-        Rt_armparts = components.arm_setup(scapjnt="Rt_Clavicle_0_JNT", shouljnt="Rt_Arm_0_JNT",
-                                             wristjnt="Rt_Arm_2_JNT", flipped=True)
-        self.Rt_armparts = Rt_armparts
 
+    def build_hand(self, side="Lf"):
         # Hand setup
-        Lf_handparts = components.hand_setup()
-        self.Lf_handparts = Lf_handparts
-        Rt_handparts = components.hand_setup(flipped=True)
-        self.Rt_handparts = Rt_handparts
+        handparts = components.hand_setup(flipped=side == "Rt")
+        setattr(self, "{}_handparts".format(side), handparts)
 
 
+    def build_leg(self, side="Lf"):
         # Legs setup
-        Lf_legparts = components.digileg(part_name="Lf_Leg", startjnt="Lf_Leg_0_JNT",
-                                      kneejnt="Lf_Leg_1_JNT", anklejnt="Lf_Leg_2_JNT",
-                                      heeljnt="Lf_Leg_3_JNT", footjnt="Lf_Paw_0_JNT")
-        self.Lf_legparts = Lf_legparts
+        legparts = components.digileg(part_name="{}_Leg".format(side), startjnt="{}_Leg_0_JNT".format(side),
+                                      kneejnt="{}_Leg_1_JNT".format(side), anklejnt="{}_Leg_2_JNT".format(side),
+                                      heeljnt="{}_Leg_3_JNT".format(side), footjnt="{}_Paw_0_JNT".format(side),
+                                      flipped=side == "Rt")
+        setattr(self, "{}_legparts".format(side), legparts)
+
+
+    def build_extra(self, entry):
+        # Build one of the extra_components through the registry, keeping what it returns by it's step name
+        self.extraparts[entry.get("part_name", entry["component"])] = registry.build_entry(components, entry)
 
-        Rt_legparts = components.digileg(part_name="Rt_Leg", startjnt="Rt_Leg_0_JNT",
-                                      kneejnt="Rt_Leg_1_JNT", anklejnt="Rt_Leg_2_JNT",
-                                      heeljnt="Rt_Leg_3_JNT", footjnt="Rt_Paw_0_JNT",
-                                        flipped=1)
-        self.Rt_legparts = Rt_legparts
+
+    def build_units(self):
+        # The whole build as Build_Scheduler units, one per build, connect and clean up step, so each part of the
+        # character reports it's progress over all of the steps it's made of
+        steps = self.build_steps() + self.connect_steps() + self.cleanup_steps()
+        return [Build_Scheduler.BuildUnit(name, function, component=component) for name, component, function in steps]
 
 
     def components_connect(self):
+        # Connect each of the components, in the order of connect_steps
+        for name, component, function in self.connect_steps():
+            function()
+
+        components.deselect()
+
+
+    def connect_steps(self):
+        # Each connection between the components as a separate (name, component, function) step, in connect order
+        return [
+            ("Hips to Root", "Torso", self.connect_hips),
+            ("Neck to Chest", "Torso", self.connect_neck),
+            ("Lf_Scapula to Chest", "Lf_Arm", lambda: self.connect_scapula(side="Lf")),
+            ("Rt_Scapula to Chest", "Rt_Arm", lambda: self.connect_scapula(side="Rt")),
+            ("Lf_Hand to Wrist", "Lf_Arm", lambda: self.connect_hand(side="Lf")),
+            ("Rt_Hand to Wrist", "Rt_Arm", lambda: self.connect_hand(side="Rt")),
+            ("Head to Neck", "Torso", self.connect_head),
+        ]
+
+
+    def connect_hips(self):
         # Parent the Hips to the Root Control
         cmds.parent(self.spineparts.hipsgrp[0], self.setupparts.rootgroup[1])
         # Parent the Spine_RBN_Rig group to the Root_CTRL
         cmds.parent(self.spineparts.spinerbnrig, self.setupparts.main_rig_group)
 
+
+    def connect_neck(self):
         # Parent Neck to Chest
         cmds.parent(self.neckparts.neckgrp[0], self.spineparts.chestgrp[1])
 
-        # Constrain Scapulas to Chest
-        cmds.parentConstraint(self.spineparts.chestgrp[1], self.Lf_armparts.scapulagrp[0], maintainOffset=True)
-        cmds.parentConstraint(self.spineparts.chestgrp[1], self.Rt_armparts.scapulagrp[0], maintainOffset=True)
 
-        # Constrain hands to wrists
-        cmds.parentConstraint(self.Lf_armparts.connectjnts[2], self.Lf_handparts.handgrp, maintainOffset=True)
-        cmds.parentConstraint(self.Rt_armparts.connectjnts[2], self.Rt_handparts.handgrp, maintainOffset=True)
+    def connect_scapula(self, side="Lf"):
+        # Constrain Scapula to Chest
+        armparts = getattr(self, "{}_armparts".format(side))
+        cmds.parentConstraint(self.spineparts.chestgrp[1], armparts.scapulagrp[0], maintainOffset=True)
+
+
+    def connect_hand(self, side="Lf"):
+        # Constrain hand to wrist
+        armparts = getattr(self, "{}_armparts".format(side))
+        handparts = getattr(self, "{}_handparts".format(side))
+        cmds.parentConstraint(armparts.connectjnts[2], handparts.handgrp, maintainOffset=True)
+
 
+    def connect_head(self):
         # Parent constrain the head setup to the neck
         # Used in example rig, as the head rig was made manually
-        cmds.parentConstraint(self.neckparts.neckgrp[1], "Head_GRP", maintainOffset=True)
-
-        cmds.select(d=1)
+        cmds.parentConstraint(self.neckparts.headctrl, "Head_GRP", maintainOffset=True)
 
 
     def rig_cleanup(self):
+        # Clean up the rig, in the order of cleanup_steps
+        for name, component, function in self.cleanup_steps():
+            function()
+
+
+    def cleanup_steps(self):
+        # Each clean up as a separate (name, component, function) step, in clean up order
+        return [
+            ("Lock Torso", "Torso", self.lock_torso),
+            ("Lock Lf_Hand", "Lf_Arm", lambda: self.lock_hand(side="Lf")),
+            ("Lock Rt_Hand", "Rt_Arm", lambda: self.lock_hand(side="Rt")),
+            ("Assign Controls", "Controls", self.assign_controls),
+            ("Restore Shapes", "Controls", self.restore_shapes),
+            ("Lean Hierarchy", "Controls", self.lean_hierarchy),
+        ]
+
+
+    def lock_torso(self):
         # Lock all attrs on Root_GRP
         components.lockhideattr(self.setupparts.rootgroup[0], hide=False)
         # Lock all attrs on Hips_GRP, Chest_GRP, and Neck_GRP
@@ -122,31 +234,107 @@ class Char_Builder(object):
         components.lockhideattr(self.spineparts.chestgrp[0], hide=False)
         components.lockhideattr(self.neckparts.neckgrp[0], hide=False)
 
-        # Lock scale on Hand groups
-        for side in [self.Lf_handparts.handgrp, self.Rt_handparts.handgrp]:
-            components.lockhideattr(side, translation=False, rotate=False)
 
+    def lock_hand(self, side="Lf"):
+        # Lock scale on Hand group
+        handparts = getattr(self, "{}_handparts".format(side))
+        components.lockhideattr(handparts.handgrp, translation=False, rotate=False)
+
+
+    def assign_controls(self):
         # Controls Display Layer
         ctrlsdisplaylayer = self.setupparts.displayers[2]
 
-        # Add the Scapula_CTRLs, ArmAttrs_CTRLs, IK_CTRLs, PV_CTRLs, and FK_CTRLs to the Controls_Disp layer
-        for armside in [self.Lf_armparts, self.Rt_armparts]:
-            cmds.editDisplayLayerMembers(ctrlsdisplaylayer, armside.scapulagrp[1], noRecurse=True)
-            cmds.editDisplayLayerMembers(ctrlsdisplaylayer, armside.armattrsgrp[1], noRecurse=True)
-            cmds.editDisplayLayerMembers(ctrlsdisplaylayer, armside.ikgrp[1], noRecurse=True)
-            cmds.editDisplayLayerMembers(ctrlsdisplaylayer, armside.pvgrp[1], noRecurse=True)
-            cmds.editDisplayLayerMembers(ctrlsdisplaylayer, armside.fkctrls, noRecurse=True)
-
-        # Add all Nurbs curve transforms (not the shapes) on the hand to the Controls_Disp layer
-        # for part in [scapulagrp, armattrsgrp, ikgrp, pvgrp, fkctrls]:
-        for grp in [self.Lf_handparts, self.Rt_handparts]:
-            for ctrl in cmds.listRelatives(grp.handgrp, allDescendents=True, type="transform"):
-                if "_CTRL" not in ctrl:
-                    pass
-                else:
-                    cmds.editDisplayLayerMembers(self.setupparts.displayers[2], ctrl, noRecurse=True)
-
-cb = Char_Builder()
-cb.components_build()         # Call the components_build   function from the Char_Builder class
-cb.components_connect()       # Call the components_connect function from the Char_Builder class
-cb.rig_cleanup()              # Call the rig_cleanup        function from the Char_Builder class
+        # Add every control registered during the build to the Controls_Disp layer, tag them as controllers,
+        # and create the per component selection sets
+        components.assign_controls(displaylayer=ctrlsdisplaylayer)
+
+
+    def restore_shapes(self):
+        # Put back the hand tweaked control shapes from the last time they were saved
+        if os.path.exists(control_shapes_file):
+            components.restore_control_shapes(control_shapes_file)
+
+
+    def lean_hierarchy(self):
+        # Fold the control groups into offsetParentMatrix last, so the locks above land on the groups, not the controls
+        if components.lean:
+            components.lean_hierarchy()
+
+
+def lod_report(skeleton_file, lods=(0, 1, 2)):
+    # Build the character at each LOD on top of a fresh copy of the skeleton file, and report the node count and
+    # playback cost of each
+    global components
+    reports = []
+    for lod in lods:
+        cmds.file(skeleton_file, open=True, force=True)
+        basenodes = cmds.ls()
+        components = bc.BuildComponents(char_name="Char", lod=lod)
+
+        build_blocking()
+
+        reports.append(components.rig_report(basenodes=basenodes))
+
+    return reports
+
+
+def lean_report(skeleton_file):
+    # Build the character with and without the lean hierarchy on top of a fresh copy of the skeleton file, and
+    # compare the transform count and DAG depth of each
+    global components
+    reports = []
+    for lean in [False, True]:
+        cmds.file(skeleton_file, open=True, force=True)
+        components = bc.BuildComponents(char_name="Char", lean=lean)
+
+        build_blocking()
+
+        reports.append(components.hierarchy_report())
+
+    print("Lean removed {} transforms, max depth {} -> {}".format(reports[0]["transforms"] - reports[1]["transforms"],
+                                                                 reports[0]["max_depth"], reports[1]["max_depth"]))
+
+    return reports
+
+
+def publish_asset(skeleton_file, asset_file,
+                  lod=bc.BuildComponents.LOD_FULL, lean=False,
+                  force=False):
+    # Publish the character as a rig asset built on skeleton_file, for crowd shots to reference with
+    # Rig_Publish.load_shot, only building it again when the skeleton template, the build settings, or the builder
+    # code has changed since it was published
+    def build():
+        global components
+        components = bc.BuildComponents(char_name="Char", lod=lod, lean=lean)
+
+        build_blocking()
+        return components.controls.names()
+
+    return Rig_Publish.publish_rig(skeleton_file, asset_file, build, force=force,
+                                   params={"char_name": "Char", "lod": lod, "lean": lean})
+
+
+def build_interactive(timings=None):
+    # Run the build during idle time, with progress and ETA in a progress window that can cancel between units
+    # Call scheduler.start() again after a cancel to carry on from where it stopped
+    builder = Char_Builder()
+    scheduler = Build_Scheduler.BuildScheduler(builder.build_units(), timings=timings,
+                                               chunkcontext=lambda: components.quiet_build(report=False))
+    scheduler.start()
+    return builder, scheduler
+
+
+def build_blocking():
+    # Build the whole rig in one go, returning the Char_Builder with each component's parts
+    builder = Char_Builder()
+    # Build without selection changes, viewport refreshes or undo recording, all restored once the build is done
+    with components.quiet_build():
+        builder.components_build()         # Call the components_build   function from the Char_Builder class
+        builder.components_connect()       # Call the components_connect function from the Char_Builder class
+        builder.rig_cleanup()              # Call the rig_cleanup        function from the Char_Builder class
+    return builder
+
+
+if run_build:
+    cb = build_blocking()